@@ -4,51 +4,104 @@ from langchain_core.messages import HumanMessage, AIMessage, AnyMessage, SystemM
 from selenium.webdriver.remote.webelement import WebElement
 
 from utils import setup_logger
-from tools import create_webdriver, access_url, extract_accessibility_tree, parse_accessibility_tree, extract_element_from_accessibility_tree, execute_click_action, execute_type_action, execute_wait_action, execute_go_home_action, execute_go_back_action, extract_data_from_element
-
-from components.reAct import reAct_agent
-from components.answer import create_answer_agent
-from components.check_cont import create_check_continue_agent
-
-from typing_extensions import TypedDict, Annotated, Any, List, Union
+from tracing import traced_node
+from settle import current_document_id, page_fingerprint
+from streaming import TokenStreamHandler
+from usage import UsageRecorder, LLMCall
+from browser_pool import get_session_pool, track_lease, untrack_lease
+from ax_store import AXNodeMap
+from pruning import prune_accessibility_tree, DEFAULT_TREE_TOKEN_BUDGET
+from history import HistorySummary, DEFAULT_HISTORY_WINDOW, window_history, format_history
+from tools import access_url, extract_accessibility_tree, parse_accessibility_tree, resolve_element, execute_click_action, execute_type_action, execute_wait_action, execute_go_home_action, execute_go_back_action, extract_data_from_elements
+
+from components.registry import get_agent
+
+from dataclasses import dataclass
+from typing_extensions import TypedDict, Annotated, Any, Callable, List, Union
 import json
+import operator
+import os
+import time
 
 class State(TypedDict):
     messages: Annotated[List[AnyMessage], add_messages]
     task: str
-    data_from_web_elements: List[str]
+    data_from_web_elements: Annotated[List[str], operator.add] # nodes return only the new items
     web_element: WebElement
     url: str
     driver: object
     accessibility_tree_str: str
-    accessibility_node_map: dict[str, Any]
-    action_history: List[List[Union[str, str, str]]] # [role, name, action]
+    accessibility_node_map: AXNodeMap
+    action_history: Annotated[List[List[Union[str, str, str]]], operator.add] # [role, name, action]
     warn_obs: List[str]
     action: List[Union[int, str]]
+    plan: List[List[Union[int, str]]] # follow-up actions of the last ReAct step, run by execute_plan_node
     tool_count: int = 0
     max_tool_usage: int = 3
     final_anwser: str
+    lease_wait: float
+    settle_times: Annotated[List[List[Union[str, float]]], operator.add] # [action, seconds waited for the page to settle]
+    tree_token_budget: int # 0 keeps the first nodes in page order instead of ranking them against the task
+    task_id: str # tags logs and tracing spans
+    page_fingerprint: str # page state the current accessibility tree was extracted from
+    skipped_extractions: int # extractions skipped because the page had not changed
+    current_url: str # page the browser was left on, recorded when checkpointing (see checkpointing.py)
+    cookies: List[dict] # browser cookies, recorded with current_url
+    history_window: int # recent actions shown in full to the ReAct agent; 0 shows the whole history
+    history_summary: HistorySummary # rolling summary of the actions before the window
+    llm_calls: Annotated[List[LLMCall], operator.add] # tokens, time to first token and latency of every LLM call
+    tokens_used: Annotated[int, operator.add] # prompt + completion tokens of all LLM calls
+    llm_cost: Annotated[float, operator.add]
+    token_budget: int # tokens after which the run goes to the answer; 0 for no limit
+    time_budget: float # seconds after which the run goes to the answer; 0 for no limit
+    started_at: float # wall-clock time the run leased its browser
+    continue_route: str # decision of the check-continue agent (classic topology)
 
 logger = setup_logger("new_agent")
 
+# Most actions one ReAct step may run (its action plus the planned follow-ups).
+MAX_PLAN_ACTIONS = 4
+# Most elements one extract action may read.
+MAX_EXTRACT_ELEMENTS = 20
+# Default per-task budgets; 0 means no limit.
+DEFAULT_TOKEN_BUDGET = int(os.getenv("TASK_TOKEN_BUDGET", "0"))
+DEFAULT_TIME_BUDGET = float(os.getenv("TASK_TIME_BUDGET", "0"))
+
+@traced_node
 def start_driver_and_access_url_node(state: State) -> dict:
+    # Lease failures (e.g. TimeoutError when no session comes back) end the run.
+    pool = get_session_pool()
+    driver_response, lease_wait = pool.lease()
+    track_lease(pool, driver_response)
     try:
-        driver_response = create_webdriver()
-
         access_url(driver_response, state["url"])
         logger.info(f"Accessed URL: {state['url']}")
     except Exception as e:
         logger.error(f"Error in start_driver_and_access_url: {e}")
     return {
         "driver": driver_response,
+        "lease_wait": lease_wait,
+        "started_at": time.time(),
     }
 
+@traced_node
 def extract_accessibility_tree_node(state: State) -> dict:
     webdriver = state["driver"]
 
     if webdriver:
-        accessibility_tree = extract_accessibility_tree(webdriver)
-        accessibility_tree_str, accessibility_node_map = parse_accessibility_tree(accessibility_tree)
+        fingerprint = page_fingerprint(webdriver)
+        if fingerprint is not None and fingerprint == state.get("page_fingerprint") and state.get("accessibility_tree_str") and state.get("accessibility_node_map"):
+            logger.info("Page unchanged since the last extraction, reusing the accessibility tree.")
+            return {
+                "skipped_extractions": state.get("skipped_extractions", 0) + 1
+            }
+
+        accessibility_tree = extract_accessibility_tree(webdriver, incremental=True)
+        token_budget = state.get("tree_token_budget", DEFAULT_TREE_TOKEN_BUDGET)
+        if token_budget:
+            accessibility_tree_str, accessibility_node_map = prune_accessibility_tree(accessibility_tree, state["task"], token_budget)
+        else:
+            accessibility_tree_str, accessibility_node_map = parse_accessibility_tree(accessibility_tree)
 
         if accessibility_tree_str and accessibility_node_map:
             logger.info("Extracted and parsed accessibility tree successfully.")
@@ -60,54 +113,120 @@ def extract_accessibility_tree_node(state: State) -> dict:
 
     return {
         "accessibility_tree_str": accessibility_tree_str,
-        "accessibility_node_map": accessibility_node_map
+        "accessibility_node_map": accessibility_node_map,
+        "page_fingerprint": fingerprint
     }
 
-def reAct_node(state: State) -> dict:
-    reAct = reAct_agent()
+def build_reAct_request(state: State, fused: bool = False) -> tuple[list[AnyMessage], dict, dict]:
+    """
+    Build the conversation messages and the chain input of a ReAct step.
+    Args:
+        state (State): The current graph state.
+        fused (bool): Include the extracted information for the fused ReAct agent.
+    Returns:
+        tuple[list[AnyMessage], dict, dict]: The new messages, the input for the ReAct chain and the
+            state update of the rolling history summary.
+    """
+    history_summary, recent_actions = window_history(
+        state["action_history"],
+        state.get("history_summary"),
+        state.get("history_window", DEFAULT_HISTORY_WINDOW)
+    )
+    action_history = format_history(history_summary, recent_actions)
 
     user_message = f"""
     Message for ReAct Agent:
     Task: {state['task']}
     Accessibility Tree: {state['accessibility_tree_str']}
-    Action History: {json.dumps(state['action_history'])}
+    Action History: {action_history}
     """
 
-    human_message = HumanMessage(content=user_message)
-    
-    new_messages = [human_message]
-
     reAct_input = {
         "accessibility_tree_str": state["accessibility_tree_str"],
-        "action_history": json.dumps(state["action_history"]),
+        "action_history": action_history,
         "task": state["task"]
     }
+    if fused:
+        reAct_input["extracted_info"] = json.dumps(state["data_from_web_elements"])
 
-    try:
-        reAct_response = reAct.invoke(reAct_input)
-
-        thought = reAct_response.thought
-        action = reAct_response.action
+    return [HumanMessage(content=user_message)], reAct_input, {"history_summary": history_summary}
 
-        logger.info(f"ReAct Thought: {thought}")
-        logger.info(f"ReAct Action: {action}")
+def reAct_update(new_messages: list[AnyMessage], reAct_response) -> dict:
+    thought = reAct_response.thought
+    action = reAct_response.action
+    plan = getattr(reAct_response, "plan", [])[:MAX_PLAN_ACTIONS - 1]
 
+    # Thoughts can be long; they are only logged at DEBUG level.
+    logger.debug(f"ReAct Thought: {thought}")
+    logger.info(f"ReAct Action: {action}" + (f", then: {plan}" if plan else ""))
 
-        ai_message = AIMessage(content=f"Thought: {thought}\nAction: {action}")
-        new_messages.append(ai_message)
-
-        return {
-            "messages": new_messages,
-            "action": action
-        }
+    content = f"Thought: {thought}\nAction: {action}"
+    if plan:
+        content += f"\nPlan: {plan}"
+    ai_message = AIMessage(content=content)
+    return {
+        "messages": new_messages + [ai_message],
+        "action": action,
+        "plan": plan
+    }
 
+@dataclass
+class LLMStep:
+    """
+    One LLM call of a node, apart from the call itself, so the sync and async nodes share everything
+    but `invoke`/`ainvoke` (see `run_llm_step` and `agent_async.arun_llm_step`).
+    """
+    agent: str # registry name of the chain
+    input: dict
+    update: Callable[[Any], dict] # state update built from the response
+    fallback: dict # state update when the call fails
+    stream_field: str | None = None # response field whose tokens are streamed
+
+def llm_step_result(step: LLMStep, usage: UsageRecorder, response: Any = None, error: Exception | None = None) -> dict:
+    if error is not None:
+        logger.error(f"Error in the {step.agent} call: {error}")
+        return {**step.fallback, **usage.update(step.input)}
+    return {**step.update(response), **usage.update(step.input, response)}
+
+def run_llm_step(step: LLMStep) -> dict:
+    usage = UsageRecorder(step.agent)
+    try:
+        stream = TokenStreamHandler(step.agent, step.stream_field) if step.stream_field else None
+        response = get_agent(step.agent).invoke(step.input, config=usage.config(stream.config() if stream else None))
+        if stream:
+            stream.finish(getattr(response, step.stream_field))
+        return llm_step_result(step, usage, response)
     except Exception as e:
-        logger.error(f"Error in reAct_node: {e}")
-        return {
+        return llm_step_result(step, usage, error=e)
+
+def reAct_step(state: State, agent_name: str, fused: bool) -> LLMStep:
+    new_messages, reAct_input, history_update = build_reAct_request(state, fused)
+    return LLMStep(
+        agent=agent_name,
+        input=reAct_input,
+        update=lambda response: {**reAct_update(new_messages, response), **history_update},
+        fallback={
             "messages": new_messages,
-            "action": []
-        }
+            "action": [],
+            "plan": [],
+            **history_update
+        },
+        stream_field="thought"
+    )
 
+@traced_node
+def reAct_node(state: State) -> dict:
+    return run_llm_step(reAct_step(state, "reAct", fused=False))
+
+@traced_node
+def fused_reAct_node(state: State) -> dict:
+    """
+    ReAct step for the fused topology: the agent also sees the extracted information and can
+    choose `finish`, which replaces the separate check-continue call.
+    """
+    return run_llm_step(reAct_step(state, "reAct_fused", fused=True))
+
+@traced_node
 def click_node(
     state: State
 ) -> dict:
@@ -132,28 +251,31 @@ def click_node(
             "warn_obs": error
         }
         
-    web_element, role, name = extract_element_from_accessibility_tree(
+    element = resolve_element(
         node_idx=element_index,
         node_map=accessibility_node_map,
         driver=driver
     )
 
-    if not web_element:
+    if not element:
         error = f"Web element not found for index: {element_index}"
         logger.error(error)
         return {
             "warn_obs": error
         }
+
+    role, name = element["role"], element["name"]
         
     try:
-        execute_click_action(
+        settle_wait = execute_click_action(
             driver=driver,
-            web_element=web_element
+            element=element
         )
-        logger.info(f"Executed click action on element index: {element_index}")
+        logger.info(f"Executed click action on element index: {element_index} (settled in {settle_wait:.2f}s)")
         return {
             "warn_obs": "",
-            "action_history": state["action_history"] + [[role, name, "click"]],
+            "action_history": [[role, name, "click"]],
+            "settle_times": [["click", settle_wait]],
             "tool_count": state["tool_count"] + 1
         }
     except Exception as e:
@@ -164,6 +286,7 @@ def click_node(
         }
 
 ### NEED DEBUGGING
+@traced_node
 def type_node(state: State) -> dict:
     driver = state["driver"]
     accessibility_node_map = state["accessibility_node_map"]
@@ -187,29 +310,32 @@ def type_node(state: State) -> dict:
             "warn_obs": error
         }
         
-    web_element, role, name = extract_element_from_accessibility_tree(
+    element = resolve_element(
         node_idx=element_index,
         node_map=accessibility_node_map,
         driver=driver
     )
 
-    if not web_element:
+    if not element:
         error = f"Web element not found for index: {element_index}"
         logger.error(error)
         return {
             "warn_obs": error
         }
+
+    role, name = element["role"], element["name"]
     
     try:
-        execute_type_action(
+        warn_obs, settle_wait = execute_type_action(
             driver=driver,
-            web_element=web_element,
+            element=element,
             text=text_to_type
         )
-        logger.info(f"Executed type action on element index: {element_index}")
+        logger.info(f"Executed type action on element index: {element_index} (settled in {settle_wait:.2f}s)")
         return {
-            "warn_obs": "",
-            "action_history": state["action_history"] + [[role, name, f"Type {text_to_type}"]],
+            "warn_obs": warn_obs,
+            "action_history": [[role, name, f"Type {text_to_type}"]],
+            "settle_times": [["type", settle_wait]],
             "tool_count": state["tool_count"] + 1
         }
     except Exception as e:
@@ -220,6 +346,7 @@ def type_node(state: State) -> dict:
         }
 
         
+@traced_node
 def wait_node(state: State) -> dict:
     driver = state["driver"]
 
@@ -231,11 +358,12 @@ def wait_node(state: State) -> dict:
         }
     
     try:
-        execute_wait_action(driver=driver)
-        logger.info("Executed wait action.")
+        settle_wait = execute_wait_action(driver=driver)
+        logger.info(f"Executed wait action (settled in {settle_wait:.2f}s).")
         return {
             "warn_obs": "",
-            "action_history": state["action_history"] + [["N/A", "N/A", "wait"]],
+            "action_history": [["N/A", "N/A", "wait"]],
+            "settle_times": [["wait", settle_wait]],
             "tool_count": state["tool_count"] + 1
         }
     except Exception as e:
@@ -245,6 +373,7 @@ def wait_node(state: State) -> dict:
             "warn_obs": error
         }
 
+@traced_node
 def go_home_node(state: State) -> dict:
     driver = state["driver"]
 
@@ -256,11 +385,12 @@ def go_home_node(state: State) -> dict:
         }
     
     try:
-        execute_go_home_action(driver=driver)
-        logger.info("Executed go home action.")
+        settle_wait = execute_go_home_action(driver=driver)
+        logger.info(f"Executed go home action (settled in {settle_wait:.2f}s).")
         return {
             "warn_obs": "",
-            "action_history": state["action_history"] + [["N/A", "N/A", "go_home"]],
+            "action_history": [["N/A", "N/A", "go_home"]],
+            "settle_times": [["go_home", settle_wait]],
             "tool_count": state["tool_count"] + 1
         }
     except Exception as e:
@@ -270,6 +400,7 @@ def go_home_node(state: State) -> dict:
             "warn_obs": error
         }
 
+@traced_node
 def go_back_node(state: State) -> dict:
     driver = state["driver"]
 
@@ -281,11 +412,12 @@ def go_back_node(state: State) -> dict:
         }
     
     try:
-        execute_go_back_action(driver=driver)
-        logger.info("Executed go back action.")
+        settle_wait = execute_go_back_action(driver=driver)
+        logger.info(f"Executed go back action (settled in {settle_wait:.2f}s).")
         return {
             "warn_obs": "",
-            "action_history": state["action_history"] + [["N/A", "N/A", "go_back"]],
+            "action_history": [["N/A", "N/A", "go_back"]],
+            "settle_times": [["go_back", settle_wait]],
             "tool_count": state["tool_count"] + 1
         }
     except Exception as e:
@@ -295,6 +427,7 @@ def go_back_node(state: State) -> dict:
             "warn_obs": error
         }
 
+@traced_node
 def extract_data_node(state: State) -> dict:
     driver = state["driver"]
     accessibility_node_map = state["accessibility_node_map"]
@@ -307,7 +440,8 @@ def extract_data_node(state: State) -> dict:
             "warn_obs": error
         }
     
-    element_index = action[0]
+    # The index may be a list, to read several elements (e.g. a table row) in one step.
+    element_indices = action[0] if isinstance(action[0], list) else [action[0]]
     action_type = action[1]
 
     if "extract" not in action_type.lower():
@@ -317,26 +451,34 @@ def extract_data_node(state: State) -> dict:
             "warn_obs": error
         }
 
-    web_element, role, name = extract_element_from_accessibility_tree(
-        node_idx=element_index,
-        node_map=accessibility_node_map,
-        driver=driver
-    )
+    elements = []
+    missing = []
+    for element_index in element_indices[:MAX_EXTRACT_ELEMENTS]:
+        element = resolve_element(
+            node_idx=element_index,
+            node_map=accessibility_node_map,
+            driver=driver
+        )
+        if element:
+            elements.append(element)
+        else:
+            missing.append(element_index)
 
-    if not web_element:
-        error = f"Web element not found for index: {element_index}"
+    if not elements:
+        error = f"Web element not found for index: {', '.join(map(str, missing))}"
         logger.error(error)
         return {
             "warn_obs": error
         }
     
     try:
-        extracted_data = extract_data_from_element(web_element=web_element)
-        logger.info(f"Extracted data from element index: {element_index}")
+        extracted_data = extract_data_from_elements(driver=driver, elements=elements)
+        logger.info(f"Extracted data from {len(extracted_data)} element(s): {[element['role'] for element in elements]}")
+        warn_obs = f"Web element not found for index: {', '.join(map(str, missing))}" if missing else ""
         return {
-            "warn_obs": "",
-            "data_from_web_elements": state["data_from_web_elements"] + [extracted_data],
-            "action_history": state["action_history"] + [[role, name, "extract"]],
+            "warn_obs": warn_obs,
+            "data_from_web_elements": extracted_data,
+            "action_history": [[element["role"], element["name"], "extract"] for element in elements],
             "tool_count": state["tool_count"] + 1
         }
     except Exception as e:
@@ -346,12 +488,16 @@ def extract_data_node(state: State) -> dict:
             "warn_obs": error
         }
     
-def route_workflow_node(state: State): 
-    action = state.get("action", [])
-
+def action_route(action: List[Union[int, str]]) -> str:
+    """
+    Name of the node that runs `action`; "extract_accessibility_tree" for missing or unknown actions.
+    """
     if not action or len(action) < 2:
         logger.warning("No valid action found. Routing back to agent.")
         return "extract_accessibility_tree"
+    if not isinstance(action[1], str):
+        logger.warning(f"Malformed action {action}: the action type is not a string. Routing to answer node.")
+        return "answer"
     
     action_type = action[1].lower()
 
@@ -367,59 +513,172 @@ def route_workflow_node(state: State):
         return "go_back"
     elif "extract" in action_type:
         return "extract_data"
+    elif "finish" in action_type:
+        return "answer"
     else:
         logger.warning(f"Unknown action type: {action_type}. Routing back to agent.")
         return "extract_accessibility_tree"
+
+@traced_node
+def route_workflow_node(state: State): 
+    if run_budget_exhausted(state):
+        return "answer"
+    route = action_route(state.get("action", []))
+    if state.get("plan") and route in PLAN_STEP_NODES:
+        return "execute_plan"
+    return route
+
+PLAN_STEP_NODES = {
+    "click": click_node,
+    "type": type_node,
+    "wait": wait_node,
+    "go_home": go_home_node,
+    "go_back": go_back_node,
+    "extract_data": extract_data_node,
+}
+# Steps after which the tree shown to the agent is always outdated.
+NAVIGATING_STEPS = {"go_home", "go_back"}
+# State keys whose updates are appended (see State).
+APPEND_KEYS = {"action_history", "data_from_web_elements", "settle_times"}
+
+@traced_node
+def execute_plan_node(state: State) -> dict:
+    """
+    Run the ReAct action and its planned follow-ups in order against the same accessibility tree.
+    The plan stops early when a step fails (e.g. its element is missing), the page navigates to a new
+    document, the tool budget runs out or a step is not a browser action; the agent then sees a fresh tree.
+    """
+    driver = state["driver"]
+    steps = [state["action"]] + state.get("plan", [])
+    current = dict(state)
+    update = {}
+    document_id = current_document_id(driver) if driver and len(steps) > 1 else None
+
+    for i, action in enumerate(steps[:MAX_PLAN_ACTIONS]):
+        route = action_route(action)
+        node = PLAN_STEP_NODES.get(route)
+        if node is None:
+            logger.info(f"Plan stopped at step {i + 1}: {action} is not a browser action.")
+            break
+        if i > 0 and budget_exhausted(current):
+            break
+
+        step_update = node({**current, "action": action})
+        for key, value in step_update.items():
+            if key in APPEND_KEYS:
+                # Keys with an append reducer: steps return only their new items, and no step reads them.
+                update[key] = update.get(key, []) + value
+            else:
+                current[key] = value
+                update[key] = value
+
+        if current["tool_count"] == state["tool_count"] + i:
+            logger.info(f"Plan stopped at step {i + 1}: {action} failed.")
+            break
+        if i + 1 == min(len(steps), MAX_PLAN_ACTIONS):
+            break
+        if route in NAVIGATING_STEPS or current_document_id(driver) != document_id:
+            logger.info(f"Plan stopped after step {i + 1}: the page navigated.")
+            break
+
+    update["plan"] = []
+    logger.info(f"Executed {current['tool_count'] - state['tool_count']} of {len(steps)} planned actions.")
+    return update
     
-def should_continue_node(state: State) -> dict:
+def build_check_continue_request(state: State) -> tuple[list[AnyMessage], dict]:
+    user_message = f"""
+    Message for Check Continue Agent:
+    Task: {state['task']}
+    Extracted Information: {json.dumps(state['data_from_web_elements'])}
+    Accessibility Tree: {state['accessibility_tree_str']}
+    """
+
+    check_continue_input = {
+        'extracted_info': json.dumps(state["data_from_web_elements"]),
+        'accessibility_tree_str': state["accessibility_tree_str"],
+        'task': state["task"]
+    }
+
+    return [HumanMessage(content=user_message)], check_continue_input
+
+def tool_budget_exhausted(state: State) -> bool:
     tool_count = state.get("tool_count", 0)
     max_tool_usage = state.get("max_tool_usage", 10)
 
     if tool_count >= max_tool_usage:
-        logger.info(f"Reached maximum tool usage: {tool_count}/{max_tool_usage}. Routing to summarize node.")
-        return "anwser"
-    else:
-        logger.info(f"Tool usage: {tool_count}/{max_tool_usage}. Invoking Check Continue Agent.")
-        check_continue = create_check_continue_agent()
-        user_message = f"""
-        Message for Check Continue Agent:
-        Task: {state['task']}
-        Extracted Information: {json.dumps(state['data_from_web_elements'])}
-        Accessibility Tree: {state['accessibility_tree_str']}
-        """
-
-        human_message = HumanMessage(content=user_message)
-
-        new_messages = [human_message]
-
-        check_continue_input = {
-            'extracted_info': json.dumps(state["data_from_web_elements"]),
-            'accessibility_tree_str': state["accessibility_tree_str"],
-            'task': state["task"]
-        }
+        logger.info(f"Reached maximum tool usage: {tool_count}/{max_tool_usage}. Routing to answer node.")
+        return True
 
-        try:
-            check_continue_response = check_continue.invoke(check_continue_input)
+    logger.info(f"Tool usage: {tool_count}/{max_tool_usage}.")
+    return False
 
-            decision = check_continue_response.decision
+def run_budget_exhausted(state: State) -> bool:
+    """
+    Whether the run used up its token budget or its wall-clock budget.
+    """
+    token_budget = state.get("token_budget", DEFAULT_TOKEN_BUDGET)
+    tokens_used = state.get("tokens_used", 0)
+    if token_budget and tokens_used >= token_budget:
+        logger.info(f"Reached the token budget: {tokens_used}/{token_budget}. Routing to answer node.")
+        return True
+
+    time_budget = state.get("time_budget", DEFAULT_TIME_BUDGET)
+    started_at = state.get("started_at")
+    if time_budget and started_at and time.time() - started_at >= time_budget:
+        logger.info(f"Reached the time budget: {time.time() - started_at:.1f}/{time_budget:.1f}s. Routing to answer node.")
+        return True
+    return False
+
+def budget_exhausted(state: State) -> bool:
+    return tool_budget_exhausted(state) or run_budget_exhausted(state)
+
+def check_continue_route(decision: str) -> str:
+    logger.info(f"Decision for continue or stop using web interaction: {decision}")
+
+    if "FINAL ANSWER" in decision.upper():
+        return "answer"
+    else:
+        return "extract_accessibility_tree"
 
-            logger.info(f"Decision for continue or stop using web interaction: {decision}")
+def check_continue_step(state: State) -> LLMStep:
+    _, check_continue_input = build_check_continue_request(state)
+    return LLMStep(
+        agent="check_continue",
+        input=check_continue_input,
+        update=lambda response: {"continue_route": check_continue_route(response.decision)},
+        # Keep browsing when the decision cannot be made.
+        fallback={"continue_route": "extract_accessibility_tree"}
+    )
 
-            ai_message = AIMessage(content=f'Decision: {decision}')
-            new_messages.append(ai_message)
+@traced_node
+def should_continue_node(state: State) -> dict:
+    """
+    Ask the check-continue agent whether to keep browsing (classic topology). The decision is stored
+    in `continue_route` for `continue_route_node`, together with the usage of the LLM call.
+    """
+    if budget_exhausted(state):
+        return {
+            "continue_route": "answer"
+        }
 
-        except Exception as e:
-            logger.error(f"Error in should_continue_node: {e}")
-            decision = "CONTINUE"
+    logger.info("Invoking Check Continue Agent.")
+    return run_llm_step(check_continue_step(state))
 
-        if "FINAL ANSWER" in decision.upper():
-            return "answer"
-        else:
-            return "extract_accessibility_tree"
+def continue_route_node(state: State) -> str:
+    return state.get("continue_route") or "extract_accessibility_tree"
     
-def answer_node(state: State):
-    answer = create_answer_agent()
+@traced_node
+def check_tool_budget_node(state: State) -> str:
+    """
+    Routing for the fused topology: no LLM call, the ReAct agent decides when to finish.
+    """
+    if budget_exhausted(state):
+        return "answer"
+
+    logger.info("Continuing with the fused ReAct agent.")
+    return "extract_accessibility_tree"
 
+def build_answer_request(state: State) -> tuple[list[AnyMessage], dict]:
     user_message = f"""
     Message for Answer Agent:
     Task: {state['task']}
@@ -427,43 +686,55 @@ def answer_node(state: State):
     Accessibility Tree: {state['accessibility_tree_str']}
     """
 
-    human_message = HumanMessage(content=user_message)
-
-    new_messages = [human_message]
     answer_input = {
         "extracted_info": json.dumps(state["data_from_web_elements"]),
         "accessibility_tree_str": state["accessibility_tree_str"],
         "task": state["task"]
     }
 
-    try:
-        answer_response = answer.invoke(answer_input)
+    return [HumanMessage(content=user_message)], answer_input
 
-        final_answer = answer_response.answer
+def answer_update(new_messages: list[AnyMessage], answer_response) -> dict:
+    final_answer = answer_response.answer
 
-        logger.info(f"Final Answer: {final_answer}")
+    logger.info(f"Final Answer: {final_answer}")
 
-        ai_message = AIMessage(content=f"Final Answer: {final_answer}")
-        new_messages.append(ai_message)
+    ai_message = AIMessage(content=f"Final Answer: {final_answer}")
+    return {
+        "messages": new_messages + [ai_message],
+        "final_anwser": final_answer
+    }
 
-        return {
-            "messages": new_messages,
-            "final_anwser": final_answer
-        }
-    except Exception as e:
-        logger.error(f"Error in answer_node: {e}")
-        return {
+def answer_step(state: State) -> LLMStep:
+    new_messages, answer_input = build_answer_request(state)
+    return LLMStep(
+        agent="answer",
+        input=answer_input,
+        update=lambda response: answer_update(new_messages, response),
+        fallback={
             "messages": new_messages,
             "final_anwser": ""
-        }
-
-
-    
-
-
+        },
+        stream_field="answer"
+    )
 
+@traced_node
+def answer_node(state: State):
+    return run_llm_step(answer_step(state))
 
+@traced_node
+def release_driver_node(state: State) -> dict:
+    driver = state.get("driver")
 
+    if not driver:
+        return {}
 
+    pool = get_session_pool()
+    untrack_lease(driver)
+    pool.release(driver)
 
-            
+    stats = pool.stats()
+    logger.info(f"Released WebDriver session. Leases: {stats['leases']}, reused: {stats['reused']}, total lease wait: {stats['total_lease_wait']:.3f}s")
+    return {
+        "driver": None
+    }
@@ -0,0 +1,119 @@
+from utils import setup_logger
+from browser_pool import get_session_pool, track_lease, DEFAULT_LEASE_TIMEOUT
+from tools import access_url
+from tracing import traced_node
+from streaming import AsyncTokenStreamHandler
+from usage import UsageRecorder
+from agent import State, LLMStep, extract_accessibility_tree_node, click_node, type_node, wait_node, go_home_node, go_back_node, extract_data_node, execute_plan_node, release_driver_node, reAct_step, check_continue_step, answer_step, budget_exhausted, llm_step_result
+
+from components.registry import aget_agent
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+import asyncio
+import contextvars
+import os
+import time
+
+logger = setup_logger("async_agent")
+
+# Selenium has no asyncio transport, so WebDriver and CDP calls run on a bounded pool of threads.
+# LLM calls use the chains' native `ainvoke` and never hold one of these threads.
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "16"))
+LEASE_POLL = 0.05
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="webdriver")
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking call on the bounded WebDriver executor, keeping the caller's context variables.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, partial(context.run, fn, *args, **kwargs))
+
+def _offload(node: Callable[[State], dict]) -> Callable:
+    async def run(state: State) -> dict:
+        return await run_blocking(node, state)
+
+    run.__name__ = f"a{node.__name__}"
+    run.__doc__ = f"Async version of `{node.__name__}`, run on the WebDriver executor."
+    return run
+
+aextract_accessibility_tree_node = _offload(extract_accessibility_tree_node)
+aclick_node = _offload(click_node)
+atype_node = _offload(type_node)
+await_node = _offload(wait_node)
+ago_home_node = _offload(go_home_node)
+ago_back_node = _offload(go_back_node)
+aextract_data_node = _offload(extract_data_node)
+aexecute_plan_node = _offload(execute_plan_node)
+arelease_driver_node = _offload(release_driver_node)
+
+@traced_node
+async def astart_driver_and_access_url_node(state: State) -> dict:
+    """
+    Lease a session without blocking an executor thread while every session is busy: the pool is
+    polled, so tasks waiting for a browser never starve the ones that hold one.
+    """
+    pool = get_session_pool()
+    driver_response = None
+    start = time.perf_counter()
+    while driver_response is None:
+        try:
+            driver_response, _ = await run_blocking(pool.lease, timeout=0)
+        except TimeoutError:
+            if time.perf_counter() - start >= DEFAULT_LEASE_TIMEOUT:
+                raise TimeoutError(f"No browser session became available within {DEFAULT_LEASE_TIMEOUT}s.")
+            await asyncio.sleep(LEASE_POLL)
+    track_lease(pool, driver_response)
+
+    try:
+        await run_blocking(access_url, driver_response, state["url"])
+        logger.info(f"Accessed URL: {state['url']}")
+    except Exception as e:
+        logger.error(f"Error in astart_driver_and_access_url: {e}")
+    return {
+        "driver": driver_response,
+        "lease_wait": time.perf_counter() - start,
+        "started_at": time.time(),
+    }
+
+async def arun_llm_step(step: LLMStep) -> dict:
+    """
+    Async version of `run_llm_step`.
+    """
+    usage = UsageRecorder(step.agent)
+    try:
+        stream = AsyncTokenStreamHandler(step.agent, step.stream_field) if step.stream_field else None
+        agent = await aget_agent(step.agent)
+        response = await agent.ainvoke(step.input, config=usage.config(stream.config() if stream else None))
+        if stream:
+            await stream.afinish(getattr(response, step.stream_field))
+        return llm_step_result(step, usage, response)
+    except Exception as e:
+        return llm_step_result(step, usage, error=e)
+
+@traced_node
+async def areAct_node(state: State) -> dict:
+    return await arun_llm_step(reAct_step(state, "reAct", fused=False))
+
+@traced_node
+async def afused_reAct_node(state: State) -> dict:
+    return await arun_llm_step(reAct_step(state, "reAct_fused", fused=True))
+
+@traced_node
+async def ashould_continue_node(state: State) -> dict:
+    if budget_exhausted(state):
+        return {
+            "continue_route": "answer"
+        }
+
+    logger.info("Invoking Check Continue Agent.")
+    return await arun_llm_step(check_continue_step(state))
+
+@traced_node
+async def aanswer_node(state: State) -> dict:
+    return await arun_llm_step(answer_step(state))
@@ -0,0 +1,186 @@
+from selenium import webdriver
+
+from utils import setup_logger
+from ax_store import AXTreeStore
+
+from typing import Any, TypedDict
+import time
+import weakref
+
+logger = setup_logger("ax_cache")
+
+MAX_DIRTY_ROOTS = 16
+# Rough size of a serialized CDP accessibility node. Fetch sizes are estimated from node counts rather
+# than by serializing results again; with tracing on, the CDP spans record the exact response sizes.
+ESTIMATED_NODE_BYTES = 400
+
+# Collapse the nodes the mutation tracker (see settle.py) marked dirty to their top-most connected
+# elements, park them in `pending` and reset the tracker. Returns [doc id, needs full refetch, root count].
+COLLECT_DIRTY_ROOTS = f"""
+(() => {{
+    const state = window.__wiaMutations;
+    if (!state) return null;
+    const dirty = [...state.dirty].map((n) => n.nodeType === Node.ELEMENT_NODE ? n : n.parentElement).filter((n) => n && n.isConnected);
+    const overflow = state.overflow;
+    state.dirty.clear();
+    state.overflow = false;
+    const roots = [...new Set(dirty)].filter((n, _, all) => !all.some((o) => o !== n && o.contains(n)));
+    const full = overflow || roots.length > {MAX_DIRTY_ROOTS} || roots.some((n) => n === document.documentElement || n === document.body);
+    state.pending = full ? [] : roots;
+    return [state.doc, full, state.pending.length];
+}})()
+"""
+OBJECT_GROUP = "web_interacting_agent_ax_cache"
+
+class FetchStats(TypedDict):
+    mode: str # "full", "incremental" or "cached"
+    bytes: int # estimated from the number of fetched nodes
+    seconds: float
+    subtrees: int
+
+
+class AccessibilityTreeCache:
+    """
+    Keep the last accessibility tree of a driver and patch it with the subtrees that changed.
+
+    The Accessibility domain is enabled once so AX node ids stay stable between fetches. Changes are
+    detected with the document id and dirty nodes recorded by the page mutation tracker: a new document
+    triggers a full `Accessibility.getFullAXTree`, an unchanged page reuses the cached tree and a few
+    changed elements are refetched with `Accessibility.queryAXTree`.
+    """
+
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.nodes: dict[str, dict[str, Any]] = {}
+        self.doc_id: str | None = None
+        self.enabled = False
+        self.store: AXTreeStore | None = None
+        self.last_fetch: FetchStats = {"mode": "full", "bytes": 0, "seconds": 0.0, "subtrees": 0}
+        self.total_bytes = 0
+
+    def _enable(self) -> None:
+        if not self.enabled:
+            self.driver.execute_cdp_cmd("Accessibility.enable", {})
+            self.enabled = True
+
+    def _collect_dirty_roots(self) -> tuple[str | None, bool, int]:
+        result = self.driver.execute_cdp_cmd(
+            "Runtime.evaluate",
+            {
+                "expression": COLLECT_DIRTY_ROOTS,
+                "returnByValue": True,
+            }
+        )
+        value = result.get("result", {}).get("value")
+        if not value:
+            return None, True, 0
+        doc_id, full, root_count = value
+        return doc_id, full, root_count
+
+    def _resolve_pending_roots(self) -> list[str]:
+        result = self.driver.execute_cdp_cmd(
+            "Runtime.evaluate",
+            {
+                "expression": "window.__wiaMutations.pending",
+                "objectGroup": OBJECT_GROUP,
+            }
+        )
+        properties = self.driver.execute_cdp_cmd(
+            "Runtime.getProperties",
+            {
+                "objectId": result["result"]["objectId"],
+                "ownProperties": True,
+            }
+        )
+        return [
+            prop["value"]["objectId"]
+            for prop in properties.get("result", [])
+            if prop["name"].isdigit() and "objectId" in prop.get("value", {})
+        ]
+
+    def _fetch_full(self) -> int:
+        result = self.driver.execute_cdp_cmd("Accessibility.getFullAXTree", {})
+
+        self.nodes = {}
+        nodes = result.get("nodes", [])
+        for node in nodes:
+            self.nodes.setdefault(node["nodeId"], node)
+        return len(nodes) * ESTIMATED_NODE_BYTES
+
+    def _patch_subtree(self, object_id: str) -> int:
+        result = self.driver.execute_cdp_cmd("Accessibility.queryAXTree", {"objectId": object_id})
+        subtree = result.get("nodes", [])
+        if not subtree:
+            return 0
+
+        top_id = subtree[0]["nodeId"]
+        if top_id not in self.nodes:
+            raise KeyError(f"Changed subtree root {top_id} is not in the cached tree.")
+
+        stack = list(self.nodes[top_id].get("childIds", []))
+        while stack:
+            removed = self.nodes.pop(stack.pop(), None)
+            if removed:
+                stack.extend(removed.get("childIds", []))
+
+        for node in subtree:
+            self.nodes[node["nodeId"]] = node
+        return len(subtree) * ESTIMATED_NODE_BYTES
+
+    def refresh(self) -> AXTreeStore:
+        """
+        Bring the cached tree up to date with the page.
+        Returns:
+            AXTreeStore: The tree in columnar form, rebuilt only when the page changed.
+        """
+        start = time.perf_counter()
+        self._enable()
+
+        doc_id, full, root_count = self._collect_dirty_roots()
+        if doc_id is None or doc_id != self.doc_id or not self.nodes:
+            full = True
+
+        fetched = 0
+        mode = "cached"
+        if not full and root_count:
+            mode = "incremental"
+            try:
+                for object_id in self._resolve_pending_roots():
+                    fetched += self._patch_subtree(object_id)
+            except Exception as e:
+                logger.warning(f"Incremental accessibility tree patch failed, refetching full tree: {e}")
+                full = True
+            finally:
+                try:
+                    self.driver.execute_cdp_cmd("Runtime.releaseObjectGroup", {"objectGroup": OBJECT_GROUP})
+                except Exception as e:
+                    # E.g. the target went away with a navigation; its objects went with it.
+                    logger.warning(f"Unable to release the dirty root handles: {e}")
+
+        if full:
+            mode = "full"
+            fetched = self._fetch_full()
+
+        self.doc_id = doc_id
+        self.total_bytes += fetched
+        self.last_fetch = {
+            "mode": mode,
+            "bytes": fetched,
+            "seconds": time.perf_counter() - start,
+            "subtrees": 0 if full else root_count,
+        }
+        logger.info(f"Accessibility tree fetch: {self.last_fetch}")
+
+        if mode != "cached" or self.store is None:
+            self.store = AXTreeStore.from_nodes(list(self.nodes.values()))
+        return self.store
+
+
+_caches: "weakref.WeakKeyDictionary[webdriver.Chrome, AccessibilityTreeCache]" = weakref.WeakKeyDictionary()
+
+def get_ax_tree_cache(driver: webdriver.Chrome) -> AccessibilityTreeCache:
+    cache = _caches.get(driver)
+    if cache is None:
+        cache = AccessibilityTreeCache(driver)
+        _caches[driver] = cache
+    return cache
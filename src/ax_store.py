@@ -0,0 +1,171 @@
+from array import array
+from typing import Any, Iterator
+
+
+# Role id of the rows not decoded yet.
+UNDECODED = 0xFFFFFFFF
+
+
+class AXTreeStore:
+    """
+    Array-backed accessibility tree over a CDP node list.
+
+    Roles are interned in a small table, names live in a string table and backendDOMNodeIds are
+    packed into an `array('q')`. Rows are decoded from the CDP nodes the first time they are read,
+    so building a store only indexes the node ids and a walk that stops after a few hundred elements
+    costs about as much as those elements, not the whole page. Positions follow the order of the CDP
+    node list.
+    """
+
+    __slots__ = ("nodes", "position", "roles", "names", "role_table", "name_table", "role_ids", "name_ids", "backend_ids", "root")
+
+    def __init__(self, nodes: list[dict[str, Any]] | None = None):
+        self.nodes = nodes or []
+        self.position = {node["nodeId"]: i for i, node in enumerate(self.nodes)}
+        self.roles: list[str] = []
+        self.names: list[str] = []
+        self.role_table: dict[str, int] = {}
+        self.name_table: dict[str, int] = {}
+        self.role_ids = array("I", [UNDECODED]) * len(self.nodes)
+        self.name_ids = array("I", [0]) * len(self.nodes)
+        self.backend_ids = array("q", [0]) * len(self.nodes)
+        self.root = self.position[self.nodes[0]["nodeId"]] if self.nodes else 0
+
+    @classmethod
+    def from_nodes(cls, nodes: list[dict[str, Any]]) -> "AXTreeStore":
+        """
+        Build a store from CDP accessibility nodes. When a nodeId occurs more than once the last node wins.
+        Args:
+            nodes (list[dict[str, Any]]): Nodes as returned by `Accessibility.getFullAXTree`, root first.
+                They are decoded lazily and must not be modified afterwards.
+        Returns:
+            AXTreeStore: The columnar tree.
+        """
+        return cls(nodes)
+
+    def decode(self, i: int) -> int:
+        """
+        Decode the role, name and backendDOMNodeId of row `i` from its CDP node.
+        Returns:
+            int: The role id of the row.
+        """
+        node = self.nodes[i]
+        try:
+            role = node["role"]["value"]
+        except (KeyError, TypeError):
+            role = ""
+        try:
+            name = node["name"]["value"]
+        except (KeyError, TypeError):
+            name = ""
+        if role.__class__ is not str:
+            role = str(role)
+        if name.__class__ is not str:
+            # The text parser never displays nodes without a usable name.
+            name = ""
+
+        role_id = self.role_table.get(role)
+        if role_id is None:
+            role_id = self.role_table[role] = len(self.roles)
+            self.roles.append(role)
+        name_id = self.name_table.get(name)
+        if name_id is None:
+            name_id = self.name_table[name] = len(self.names)
+            self.names.append(name)
+
+        self.role_ids[i] = role_id
+        self.name_ids[i] = name_id
+        self.backend_ids[i] = node.get("backendDOMNodeId") or 0
+        return role_id
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def _row(self, i: int) -> int:
+        if self.role_ids[i] == UNDECODED:
+            self.decode(i)
+        return i
+
+    def role(self, i: int) -> str:
+        return self.roles[self.role_ids[self._row(i)]]
+
+    def name(self, i: int) -> str:
+        return self.names[self.name_ids[self._row(i)]]
+
+    def backend_node_id(self, i: int) -> int:
+        return self.backend_ids[self._row(i)]
+
+    def children(self, i: int) -> list[int]:
+        get_position = self.position.get
+        return [child for child in map(get_position, self.nodes[i].get("childIds") or ()) if child is not None]
+
+
+class AXNodeMap:
+    """
+    Compact map from the display index shown to the LLM (1-based) to the role, name and
+    backendDOMNodeId of the displayed element. Immutable, so state snapshots can share it.
+    """
+
+    __slots__ = ("roles", "names", "role_ids", "name_ids", "backend_ids")
+
+    def __init__(self):
+        self.roles: list[str] = []
+        self.names: list[str] = []
+        self.role_ids = array("I")
+        self.name_ids = array("I")
+        self.backend_ids = array("q")
+
+    @classmethod
+    def from_store(cls, store: AXTreeStore, positions: list[int]) -> "AXNodeMap":
+        """
+        Keep the given store positions, in order, as display indices 1..len(positions).
+        """
+        node_map = cls()
+        role_table: dict[int, int] = {}
+        name_table: dict[int, int] = {}
+
+        for i in positions:
+            store._row(i)
+            role_id = store.role_ids[i]
+            if role_id not in role_table:
+                role_table[role_id] = len(node_map.roles)
+                node_map.roles.append(store.roles[role_id])
+            node_map.role_ids.append(role_table[role_id])
+
+            name_id = store.name_ids[i]
+            if name_id not in name_table:
+                name_table[name_id] = len(node_map.names)
+                node_map.names.append(store.names[name_id])
+            node_map.name_ids.append(name_table[name_id])
+
+            node_map.backend_ids.append(store.backend_ids[i])
+        return node_map
+
+    def __len__(self) -> int:
+        return len(self.backend_ids)
+
+    def __contains__(self, idx: object) -> bool:
+        return isinstance(idx, int) and 1 <= idx <= len(self.backend_ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(1, len(self.backend_ids) + 1))
+
+    def __copy__(self) -> "AXNodeMap":
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "AXNodeMap":
+        return self
+
+    def _check(self, idx: int) -> int:
+        if idx not in self:
+            raise KeyError(idx)
+        return idx - 1
+
+    def role(self, idx: int) -> str:
+        return self.roles[self.role_ids[self._check(idx)]]
+
+    def name(self, idx: int) -> str:
+        return self.names[self.name_ids[self._check(idx)]]
+
+    def backend_node_id(self, idx: int) -> int:
+        return self.backend_ids[self._check(idx)]
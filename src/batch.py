@@ -0,0 +1,313 @@
+"""
+Run a JSONL file of tasks in parallel and stream the results to a JSONL file.
+
+Each input line is an object with `task` and `url` and optionally `max_tool_usage`, `token_budget`,
+`time_budget` (seconds) and `id` (defaults to the line number). Tasks are spread over a pool of worker processes that each own one
+browser session. A result line is appended as soon as its task finishes, so an interrupted run can be
+continued with --resume, which skips every id already recorded without an error. With
+--checkpoint-db, every task also saves a checkpoint after each graph node, and --resume continues the
+unfinished tasks from their last checkpoint instead of starting them over.
+
+Usage, from the repository root:
+    python -m src.batch tasks.jsonl --output results.jsonl --concurrency 4 [--resume] [--fused] [--checkpoint-db checkpoints.sqlite]
+"""
+import os
+import sys
+
+if __package__ == "src":
+    # The modules of this project import each other as top-level modules.
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import setup_logger, log_context, stop_logging
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context, util
+from typing import Any, Iterator, TypedDict
+import argparse
+import json
+import time
+
+logger = setup_logger("batch")
+
+DEFAULT_MAX_TOOL_USAGE = 10
+# A worker owns its only browser, so waiting longer than a launch for it means the session was lost.
+WORKER_LEASE_TIMEOUT = 120
+
+class BatchTask(TypedDict):
+    id: str
+    task: str
+    url: str
+    max_tool_usage: int
+    token_budget: int | None # None keeps TASK_TOKEN_BUDGET
+    time_budget: float | None # None keeps TASK_TIME_BUDGET
+
+class BatchResult(TypedDict):
+    id: str
+    task: str
+    url: str
+    answer: str
+    error: str
+    tool_count: int
+    action_history: list
+    data_from_web_elements: list[str]
+    seconds: float
+    lease_wait: float
+    settle_seconds: float
+    skipped_extractions: int
+    tokens_used: int
+    llm_seconds: float
+    llm_cost: float
+    worker: int
+
+
+def read_tasks(path: str) -> Iterator[BatchTask]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield {
+                "id": str(record.get("id", line_number)),
+                "task": record["task"],
+                "url": record["url"],
+                "max_tool_usage": int(record.get("max_tool_usage", DEFAULT_MAX_TOOL_USAGE)),
+                "token_budget": int(record["token_budget"]) if "token_budget" in record else None,
+                "time_budget": float(record["time_budget"]) if "time_budget" in record else None,
+            }
+
+def read_completed_ids(path: str) -> set[str]:
+    """
+    Ids that already have a successful result in `path`. Unreadable lines (e.g. a line cut short
+    by an interrupted run) are ignored.
+    """
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if result.get("error"):
+                completed.discard(result.get("id"))
+            else:
+                completed.add(result.get("id"))
+    return completed
+
+def build_initial_state(task: BatchTask, tree_token_budget: int | None = None) -> dict[str, Any]:
+    state = {
+        "messages": [],
+        "task": task["task"],
+        "data_from_web_elements": [],
+        "web_element": None,
+        "url": task["url"],
+        "driver": None,
+        "accessibility_tree_str": "",
+        "action_history": [],
+        "warn_obs": [],
+        "action": [],
+        "plan": [],
+        "tool_count": 0,
+        "skipped_extractions": 0,
+        "max_tool_usage": task["max_tool_usage"],
+        "final_anwser": "",
+        "task_id": task["id"],
+    }
+    if tree_token_budget is not None:
+        state["tree_token_budget"] = tree_token_budget
+    if task.get("token_budget") is not None:
+        state["token_budget"] = task["token_budget"]
+    if task.get("time_budget") is not None:
+        state["time_budget"] = task["time_budget"]
+    return state
+
+
+# Per-process state of a worker: its compiled graph and options.
+_graph = None
+_tree_token_budget: int | None = None
+_checkpointed = False
+_resume = False
+
+def _export_traces(tracer, trace_dir: str) -> None:
+    path = os.path.join(trace_dir, f"trace-{os.getpid()}")
+    tracer.export_chrome_trace(f"{path}.json")
+    tracer.export_otel_jsonl(f"{path}.otel.jsonl")
+
+def _init_worker(fused: bool, tree_token_budget: int | None, llm_cache: str | None, trace_dir: str | None, browser_profile: str | None, http_cache: str | None, checkpoint_db: str | None, resume: bool) -> None:
+    global _graph, _tree_token_budget, _checkpointed, _resume
+
+    # One browser per worker, launched while the graph is being built.
+    os.environ["BROWSER_POOL_SIZE"] = "1"
+    os.environ.setdefault("BROWSER_LEASE_TIMEOUT", str(WORKER_LEASE_TIMEOUT))
+    if browser_profile:
+        os.environ["BROWSER_PROFILE"] = browser_profile
+    if http_cache:
+        os.environ["HTTP_CACHE_DIR"] = http_cache
+    from browser_pool import get_session_pool
+    from graph import create_graph
+    from components.registry import enable_response_cache
+    from tracing import enable_tracing
+    from checkpointing import sqlite_checkpointer
+
+    pool = get_session_pool()
+    # Pool workers leave through os._exit, which skips atexit; multiprocessing finalizers still run.
+    util.Finalize(pool, pool.close, exitpriority=10)
+    util.Finalize(None, stop_logging, exitpriority=0)
+
+    if llm_cache:
+        enable_response_cache(llm_cache)
+    if trace_dir:
+        tracer = enable_tracing()
+        util.Finalize(tracer, _export_traces, args=(tracer, trace_dir), exitpriority=20)
+
+    checkpointer = sqlite_checkpointer(checkpoint_db) if checkpoint_db else None
+    _graph = create_graph(fused=fused, checkpointer=checkpointer)
+    _tree_token_budget = tree_token_budget
+    _checkpointed = checkpointer is not None
+    _resume = resume
+
+def _run_task(task: BatchTask) -> BatchResult:
+    from browser_pool import session_scope
+
+    start = time.perf_counter()
+    result: BatchResult = {
+        "id": task["id"],
+        "task": task["task"],
+        "url": task["url"],
+        "answer": "",
+        "error": "",
+        "tool_count": 0,
+        "action_history": [],
+        "data_from_web_elements": [],
+        "seconds": 0.0,
+        "lease_wait": 0.0,
+        "settle_seconds": 0.0,
+        "skipped_extractions": 0,
+        "tokens_used": 0,
+        "llm_seconds": 0.0,
+        "llm_cost": 0.0,
+        "worker": os.getpid(),
+    }
+
+    try:
+        # The scope returns the worker's only session to its pool even when the run raises.
+        with log_context(task_id=task["id"]), session_scope():
+            if _checkpointed:
+                from checkpointing import invoke_resumable
+                final_state = invoke_resumable(_graph, build_initial_state(task, _tree_token_budget), thread_id=task["id"], resume=_resume)
+            else:
+                final_state = _graph.invoke(build_initial_state(task, _tree_token_budget))
+        result.update({
+            "answer": final_state.get("final_anwser", ""),
+            "tool_count": final_state.get("tool_count", 0),
+            "action_history": final_state.get("action_history", []),
+            "data_from_web_elements": final_state.get("data_from_web_elements", []),
+            "lease_wait": final_state.get("lease_wait", 0.0),
+            "settle_seconds": sum(seconds for _, seconds in final_state.get("settle_times", [])),
+            "skipped_extractions": final_state.get("skipped_extractions", 0),
+            "tokens_used": final_state.get("tokens_used", 0),
+            "llm_seconds": sum(call["latency"] for call in final_state.get("llm_calls", [])),
+            "llm_cost": final_state.get("llm_cost", 0.0),
+        })
+        if not result["answer"]:
+            # Failed LLM and browser steps are logged and leave the answer empty.
+            result["error"] = "No answer was produced."
+        elif _checkpointed:
+            # The result line is the record of a finished task.
+            _graph.checkpointer.delete_thread(task["id"])
+    except Exception as e:
+        logger.error(f"Task {task['id']} failed: {e}")
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 1,
+    resume: bool = False,
+    fused: bool = False,
+    tree_token_budget: int | None = None,
+    llm_cache: str | None = None,
+    trace_dir: str | None = None,
+    browser_profile: str | None = None,
+    http_cache: str | None = None,
+    checkpoint_db: str | None = None
+) -> dict[str, int]:
+    """
+    Run every task of `input_path` and append one result per task to `output_path`.
+    Args:
+        input_path (str): JSONL file of tasks.
+        output_path (str): JSONL file the results are appended to.
+        concurrency (int): Number of worker processes, and therefore of browsers.
+        resume (bool): Skip tasks that already have a successful result in `output_path`, and continue
+            the others from their last checkpoint when `checkpoint_db` is set.
+        fused (bool): Use the fused graph topology.
+        tree_token_budget (int | None): Override the accessibility tree token budget.
+        llm_cache (str | None): SQLite file of the LLM response cache shared by the workers.
+        trace_dir (str | None): Directory each worker writes its tracing spans to when it exits.
+        browser_profile (str | None): Chrome launch profile of the workers ("full" or "light"); defaults to BROWSER_PROFILE.
+        http_cache (str | None): Directory of the HTTP response cache shared by the workers' browsers.
+        checkpoint_db (str | None): SQLite file the workers save a checkpoint to after every graph node.
+    Returns:
+        dict[str, int]: Counts of submitted, skipped, succeeded and failed tasks.
+    """
+    completed = read_completed_ids(output_path) if resume else set()
+    tasks = [task for task in read_tasks(input_path) if task["id"] not in completed]
+    counts = {"submitted": len(tasks), "skipped": len(completed), "succeeded": 0, "failed": 0}
+    logger.info(f"Running {len(tasks)} tasks with {concurrency} workers ({len(completed)} already completed).")
+
+    if not tasks:
+        return counts
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+
+    mode = "a" if resume else "w"
+    with open(output_path, mode, encoding="utf-8") as output, ProcessPoolExecutor(
+        max_workers=max(1, min(concurrency, len(tasks))),
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(fused, tree_token_budget, llm_cache, trace_dir, browser_profile, http_cache, checkpoint_db, resume),
+    ) as executor:
+        futures = {executor.submit(_run_task, task): task for task in tasks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            task = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died.
+                result = {"id": task["id"], "task": task["task"], "url": task["url"], "error": f"{type(e).__name__}: {e}"}
+
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+            counts["failed" if result.get("error") else "succeeded"] += 1
+            print(f"[{done}/{len(tasks)}] {task['id']}: {'failed' if result.get('error') else 'ok'} ({result.get('seconds', 0.0):.1f}s)", flush=True)
+
+    logger.info(f"Batch finished: {counts}")
+    return counts
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of tasks.")
+    parser.add_argument("--output", required=True, help="JSONL file the results are written to.")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1, help="Number of worker processes (one browser each).")
+    parser.add_argument("--resume", action="store_true", help="Append to --output and skip tasks it already completed.")
+    parser.add_argument("--fused", action="store_true", help="Use the fused graph topology.")
+    parser.add_argument("--tree-token-budget", type=int, help="Token budget for the accessibility tree (0 disables pruning).")
+    parser.add_argument("--llm-cache", help="Answer repeated LLM calls from this SQLite response cache.")
+    parser.add_argument("--trace-dir", help="Trace every task and write Chrome trace and OpenTelemetry JSONL files here.")
+    parser.add_argument("--browser-profile", choices=["full", "light"], help="Chrome launch profile; \"light\" is headless and blocks images, fonts, media and trackers.")
+    parser.add_argument("--http-cache", help="Serve cacheable scripts, stylesheets and HTTP_CACHE_ALLOW API responses from this shared directory.")
+    parser.add_argument("--checkpoint-db", help="Checkpoint every task to this SQLite file, so --resume continues unfinished tasks where they stopped.")
+    args = parser.parse_args(argv)
+
+    counts = run_batch(args.input, args.output, args.concurrency, args.resume, args.fused, args.tree_token_budget, args.llm_cache, args.trace_dir, args.browser_profile, args.http_cache, args.checkpoint_db)
+    print(json.dumps(counts))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+End-to-end benchmark of `create_graph()` against local fixture pages with a scripted LLM.
+
+A local server (fixture_server.py) serves small, huge, SPA-style delayed and multi-tab pages. The
+LLM is replaced by a script of actions per task, so the numbers measure the browser, the tools and
+the graph itself: wall time per node, steps, CDP and WebDriver calls and prompt sizes. Needs Chrome,
+but no Ollama.
+
+Usage (from src/):
+    python -m benchmarks.end_to_end
+    python -m benchmarks.end_to_end --tasks small spa --fused --output e2e.json --baseline e2e_baseline.json
+    python -m benchmarks.end_to_end --browser-profile light --baseline e2e.json
+"""
+from langchain_core.runnables import RunnableLambda
+
+from benchmarks.fixture_server import FixtureServer
+from components import registry
+from components.reAct import ReActSchema
+from components.check_cont import CheckContinueSchema
+from components.answer import AnswerSchema
+from components.template import reAct_prompt, reAct_fused_prompt, check_continue_prompt, answer_prompt
+from pruning import estimate_tokens
+from history import history_size
+from replay import recording, run_timed, Trace
+from batch import build_initial_state
+from agent import MAX_PLAN_ACTIONS
+
+from collections import Counter, defaultdict
+from typing import Any, TypedDict
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+# Each step is (action, role, part of the element name[, text to type]); the scripted ReAct agent looks
+# the element up in the accessibility tree it is shown, like the model would, and plans the following
+# steps whose elements are already in that tree.
+STANDARD_TASKS = [
+    {
+        "name": "small",
+        "path": "small.html",
+        "task": "Find the terms link and find out when the terms were published",
+        "steps": [("click", "link", "Terms"), ("extract_data", "StaticText", "Published")],
+        "expect": "March 3, 2024",
+    },
+    {
+        "name": "huge",
+        "path": "huge.html?n=5000",
+        "task": "Open Item 4321 in the catalogue and read the title of its page",
+        "steps": [("click", "link", "Item 4321"), ("extract_data", "heading", "Terms of use")],
+        "expect": "Terms of use",
+    },
+    {
+        "name": "spa",
+        "path": "spa.html",
+        "task": "Read the dashboard status once it has loaded",
+        "steps": [("extract_data", "StaticText", "Status:")],
+        "expect": "ready",
+    },
+    {
+        "name": "tabs",
+        "path": "tabs.html",
+        "task": "Open the details and read how many orders are open",
+        "steps": [("click", "link", "Open details"), ("extract_data", "StaticText", "Details loaded")],
+        "expect": "42 open orders",
+    },
+    {
+        "name": "form",
+        "path": "form.html",
+        "task": "Save the profile with first name Ada and last name Lovelace and confirm it was saved",
+        "steps": [
+            ("type", "textbox", "First name", "Ada"),
+            ("type", "textbox", "Last name", "Lovelace"),
+            ("click", "button", "Save"),
+            ("extract_data", "StaticText", "Saved profile"),
+        ],
+        "expect": "Ada Lovelace",
+    },
+]
+# How often the scripted agent waits for a missing element before skipping the step.
+MAX_WAITS = 3
+
+_TREE_LINE = re.compile(r"\[(\d+)\]\s+(\S+)\s+'(.*)'$")
+
+class PromptSize(TypedDict):
+    agent: str
+    chars: int
+    tokens: int
+
+
+class ScriptedLLM:
+    """
+    Stand-in for the ReAct, check-continue and answer agents that follows a fixed script.
+    The real prompt templates are still rendered, to measure prompt sizes.
+    """
+
+    def __init__(self, steps: list[tuple[str, ...]], fused: bool):
+        self.steps = list(steps)
+        self.fused = fused
+        self.waits = 0
+        self.prompts: list[PromptSize] = []
+        self.planned: list[tuple[str, ...]] = []
+        self.history_length = 0
+
+    def _measure(self, agent: str, prompt: Any, input: dict) -> None:
+        text = "".join(message.content for message in prompt.format_messages(**input))
+        self.prompts.append({"agent": agent, "chars": len(text), "tokens": estimate_tokens(text)})
+
+    def _find(self, tree_str: str, role: str, name: str) -> int | None:
+        for line in tree_str.splitlines():
+            match = _TREE_LINE.search(line)
+            if match and match.group(2) == role and name.lower() in match.group(3).lower():
+                return int(match.group(1))
+        return None
+
+    def _requeue_unexecuted(self, action_history: str) -> None:
+        # Planned steps the executor skipped (page navigated, element missing) are tried again.
+        history_length = history_size(action_history)
+        executed = max(history_length - self.history_length, 0)
+        self.steps = self.planned[executed:] + self.steps
+        self.planned = []
+        self.history_length = history_length
+
+    def react(self, input: dict) -> ReActSchema:
+        self._measure("reAct", reAct_fused_prompt if self.fused else reAct_prompt, input)
+        self._requeue_unexecuted(input["action_history"])
+
+        while self.steps:
+            action, role, name, *text = self.steps[0]
+            idx = self._find(input["accessibility_tree_str"], role, name)
+            if idx is not None:
+                actions = []
+                while self.steps and len(actions) < MAX_PLAN_ACTIONS:
+                    action, role, name, *text = self.steps[0]
+                    idx = self._find(input["accessibility_tree_str"], role, name)
+                    if idx is None:
+                        break
+                    self.planned.append(self.steps.pop(0))
+                    actions.append([idx, action, text[0] if text else ""])
+                self.waits = 0
+                return ReActSchema(thought=f"Script: {', '.join(action[1] for action in actions)}", action=actions[0], plan=actions[1:])
+            if self.waits < MAX_WAITS:
+                self.waits += 1
+                return ReActSchema(thought=f"Script: waiting for {role} '{name}'", action=[0, "wait", ""])
+            self.steps.pop(0)
+            self.waits = 0
+
+        return ReActSchema(thought="Script finished", action=[0, "finish", ""])
+
+    def check_continue(self, input: dict) -> CheckContinueSchema:
+        self._measure("check_continue", check_continue_prompt, input)
+        return CheckContinueSchema(decision="CONTINUE" if self.steps else "FINAL ANSWER")
+
+    def answer(self, input: dict) -> AnswerSchema:
+        self._measure("answer", answer_prompt, input)
+        return AnswerSchema(answer=" | ".join(json.loads(input["extracted_info"])))
+
+    def agents(self) -> dict[str, RunnableLambda]:
+        return {
+            "reAct": RunnableLambda(self.react),
+            "reAct_fused": RunnableLambda(self.react),
+            "check_continue": RunnableLambda(self.check_continue),
+            "answer": RunnableLambda(self.answer),
+        }
+
+
+def run_task(graph: Any, server: FixtureServer, task: dict, fused: bool, trace_path: str, tree_token_budget: int | None) -> dict[str, Any]:
+    llm = ScriptedLLM(task["steps"], fused)
+    initial_state = build_initial_state(
+        {"id": task["name"], "task": task["task"], "url": server.url(task["path"]), "max_tool_usage": 10},
+        tree_token_budget
+    )
+
+    with recording(trace_path):
+        registry.install_agents(llm.agents())
+        start = time.perf_counter()
+        final_state, steps = run_timed(graph, initial_state)
+        seconds = time.perf_counter() - start
+    registry.reset_registry()
+
+    nodes: dict[str, dict[str, float]] = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+    for step in steps:
+        nodes[step["node"]]["count"] += 1
+        nodes[step["node"]]["seconds"] += step["seconds"]
+
+    trace = Trace.load(trace_path)
+    driver_events = [event for queue in trace.driver.values() for event in queue]
+    cdp_commands = Counter(event["command"] for event in driver_events if event["method"] == "execute_cdp_cmd")
+
+    answer = final_state.get("final_anwser", "")
+    return {
+        "name": task["name"],
+        "url": initial_state["url"],
+        "passed": task["expect"].lower() in answer.lower(),
+        "answer": answer,
+        "seconds": seconds,
+        "steps": len(steps),
+        "tool_count": final_state.get("tool_count", 0),
+        "nodes": dict(nodes),
+        "cdp_calls": sum(cdp_commands.values()),
+        "cdp_commands": dict(cdp_commands.most_common()),
+        "webdriver_calls": len(driver_events) - sum(cdp_commands.values()),
+        "settle_seconds": sum(seconds for _, seconds in final_state.get("settle_times", [])),
+        "skipped_extractions": final_state.get("skipped_extractions", 0),
+        "llm_calls": len(llm.prompts),
+        "prompt_tokens_total": sum(prompt["tokens"] for prompt in llm.prompts),
+        "prompt_tokens_max": max((prompt["tokens"] for prompt in llm.prompts), default=0),
+        "prompts": llm.prompts,
+    }
+
+def run(task_names: list[str], fused: bool, tree_token_budget: int | None, trace_dir: str) -> list[dict[str, Any]]:
+    from graph import create_graph
+
+    graph = create_graph(fused=fused)
+    tasks = [task for task in STANDARD_TASKS if task["name"] in task_names]
+    results = []
+
+    with FixtureServer() as server:
+        for task in tasks:
+            result = run_task(graph, server, task, fused, os.path.join(trace_dir, f"{task['name']}.jsonl"), tree_token_budget)
+            results.append(result)
+            print(
+                f"{result['name']:<6} | {'pass' if result['passed'] else 'FAIL'} | {result['seconds']:7.2f}s | {result['steps']:>3} steps "
+                f"| {result['llm_calls']:>3} LLM calls | {result['cdp_calls']:>4} CDP + {result['webdriver_calls']:>4} WebDriver calls | prompt max {result['prompt_tokens_max']:>5} tokens"
+            )
+    return results
+
+def compare(results: list[dict[str, Any]], baseline: list[dict[str, Any]]) -> None:
+    before = {result["name"]: result for result in baseline}
+    for result in results:
+        old = before.get(result["name"])
+        if not old:
+            continue
+        changes = []
+        for key in ["seconds", "steps", "llm_calls", "cdp_calls", "webdriver_calls", "prompt_tokens_total"]:
+            if old.get(key):
+                changes.append(f"{key} {100 * (result[key] - old[key]) / old[key]:+.1f}%")
+        print(f"{result['name']:<6} vs baseline: {', '.join(changes)}")
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", nargs="+", default=[task["name"] for task in STANDARD_TASKS])
+    parser.add_argument("--fused", action="store_true", help="Benchmark the fused topology.")
+    parser.add_argument("--tree-token-budget", type=int, help="Token budget for the accessibility tree (0 disables pruning).")
+    parser.add_argument("--browser-profile", choices=["full", "light"], help="Chrome launch profile to benchmark.")
+    parser.add_argument("--traces", help="Keep the recorded traces (replayable with `python -m replay replay`) in this directory.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare with the results JSON of an earlier run.")
+    args = parser.parse_args(argv)
+    if args.browser_profile:
+        os.environ["BROWSER_PROFILE"] = args.browser_profile
+
+    if args.traces:
+        os.makedirs(args.traces, exist_ok=True)
+        results = run(args.tasks, args.fused, args.tree_token_budget, args.traces)
+    else:
+        with tempfile.TemporaryDirectory() as trace_dir:
+            results = run(args.tasks, args.fused, args.tree_token_budget, trace_dir)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f)["results"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version, "fused": args.fused, "browser_profile": os.getenv("BROWSER_PROFILE", "full"), "tree_token_budget": args.tree_token_budget, "results": results}, f, indent=4)
+
+if __name__ == "__main__":
+    main()
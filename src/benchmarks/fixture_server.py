@@ -0,0 +1,108 @@
+"""
+Local HTTP server for the benchmark fixture pages.
+
+Static pages live in benchmarks/fixtures/; files under /assets/ are sent with a Cache-Control max-age.
+Two routes are generated:
+    /huge.html?n=5000        a page with n links in nested lists
+    /api/status?delay=0.8    a JSON response sent after `delay` seconds
+Every request is counted per path, so a run can tell how many requests reached the server.
+"""
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+import json
+import threading
+import time
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+DEFAULT_HUGE_SIZE = 5_000
+MAX_DELAY = 10.0
+ASSET_MAX_AGE = 3600
+
+
+def render_huge_page(size: int) -> str:
+    sections = []
+    for start in range(0, size, 100):
+        items = "".join(
+            f'<li><a href="/terms.html">Item {i}</a> <span>Description of item {i}</span></li>'
+            for i in range(start, min(start + 100, size))
+        )
+        sections.append(f"<section><h2>Section {start // 100}</h2><ul>{items}</ul></section>")
+    return f"<!DOCTYPE html><html lang=\"en\"><head><title>Huge fixture</title></head><body><h1>Catalogue</h1>{''.join(sections)}</body></html>"
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=str(FIXTURES_DIR), **kwargs)
+
+    def _send(self, body: str, content_type: str) -> None:
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def end_headers(self) -> None:
+        if self.path.startswith("/assets/"):
+            self.send_header("Cache-Control", f"public, max-age={ASSET_MAX_AGE}")
+        super().end_headers()
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.server.count_request(url.path)
+
+        if url.path == "/huge.html":
+            size = int(query.get("n", [DEFAULT_HUGE_SIZE])[0])
+            self._send(render_huge_page(size), "text/html; charset=utf-8")
+        elif url.path == "/api/status":
+            time.sleep(min(float(query.get("delay", ["0"])[0]), MAX_DELAY))
+            self._send(json.dumps({"status": "ready"}), "application/json")
+        else:
+            super().do_GET()
+
+    def log_message(self, format: str, *args) -> None:
+        # Keep the benchmark output clean.
+        pass
+
+
+class FixtureServer:
+    """
+    Serve the fixtures on 127.0.0.1 from a background thread. Usable as a context manager.
+    """
+
+    def __init__(self, port: int = 0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+        self.httpd.count_request = self._count_request
+        self.requests: Counter = Counter()
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+
+    def _count_request(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] += 1
+
+    def request_counts(self) -> Counter:
+        """
+        Requests served so far, per path.
+        """
+        with self._lock:
+            return Counter(self.requests)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def __enter__(self) -> "FixtureServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
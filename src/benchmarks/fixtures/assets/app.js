@@ -0,0 +1,9 @@
+// Renders the status from the JSON API, like the bundle of a client-rendered app.
+fetch("/api/status")
+    .then((response) => response.json())
+    .then((data) => {
+        const status = document.createElement("p");
+        status.className = "status";
+        status.textContent = `Status: ${data.status}`;
+        document.getElementById("app").appendChild(status);
+    });
@@ -0,0 +1,78 @@
+"""
+Hit rate of the shared HTTP cache (http_cache.py), measured against the local fixture server.
+
+Fresh Chrome sessions are launched one after another, so each starts with a cold browser cache, and
+each loads a page whose stylesheet, script and JSON API response come from the fixture server. The
+server counts the requests it receives: with the shared cache only the first session should reach it
+for those resources. Needs Chrome.
+
+Usage (from src/):
+    python -m benchmarks.http_cache
+    python -m benchmarks.http_cache --sessions 5 --no-cache
+"""
+from benchmarks.fixture_server import FixtureServer
+from http_cache import enable_http_cache, disable_http_cache, http_cache_stats
+from tools import create_webdriver, access_url
+from settle import wait_for_page_settle
+
+from typing import Any
+import argparse
+import json
+import tempfile
+import time
+
+PAGE = "cached.html"
+CACHED_PATHS = ("/assets/app.css", "/assets/app.js", "/api/status")
+API_PATTERNS = ["*/api/status*"]
+
+def run(sessions: int, use_cache: bool, cache_dir: str) -> dict[str, Any]:
+    if use_cache:
+        enable_http_cache(cache_dir, allow_patterns=API_PATTERNS)
+
+    results = []
+    with FixtureServer() as server:
+        for session in range(sessions):
+            driver = create_webdriver()
+            try:
+                before = server.request_counts()
+                start = time.perf_counter()
+                access_url(driver, server.url(PAGE))
+                wait_for_page_settle(driver)
+                seconds = time.perf_counter() - start
+                after = server.request_counts()
+            finally:
+                driver.quit()
+
+            served = {path: after[path] - before[path] for path in CACHED_PATHS}
+            results.append({"session": session + 1, "seconds": seconds, "server_requests": served})
+            print(f"session {session + 1} | {seconds:6.2f}s | server requests: {', '.join(f'{path} {count}' for path, count in served.items())}")
+
+    stats = http_cache_stats() if use_cache else None
+    disable_http_cache()
+
+    total = sessions * len(CACHED_PATHS)
+    reached_server = sum(sum(result["server_requests"].values()) for result in results)
+    hit_rate = 1 - reached_server / total if total else 0.0
+    print(f"{total - reached_server}/{total} cacheable requests did not reach the server (hit rate {hit_rate:.0%})")
+    return {"use_cache": use_cache, "sessions": results, "hit_rate": hit_rate, "cache_stats": stats}
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=3, help="Number of fresh Chrome sessions.")
+    parser.add_argument("--no-cache", action="store_true", help="Run without the shared cache, as a baseline.")
+    parser.add_argument("--cache-dir", help="Cache directory (default: a temporary one, i.e. cold).")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    if args.cache_dir:
+        result = run(args.sessions, not args.no_cache, args.cache_dir)
+    else:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            result = run(args.sessions, not args.no_cache, cache_dir)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Scaling benchmark for `tools.parse_accessibility_tree` on synthetic accessibility trees.
+
+Both parsers are timed the way the agent calls them, on the raw CDP node list, so the new parser's
+time includes building its `AXTreeStore`.
+
+Usage (from src/):
+    python -m benchmarks.parse_tree
+    python -m benchmarks.parse_tree --sizes 1000 50000 --output parse_tree.json
+"""
+from contextlib import contextmanager
+from typing import Iterator
+import argparse
+import json
+import random
+import sys
+import time
+
+from tools import parse_accessibility_tree
+
+DEFAULT_SIZES = [1_000, 5_000, 20_000, 50_000, 100_000, 200_000]
+ROLES = ["generic", "link", "button", "StaticText", "heading", "image", "textbox", "list", "listitem", "gridcell"]
+DEEP_CHAIN = 5_000
+WORDS = ["home", "terms", "privacy", "search", "login", "news", "about", "help", "settings", "contact"]
+
+
+def make_tree(size: int, shape: str = "bushy", seed: int = 0) -> list[dict]:
+    """
+    Build a synthetic CDP accessibility tree with `size` nodes.
+    Args:
+        size (int): Number of nodes.
+        shape (str): "bushy" for a page-like tree with random fan-out, "deep" for a chain of
+            DEEP_CHAIN nodes (far beyond the recursion limit) with the rest fanned out below it.
+        seed (int): Random seed.
+    Returns:
+        list[dict]: Tree nodes, root first.
+    """
+    rng = random.Random(seed)
+    nodes = []
+    for i in range(size):
+        role = rng.choice(ROLES)
+        name = " ".join(rng.choices(WORDS, k=rng.randint(0, 3)))
+        nodes.append({
+            "nodeId": str(i),
+            "ignored": False,
+            "role": {"type": "role", "value": role},
+            "name": {"type": "computedString", "value": name},
+            "childIds": [],
+            "backendDOMNodeId": i + 1,
+        })
+
+    for i in range(1, size):
+        if shape == "deep" and i < DEEP_CHAIN:
+            parent = i - 1
+        else:
+            parent = rng.randint(0, i - 1)
+        nodes[parent]["childIds"].append(str(i))
+        nodes[i]["parentId"] = str(parent)
+
+    return nodes
+
+def legacy_parse_accessibility_tree(accessibility_tree, max_node=300, indent_str="\t"):
+    """
+    The original recursive parser, kept as the reference for output equality and timing.
+    """
+    node_id_to_idx = {node['nodeId']: idx for idx, node in enumerate(accessibility_tree)}
+    tree_list = []
+    node_map = {}
+
+    def dfs(node_id, depth=0, parent_node='root'):
+        valid_node = True
+        indent = indent_str * depth
+        if len(node_map) > max_node:
+            return
+        node = accessibility_tree[node_id_to_idx[node_id]]
+        try:
+            role = node.get('role', {}).get('value', '')
+            name = node.get('name', {}).get('value', '')
+            if not name.strip() or role in ['gridcell'] or (name.strip() in parent_node and role in ['StaticText', 'heading', 'image', 'generic']):
+                valid_node = False
+            if valid_node:
+                idx = len(node_map) + 1
+                node_map[idx] = node
+                tree_list.append(f"{indent} [{idx}] {role} '{name}'")
+        except Exception:
+            valid_node = False
+        for child_id in node.get('childIds', []):
+            if child_id not in node_id_to_idx:
+                continue
+            dfs(child_id, depth + 1 if valid_node else depth, parent_node=name if valid_node else parent_node)
+
+    dfs(accessibility_tree[0]['nodeId'])
+    return "\n".join(tree_list), node_map
+
+@contextmanager
+def recursion_limit(limit: int) -> Iterator[None]:
+    previous = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, previous))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(previous)
+
+def assert_same_output(tree: list[dict], max_node: int) -> None:
+    """
+    Compare the parser with the legacy one. The legacy parser recurses once per tree level, so it
+    runs with the recursion limit raised above the tree size; "deep" trees are compared too.
+    """
+    with recursion_limit(len(tree) + 1_000):
+        legacy_str, legacy_map = legacy_parse_accessibility_tree(tree, max_node=max_node)
+    tree_str, node_map = parse_accessibility_tree(tree, max_node=max_node)
+
+    assert tree_str == legacy_str, f"Tree text differs from the legacy parser (size={len(tree)}, max_node={max_node})"
+    assert [node_map.backend_node_id(idx) for idx in node_map] == [node["backendDOMNodeId"] for node in legacy_map.values()], \
+        f"Node map differs from the legacy parser (size={len(tree)}, max_node={max_node})"
+
+def time_call(fn, *args, repeat: int = 3, **kwargs) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def format_ms(seconds: float | None) -> str:
+    return f"{seconds * 1e3:9.2f} ms" if seconds is not None else "RecursionError".rjust(12)
+
+def run(sizes: list[int], repeat: int = 3) -> list[dict]:
+    results = []
+    for size in sizes:
+        for shape in ["bushy", "deep"]:
+            tree = make_tree(size, shape)
+            row = {"size": size, "shape": shape}
+
+            for label, max_node in [("capped", 300), ("full", size)]:
+                row[f"{label}_seconds"] = time_call(parse_accessibility_tree, tree, max_node=max_node, repeat=repeat)
+
+                try:
+                    row[f"legacy_{label}_seconds"] = time_call(legacy_parse_accessibility_tree, tree, max_node=max_node, repeat=repeat)
+                except RecursionError:
+                    # Timed at the default recursion limit, like the original code ran.
+                    row[f"legacy_{label}_seconds"] = None
+                assert_same_output(tree, max_node)
+
+            row["full_us_per_node"] = row["full_seconds"] / size * 1e6
+            results.append(row)
+            print(
+                f"{size:>8} {shape:<6} | capped {format_ms(row['capped_seconds'])} legacy {format_ms(row['legacy_capped_seconds'])} "
+                f"| full {format_ms(row['full_seconds'])} legacy {format_ms(row['legacy_full_seconds'])} "
+                f"| {row['full_us_per_node']:.2f} us/node"
+            )
+    return results
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version, "results": results}, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+from selenium import webdriver
+
+from utils import setup_logger
+from tools import create_webdriver
+from settle import reset_tracker
+
+from contextlib import contextmanager
+from typing import Any, Iterator, TypedDict
+import atexit
+import contextvars
+import os
+import queue
+import threading
+import time
+
+logger = setup_logger("browser_pool")
+
+BLANK_URL = "about:blank"
+LEASE_RECHECK = 0.5
+# Longest wait for a free session; a session that never comes back surfaces as a TimeoutError.
+DEFAULT_LEASE_TIMEOUT = float(os.getenv("BROWSER_LEASE_TIMEOUT", "300"))
+
+class PoolStats(TypedDict):
+    size: int
+    launched: int
+    idle: int
+    leases: int
+    reused: int
+    discarded: int
+    total_lease_wait: float
+    last_lease_wait: float
+
+
+class BrowserSessionPool:
+    """
+    Keep a fixed number of pre-launched Chrome sessions and lease them to graph runs.
+
+    Sessions are reset (cookies, storage, extra tabs, about:blank) when they are
+    returned, so a leased session always starts from a clean, already warm browser.
+    """
+
+    def __init__(self, size: int = 1, prelaunch: bool = True):
+        self.size = max(1, size)
+        self._idle: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._served: set[int] = set()
+        self._leased: set[int] = set()
+        self._closed = False
+
+        self._stats: PoolStats = {
+            "size": self.size,
+            "launched": 0,
+            "idle": 0,
+            "leases": 0,
+            "reused": 0,
+            "discarded": 0,
+            "total_lease_wait": 0.0,
+            "last_lease_wait": 0.0,
+        }
+
+        if prelaunch:
+            threading.Thread(target=self.warm_up, name="browser-pool-warm-up", daemon=True).start()
+
+    def _reserve_slot(self) -> bool:
+        with self._lock:
+            if self._closed or self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _launch(self) -> webdriver.Chrome | None:
+        try:
+            driver = create_webdriver()
+            driver.get(BLANK_URL)
+        except Exception as e:
+            logger.error(f"Error launching pooled WebDriver: {e}")
+            with self._lock:
+                self._created -= 1
+            return None
+
+        with self._lock:
+            self._stats["launched"] += 1
+        return driver
+
+    def warm_up(self) -> None:
+        """
+        Launch sessions until the pool holds `size` browsers.
+        """
+        while self._reserve_slot():
+            driver = self._launch()
+            if driver is None:
+                break
+            self._idle.put(driver)
+            logger.info("Pre-launched pooled WebDriver session.")
+
+    def lease(self, timeout: float | None = DEFAULT_LEASE_TIMEOUT) -> tuple[webdriver.Chrome, float]:
+        """
+        Lease a session from the pool, launching one if the pool is not full yet.
+        Args:
+            timeout (float | None): Maximum seconds to wait for a free session; None waits forever.
+        Returns:
+            tuple[webdriver.Chrome, float]: The leased driver and the lease wait time in seconds.
+        """
+        start = time.perf_counter()
+
+        driver = None
+        while driver is None:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                if self._reserve_slot():
+                    driver = self._launch()
+                    if driver is None:
+                        raise RuntimeError("Unable to launch a WebDriver session for the pool.")
+                else:
+                    remaining = None if timeout is None else timeout - (time.perf_counter() - start)
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No browser session became available within {timeout}s.")
+                    # Wake up regularly: a launch in progress elsewhere may fail and free its slot.
+                    try:
+                        driver = self._idle.get(timeout=LEASE_RECHECK if remaining is None else min(remaining, LEASE_RECHECK))
+                    except queue.Empty:
+                        continue
+
+        wait = time.perf_counter() - start
+
+        with self._lock:
+            reused = id(driver) in self._served
+            self._served.add(id(driver))
+            self._leased.add(id(driver))
+            self._stats["leases"] += 1
+            self._stats["reused"] += int(reused)
+            self._stats["total_lease_wait"] += wait
+            self._stats["last_lease_wait"] = wait
+
+        logger.info(f"Leased WebDriver session (wait: {wait:.3f}s, reused: {reused}).")
+        return driver, wait
+
+    def release(self, driver: webdriver.Chrome) -> None:
+        """
+        Reset a leased session and return it to the pool. Broken sessions are discarded.
+        Args:
+            driver (webdriver.Chrome): The driver previously returned by `lease`.
+        """
+        with self._lock:
+            if id(driver) not in self._leased:
+                logger.warning("Released a WebDriver that was not leased from this pool.")
+                return
+            self._leased.discard(id(driver))
+
+        if not self._closed:
+            try:
+                reset_session(driver)
+                self._idle.put(driver)
+                logger.info("Returned WebDriver session to the pool.")
+                return
+            except Exception as e:
+                logger.error(f"Error resetting WebDriver session, discarding it: {e}")
+
+        self._discard(driver)
+
+    def _discard(self, driver: webdriver.Chrome) -> None:
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.error(f"Error quitting WebDriver: {e}")
+
+        with self._lock:
+            self._served.discard(id(driver))
+            self._created -= 1
+            self._stats["discarded"] += 1
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["idle"] = self._idle.qsize()
+        return stats
+
+    def close(self) -> None:
+        """
+        Quit every idle session. Sessions still leased are quit when they are released.
+        """
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+
+def reset_session(driver: webdriver.Chrome) -> None:
+    """
+    Bring a session back to a clean state: a single about:blank tab, no cookies and no site storage.
+    Args:
+        driver (webdriver.Chrome): The driver to reset.
+    """
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+
+    origin = driver.execute_script("return window.location.origin;")
+    if origin and origin != "null":
+        driver.execute_cdp_cmd(
+            "Storage.clearDataForOrigin",
+            {
+                "origin": origin,
+                "storageTypes": "local_storage,session_storage,indexeddb,service_workers,cache_storage",
+            }
+        )
+
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.get(BLANK_URL)
+    reset_tracker(driver)
+
+
+# Sessions leased by the graph run in the current `session_scope`, as (pool, driver) pairs.
+_scope_leases: contextvars.ContextVar[list | None] = contextvars.ContextVar("session_scope_leases", default=None)
+
+@contextmanager
+def session_scope() -> Iterator[None]:
+    """
+    Run a graph inside this block so the session it leased goes back to the pool even when a node
+    raises before `release_driver` is reached.
+    """
+    leases: list[tuple[Any, Any]] = []
+    token = _scope_leases.set(leases)
+    try:
+        yield
+    finally:
+        _scope_leases.reset(token)
+        for pool, driver in leases:
+            logger.warning("The run ended without releasing its WebDriver session; releasing it.")
+            pool.release(driver)
+
+def track_lease(pool: Any, driver: Any) -> None:
+    """
+    Register a session leased by a graph node with the enclosing `session_scope`, if any.
+    """
+    leases = _scope_leases.get()
+    if leases is not None:
+        leases.append((pool, driver))
+
+def untrack_lease(driver: Any) -> None:
+    leases = _scope_leases.get()
+    if leases is not None:
+        leases[:] = [(pool, leased) for pool, leased in leases if leased is not driver]
+
+
+_pool: BrowserSessionPool | None = None
+_pool_lock = threading.Lock()
+
+def get_session_pool() -> BrowserSessionPool:
+    """
+    Return the process-wide session pool. Its size is read from BROWSER_POOL_SIZE (default 1).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserSessionPool(size=int(os.getenv("BROWSER_POOL_SIZE", "1")))
+            atexit.register(_pool.close)
+        return _pool
+
+def set_session_pool(pool: BrowserSessionPool | None) -> BrowserSessionPool | None:
+    """
+    Replace the process-wide session pool, e.g. with a recording or replaying pool.
+    Args:
+        pool (BrowserSessionPool | None): Any object with `lease`, `release` and `stats`; None restores the default.
+    Returns:
+        BrowserSessionPool | None: The pool that was in place.
+    """
+    global _pool
+    with _pool_lock:
+        previous = _pool
+        _pool = pool
+        return previous
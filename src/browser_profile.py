@@ -0,0 +1,118 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+from utils import setup_logger
+
+from typing import Any, TypedDict
+import os
+
+logger = setup_logger("browser_profile")
+
+DEFAULT_BROWSER_PROFILE = "full"
+
+# Network.setBlockedURLs matches URL patterns only ("*" is a wildcard), so resource types are blocked
+# by their usual file extensions, with and without a query string.
+def _extension_patterns(extensions: list[str]) -> list[str]:
+    return [pattern for extension in extensions for pattern in (f"*.{extension}", f"*.{extension}?*")]
+
+IMAGE_PATTERNS = _extension_patterns(["png", "jpg", "jpeg", "gif", "webp", "avif", "bmp", "ico"])
+FONT_PATTERNS = _extension_patterns(["woff", "woff2", "ttf", "otf", "eot"])
+MEDIA_PATTERNS = _extension_patterns(["mp4", "webm", "ogg", "mp3", "wav", "m4a", "m3u8"])
+TRACKER_PATTERNS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*connect.facebook.net*",
+    "*hotjar.com*",
+    "*segment.io*",
+    "*scorecardresearch.com*",
+]
+
+class BrowserProfile(TypedDict):
+    name: str
+    headless: bool
+    window_size: tuple[int, int] | None # None starts maximized
+    arguments: list[str] # extra Chrome command line switches
+    prefs: dict[str, Any]
+    blocked_url_patterns: list[str]
+
+
+PROFILES: dict[str, BrowserProfile] = {
+    # A regular, maximized Chrome window that loads everything.
+    "full": {
+        "name": "full",
+        "headless": False,
+        "window_size": None,
+        "arguments": [],
+        "prefs": {},
+        "blocked_url_patterns": [],
+    },
+    # Headless, small window, no images, fonts, media or trackers, and no throttling of background
+    # work: the agent only reads the accessibility tree.
+    "light": {
+        "name": "light",
+        "headless": True,
+        "window_size": (1280, 800),
+        "arguments": [
+            "--disable-gpu",
+            "--disable-background-timer-throttling",
+            "--disable-backgrounding-occluded-windows",
+            "--disable-renderer-backgrounding",
+            "--disable-extensions",
+            "--disable-component-update",
+            "--mute-audio",
+            "--blink-settings=imagesEnabled=false",
+        ],
+        "prefs": {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        },
+        "blocked_url_patterns": IMAGE_PATTERNS + FONT_PATTERNS + MEDIA_PATTERNS + TRACKER_PATTERNS,
+    },
+}
+
+
+def get_browser_profile(name: str | None = None) -> BrowserProfile:
+    """
+    Look up a launch profile.
+    Args:
+        name (str | None): "full" or "light"; defaults to the BROWSER_PROFILE environment variable, then "full".
+    Returns:
+        BrowserProfile: The profile.
+    """
+    name = name or os.getenv("BROWSER_PROFILE", DEFAULT_BROWSER_PROFILE)
+    if name not in PROFILES:
+        raise ValueError(f"Unknown browser profile: {name}. Choose from {', '.join(PROFILES)}.")
+    return PROFILES[name]
+
+def apply_browser_profile(options: Options, profile: BrowserProfile) -> None:
+    """
+    Add the launch switches and preferences of `profile` to the Chrome options.
+    """
+    if profile["headless"]:
+        options.add_argument("--headless=new")
+    if profile["window_size"]:
+        width, height = profile["window_size"]
+        options.add_argument(f"--window-size={width},{height}")
+    else:
+        options.add_argument("--start-maximized")
+
+    for argument in profile["arguments"]:
+        options.add_argument(argument)
+    if profile["prefs"]:
+        options.add_experimental_option("prefs", profile["prefs"])
+
+def install_request_blocking(driver: webdriver.Chrome, profile: BrowserProfile) -> None:
+    """
+    Block the URL patterns of `profile` for every page the driver loads.
+    """
+    if not profile["blocked_url_patterns"]:
+        return
+
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": profile["blocked_url_patterns"]})
+        logger.info(f"Blocking {len(profile['blocked_url_patterns'])} URL patterns ({profile['name']} profile).")
+    except Exception as e:
+        logger.warning(f"Unable to install request blocking: {e}")
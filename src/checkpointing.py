@@ -0,0 +1,253 @@
+"""
+Persist graph runs in SQLite so an interrupted run resumes where it stopped.
+
+LangGraph saves a checkpoint after every node. Everything in the state is saved as is (history,
+messages, extracted data, the planned action) except the browser: a WebDriver session cannot
+outlive its process, so the driver is saved as a `SessionHandle` and nodes that touch the browser
+record the page they left it on (`current_url`, `cookies`). The accessibility node map is not saved
+either (its backend node ids die with the page). When a resumed run reaches a browser node with only
+the handle, a session is leased from the pool, the cookies are restored, the page is loaded again and
+the tree extracted again; the graph then continues with the next node, so LLM calls that already
+finished are not made again.
+
+Usage:
+    graph = create_graph(checkpointer=sqlite_checkpointer("checkpoints.sqlite"))
+    final_state = invoke_resumable(graph, initial_state, thread_id="task-1")
+"""
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from selenium import webdriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from utils import setup_logger
+from browser_pool import get_session_pool, session_scope, track_lease
+from settle import wait_for_page_settle
+from tools import access_url
+from agent import State, extract_accessibility_tree_node
+from ax_store import AXNodeMap
+from agent_async import run_blocking
+
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable
+import inspect
+import os
+import sqlite3
+
+logger = setup_logger("checkpointing")
+
+# Record the browser cookies in checkpoints so a resumed run keeps its logins. Off by default: the
+# cookies, auth tokens included, would be stored in plaintext in the checkpoint file.
+CHECKPOINT_COOKIES = os.getenv("CHECKPOINT_COOKIES", "0") == "1"
+
+
+@dataclass(frozen=True)
+class SessionHandle:
+    """
+    Stands in for the WebDriver in a saved checkpoint.
+    """
+    session_id: str = ""
+
+
+def is_session_handle(value: Any) -> bool:
+    return isinstance(value, SessionHandle)
+
+def _portable(value: Any) -> Any:
+    if isinstance(value, (WebElement, AXNodeMap)):
+        # Element references and backend node ids die with their page; `restore_session` extracts the
+        # tree again.
+        return None
+    if hasattr(value, "execute_cdp_cmd"):
+        return SessionHandle(getattr(value, "session_id", None) or "")
+    return value
+
+
+class CheckpointSerializer(JsonPlusSerializer):
+    """
+    JsonPlusSerializer that saves the driver as a SessionHandle and web elements and the node map as
+    None, so every saved value has a msgpack encoding and nothing is pickled.
+    """
+
+    def __init__(self):
+        super().__init__(allowed_msgpack_modules=[("checkpointing", "SessionHandle")])
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        if isinstance(obj, dict) and isinstance(obj.get("channel_values"), dict):
+            # A whole checkpoint.
+            obj = {**obj, "channel_values": {key: _portable(value) for key, value in obj["channel_values"].items()}}
+        else:
+            # A single pending write.
+            obj = _portable(obj)
+        return super().dumps_typed(obj)
+
+
+def sqlite_checkpointer(path: str) -> SqliteSaver:
+    """
+    Checkpointer for `invoke`/`stream` that saves runs to a SQLite file.
+
+    The file holds the whole state in plaintext: task, messages, extracted page data and, with
+    CHECKPOINT_COOKIES=1, the session cookies of the current page (auth tokens included). Keep it
+    private to the user running the agent.
+    Args:
+        path (str): SQLite file; created if missing. Worker processes may share it.
+    Returns:
+        SqliteSaver: The checkpointer, for `create_graph(checkpointer=...)`.
+    """
+    connection = sqlite3.connect(path, check_same_thread=False)
+    return SqliteSaver(connection, serde=CheckpointSerializer())
+
+async def async_sqlite_checkpointer(path: str) -> BaseCheckpointSaver:
+    """
+    Checkpointer for `ainvoke`/`astream`; must be created on the event loop that runs the graph, and
+    its connection closed (`await checkpointer.conn.close()`) before that loop ends.
+    """
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    connection = await aiosqlite.connect(path)
+    return AsyncSqliteSaver(connection, serde=CheckpointSerializer())
+
+
+def session_snapshot(driver: webdriver.Chrome) -> dict:
+    """
+    The page the driver is on and, with CHECKPOINT_COOKIES, the cookies visible to it, as state keys.
+    """
+    try:
+        snapshot = {"current_url": driver.current_url}
+        if CHECKPOINT_COOKIES:
+            snapshot["cookies"] = driver.get_cookies()
+        return snapshot
+    except Exception as e:
+        logger.warning(f"Unable to record the browser session: {e}")
+        return {}
+
+def restore_session(state: State) -> dict:
+    """
+    Lease a browser for a resumed run and bring it back to the page the run was on.
+    Returns:
+        dict: State updates: the new driver and, when the run had one, a freshly extracted
+            accessibility tree and node map (the node map is not checkpointed). If the page came back
+            different, the pending action and plan are dropped, since their element indices may
+            point elsewhere now; the agent then decides again on the new tree.
+    """
+    pool = get_session_pool()
+    driver, lease_wait = pool.lease()
+    track_lease(pool, driver)
+    url = state.get("current_url") or state["url"]
+    cookies = state.get("cookies") or []
+
+    if cookies:
+        # Cookies can only be set on a page of their own domain.
+        access_url(driver, url)
+        for cookie in cookies:
+            try:
+                driver.add_cookie(cookie)
+            except Exception as e:
+                logger.debug(f"Skipping cookie {cookie.get('name')}: {e}")
+    access_url(driver, url)
+    wait_for_page_settle(driver)
+    logger.info(f"Restored the browser session at {url} ({len(cookies)} cookies).")
+
+    update = {
+        "driver": driver,
+        "lease_wait": state.get("lease_wait", 0.0) + lease_wait,
+        "page_fingerprint": "",
+    }
+    if state.get("accessibility_tree_str"):
+        update.update(extract_accessibility_tree_node({**state, **update}))
+        if update.get("accessibility_tree_str") != state.get("accessibility_tree_str") and state.get("action"):
+            logger.warning("The restored page differs from the checkpoint; dropping the pending action.")
+            update.update({"action": [], "plan": []})
+    return update
+
+
+def resumable(node: Callable, record_session: bool = False) -> Callable:
+    """
+    Wrap a browser node for a checkpointed graph: restore the browser first when the state only holds
+    a SessionHandle, and, with `record_session`, add the session snapshot to the node's update.
+    """
+    if inspect.iscoroutinefunction(node):
+        @wraps(node)
+        async def arun(state: State) -> dict:
+            restored = {}
+            if is_session_handle(state.get("driver")):
+                restored = await run_blocking(restore_session, state)
+                state = {**state, **restored}
+            update = await node(state) or {}
+            driver = update.get("driver") or state.get("driver")
+            if record_session and driver:
+                update = {**update, **await run_blocking(session_snapshot, driver)}
+            return {**restored, **update}
+        return arun
+
+    @wraps(node)
+    def run(state: State) -> dict:
+        restored = {}
+        if is_session_handle(state.get("driver")):
+            restored = restore_session(state)
+            state = {**state, **restored}
+        update = node(state) or {}
+        driver = update.get("driver") or state.get("driver")
+        if record_session and driver:
+            update = {**update, **session_snapshot(driver)}
+        return {**restored, **update}
+    return run
+
+def releasing(node: Callable) -> Callable:
+    """
+    Wrap the release node: a handle has no browser behind it, so there is nothing to release.
+    """
+    if inspect.iscoroutinefunction(node):
+        @wraps(node)
+        async def arun(state: State) -> dict:
+            if is_session_handle(state.get("driver")):
+                return {"driver": None}
+            return await node(state)
+        return arun
+
+    @wraps(node)
+    def run(state: State) -> dict:
+        if is_session_handle(state.get("driver")):
+            return {"driver": None}
+        return node(state)
+    return run
+
+
+def _thread_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+def invoke_resumable(graph, initial_state: State, thread_id: str, resume: bool = True) -> State:
+    """
+    Run `graph` (compiled with a checkpointer) under `thread_id`, continuing the thread's interrupted
+    run if there is one.
+    Args:
+        graph: The compiled graph.
+        initial_state (State): State of a new run.
+        thread_id (str): Checkpoint thread, e.g. the task id.
+        resume (bool): Continue an interrupted run; when False, or when the thread's last run finished,
+            its checkpoints are deleted and a new run starts.
+    Returns:
+        State: The final state.
+    """
+    config = _thread_config(thread_id)
+    with session_scope():
+        if resume and graph.get_state(config).next:
+            logger.info(f"Resuming thread {thread_id} from its last checkpoint.")
+            return graph.invoke(None, config, durability="sync")
+
+        graph.checkpointer.delete_thread(thread_id)
+        return graph.invoke(initial_state, config, durability="sync")
+
+async def ainvoke_resumable(graph, initial_state: State, thread_id: str, resume: bool = True) -> State:
+    """
+    Async version of `invoke_resumable`, for graphs compiled with `async_sqlite_checkpointer`.
+    """
+    config = _thread_config(thread_id)
+    with session_scope():
+        if resume and (await graph.aget_state(config)).next:
+            logger.info(f"Resuming thread {thread_id} from its last checkpoint.")
+            return await graph.ainvoke(None, config, durability="sync")
+
+        await graph.checkpointer.adelete_thread(thread_id)
+        return await graph.ainvoke(initial_state, config, durability="sync")
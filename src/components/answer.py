@@ -8,8 +8,8 @@ class AnswerSchema(BaseModel):
         description="The final answer synthesized from the extracted information and accessibility tree."
     )
 
-def create_answer_agent():
-    llm = get_llm()
+def create_answer_agent(llm=None):
+    llm = llm or get_llm()
 
     answer = answer_prompt | llm.with_structured_output(AnswerSchema)
 
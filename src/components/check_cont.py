@@ -10,8 +10,8 @@ class CheckContinueSchema(BaseModel):
         description="The decision on whether to continue web interaction or provide the final answer. Should be either 'FINAL ANSWER' or 'CONTINUE'."
     )
 
-def create_check_continue_agent():
-    llm = get_llm()
+def create_check_continue_agent(llm=None):
+    llm = llm or get_llm()
 
     check_continue = check_continue_prompt | llm.with_structured_output(CheckContinueSchema)
 
@@ -5,17 +5,24 @@ from langchain_ollama import ChatOllama
 
 load_dotenv()
 
-def get_llm():
+MODEL_NAME = os.getenv("OLLAMA_MODEL", "gpt-oss:20b")
+# How long Ollama keeps the model resident after the last request.
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+def get_llm(validate_model_on_init: bool = True):
     """
-    Initialize and return the Google Gemini LLM instance.
+    Initialize and return the Ollama chat model.
+    Args:
+        validate_model_on_init (bool): Check that the model exists on the Ollama server (one extra request).
     Returns:
-        ChatGoogleGenerativeAI: Configured LLM instance.
+        ChatOllama: Configured LLM instance.
     """
     llm = ChatOllama(
-        model="gpt-oss:20b",
+        model=MODEL_NAME,
         temperature=0.7,
         num_predict=512,
-        validate_model_on_init=True,
+        keep_alive=KEEP_ALIVE,
+        validate_model_on_init=validate_model_on_init,
     )
     return llm
 
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field
 
 from .llm import get_llm
-from .template import reAct_prompt
+from .template import reAct_prompt, reAct_fused_prompt
 
 from typing import List, Union
 
@@ -9,12 +9,17 @@ class ReActSchema(BaseModel):
     thought: str = Field(
         description="The agent's thought process about what to do next."
     )
-    action: List[Union[int, str, str]] = Field(
-        description="The action to take, represented as a list where the first element is the element index from the accessibility tree, the second element is the action type (e.g., 'click', 'extract', 'search') and the third element is any additional information needed for the action."
+    action: List[Union[int, List[int], str]] = Field(
+        description="The action to take, represented as a list where the first element is the element index from the accessibility tree (a list of indices for extract_data_from_element, to read several elements at once), the second element is the action type (e.g., 'click', 'extract', 'search') and the third element is any additional information needed for the action."
     )
-def reAct_agent():
-    llm = get_llm()
+    plan: List[List[Union[int, List[int], str]]] = Field(
+        default_factory=list,
+        description="Optional follow-up actions on the current page, run in order right after `action` without looking at the page again (e.g. clicking the search button after typing a query). Same format as `action`. Leave empty when the next action depends on the result of `action`."
+    )
+def reAct_agent(llm=None, fused: bool = False):
+    llm = llm or get_llm()
 
-    reAct = reAct_prompt | llm.with_structured_output(ReActSchema)
+    prompt = reAct_fused_prompt if fused else reAct_prompt
+    reAct = prompt | llm.with_structured_output(ReActSchema)
 
     return reAct
\ No newline at end of file
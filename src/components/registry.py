@@ -0,0 +1,167 @@
+from ollama import Client
+
+from .llm import get_llm, MODEL_NAME, KEEP_ALIVE
+from .reAct import reAct_agent
+from .check_cont import create_check_continue_agent
+from .answer import create_answer_agent
+from .response_cache import ResponseCache, ResponseCacheStats, CachedChain, DEFAULT_CACHE_MAX_BYTES
+
+from typing import Any, Callable, TypedDict
+from functools import partial
+import asyncio
+import threading
+import time
+
+AGENT_BUILDERS: dict[str, Callable] = {
+    "reAct": reAct_agent,
+    "reAct_fused": partial(reAct_agent, fused=True),
+    "check_continue": create_check_continue_agent,
+    "answer": create_answer_agent,
+}
+
+class HealthStatus(TypedDict):
+    ok: bool
+    model: str
+    model_loaded: bool
+    latency: float
+    error: str
+
+_lock = threading.Lock()
+_llm = None
+_agents: dict[str, Any] = {}
+_response_cache: ResponseCache | None = None
+_chain_wrappers: list[Callable[[str, Any], Any]] = []
+
+
+def get_shared_llm():
+    """
+    Return the process-wide chat model. The model is validated once, and every chain built by the
+    registry shares its Ollama client and therefore its HTTP connection pool.
+    """
+    global _llm
+    with _lock:
+        if _llm is None:
+            _llm = get_llm(validate_model_on_init=True)
+        return _llm
+
+def get_agent(name: str):
+    """
+    Return the structured-output chain registered under `name`, building it on first use.
+    Args:
+        name (str): One of AGENT_BUILDERS ("reAct", "reAct_fused", "check_continue", "answer").
+    Returns:
+        Runnable: The prompt | structured LLM chain.
+    """
+    agent = _agents.get(name)
+    if agent is not None:
+        return agent
+
+    llm = get_shared_llm()
+    with _lock:
+        if name not in _agents:
+            agent = AGENT_BUILDERS[name](llm=llm)
+            if _response_cache is not None:
+                agent = CachedChain(agent, llm, _response_cache)
+            for wrapper in _chain_wrappers:
+                agent = wrapper(name, agent)
+            _agents[name] = agent
+        return _agents[name]
+
+async def aget_agent(name: str):
+    """
+    `get_agent` for the event loop: a chain that is not built yet is built on a worker thread, since
+    creating and validating the model blocks.
+    """
+    agent = _agents.get(name)
+    if agent is not None:
+        return agent
+    return await asyncio.to_thread(get_agent, name)
+
+def enable_response_cache(path: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> ResponseCache:
+    """
+    Answer repeated LLM calls from an on-disk cache for the rest of the run. Chains built before are
+    rebuilt so every agent goes through the cache.
+    Args:
+        path (str): SQLite file holding the cached responses; created if missing.
+        max_bytes (int): Size above which the least recently used responses are evicted.
+    Returns:
+        ResponseCache: The cache, e.g. to read its hit and miss counters.
+    """
+    global _response_cache
+    with _lock:
+        _response_cache = ResponseCache(path, max_bytes)
+        _agents.clear()
+        return _response_cache
+
+def disable_response_cache() -> None:
+    global _response_cache
+    with _lock:
+        _response_cache = None
+        _agents.clear()
+
+def response_cache_stats() -> ResponseCacheStats | None:
+    return _response_cache.stats() if _response_cache is not None else None
+
+def add_chain_wrapper(wrapper: Callable[[str, Any], Any]) -> None:
+    """
+    Wrap every chain served by `get_agent` from now on, e.g. to record its calls.
+    Args:
+        wrapper (Callable[[str, Any], Any]): Called with the agent name and chain, returns the chain to serve.
+    """
+    with _lock:
+        _chain_wrappers.append(wrapper)
+        _agents.clear()
+
+def remove_chain_wrapper(wrapper: Callable[[str, Any], Any]) -> None:
+    with _lock:
+        _chain_wrappers.remove(wrapper)
+        _agents.clear()
+
+def install_agents(agents: dict[str, Any]) -> None:
+    """
+    Serve the given chains instead of building them, without creating the model (e.g. a replayed or
+    scripted LLM). Registered chain wrappers still apply. `reset_registry` drops them again.
+    """
+    with _lock:
+        for name, agent in agents.items():
+            for wrapper in _chain_wrappers:
+                agent = wrapper(name, agent)
+            _agents[name] = agent
+
+def _admin_client() -> Client:
+    return get_shared_llm()._client
+
+def warm_up() -> float:
+    """
+    Build every registered chain and load the model into Ollama's memory, so the first graph step
+    does not pay for chain construction or a cold model load.
+    Returns:
+        float: Seconds spent warming up.
+    """
+    start = time.perf_counter()
+    for name in AGENT_BUILDERS:
+        get_agent(name)
+    # An empty prompt only loads the model and refreshes its keep-alive.
+    _admin_client().generate(model=MODEL_NAME, prompt="", keep_alive=KEEP_ALIVE)
+    return time.perf_counter() - start
+
+def health_check() -> HealthStatus:
+    """
+    Check that the Ollama server answers and whether the model is resident in memory.
+    """
+    start = time.perf_counter()
+    try:
+        running = _admin_client().ps()
+        loaded = any(model.model == MODEL_NAME or model.name == MODEL_NAME for model in running.models)
+        return {"ok": True, "model": MODEL_NAME, "model_loaded": loaded, "latency": time.perf_counter() - start, "error": ""}
+    except Exception as e:
+        return {"ok": False, "model": MODEL_NAME, "model_loaded": False, "latency": time.perf_counter() - start, "error": str(e)}
+
+def reset_registry() -> None:
+    """
+    Drop the shared model and every cached chain, e.g. after changing the model configuration.
+    """
+    global _llm
+    with _lock:
+        _llm = None
+        _agents.clear()
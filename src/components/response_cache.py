@@ -0,0 +1,154 @@
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel
+
+from typing import Any, Optional, TypedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+class ResponseCacheStats(TypedDict):
+    hits: int
+    misses: int
+    writes: int
+    evictions: int
+    entries: int
+    bytes: int
+
+
+class ResponseCache:
+    """
+    Content-addressed store of structured LLM responses in a SQLite file.
+
+    Entries are evicted least recently used first once their total size exceeds `max_bytes`. The file can
+    be shared by several processes (e.g. batch workers); the hit and miss counters are per process.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shared between threads; the async graph calls from executor threads.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    def get(self, key: str) -> str | None:
+        db = self._connection()
+        row = db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        with db:
+            db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._count("hits")
+        return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        db = self._connection()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), time.time())
+            )
+            self._count("writes")
+            self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._count("evictions", evicted)
+
+    def stats(self) -> ResponseCacheStats:
+        entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+        stats["entries"] = entries
+        stats["bytes"] = size
+        return stats
+
+    def clear(self) -> None:
+        with self._connection() as db:
+            db.execute("DELETE FROM responses")
+
+
+class CachedChain(Runnable):
+    """
+    Wrap a `prompt | structured LLM` chain so identical calls are answered from a ResponseCache.
+
+    The key covers the prompt template, the model, its sampling settings, the output schema and the
+    chain input, so changing any of them misses the cache instead of returning a stale response.
+    """
+
+    def __init__(self, chain: Runnable, llm: Any, cache: ResponseCache):
+        self.chain = chain
+        self.cache = cache
+        self.schema: type[BaseModel] = chain.last.pydantic_object
+
+        fingerprint = {
+            "template": chain.first.to_json(),
+            "model": getattr(llm, "model", None),
+            "temperature": getattr(llm, "temperature", None),
+            "num_predict": getattr(llm, "num_predict", None),
+            "schema": self.schema.model_json_schema(),
+        }
+        self._prefix = hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def cache_key(self, input: dict) -> str:
+        payload = json.dumps(input, sort_keys=True, default=str)
+        return hashlib.sha256(f"{self._prefix}:{payload}".encode("utf-8")).hexdigest()
+
+    def invoke(self, input: dict, config: Optional[RunnableConfig] = None, **kwargs: Any) -> BaseModel:
+        key = self.cache_key(input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self.schema.model_validate_json(cached)
+
+        response = self.chain.invoke(input, config, **kwargs)
+        self.cache.put(key, response.model_dump_json())
+        return response
+
+    async def ainvoke(self, input: dict, config: Optional[RunnableConfig] = None, **kwargs: Any) -> BaseModel:
+        key = self.cache_key(input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self.schema.model_validate_json(cached)
+
+        response = await self.chain.ainvoke(input, config, **kwargs)
+        self.cache.put(key, response.model_dump_json())
+        return response
@@ -1,11 +1,9 @@
 from langchain_core.prompts import ChatPromptTemplate
 
-reAct_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            """You are a web agent that uses the ReAct framework to decide on actions based on accessibility tree to complete the task \
-            You will be provided with accessibility tree and action history, and must decide on the next action to take. \
+# The ReAct system prompt. The fused variant (fused graph mode) fills in the placeholders to add a
+# `finish` action, so one call also decides whether to stop.
+REACT_SYSTEM_PROMPT = """You are a web agent that uses the ReAct framework to decide on actions based on accessibility tree to complete the task \
+            You will be provided with {inputs}, and must decide on the next action to take. \
             Use the accessibility tree to identify elements on the webpage and determine the appropriate actions to achieve the task. \
             The actions you can take are: 
             - execute_click_action: Click on a web element
@@ -13,20 +11,47 @@ reAct_prompt = ChatPromptTemplate.from_messages(
             - execute_wait_action: Wait for a few seconds
             - execute_go_back_action: Navigate back to the previous page
             - execute_go_home_action: Navigate to the home page (https://www.google.com)
-            - extract_data_from_element: Extract text content from a web element
+            - extract_data_from_element: Extract text content from a web element, or from several at once (e.g. the cells of a table) when idx is a list of indices{finish_action}
             The action should be in the format:
             [idx, action, additional_info]
             where:
-            - idx is the index of the target element in the accessibility tree
+            - idx is the index of the target element in the accessibility tree{finish_idx}
             - action is one of the actions listed above
             - additional_info is the text for execute_type_action if the tool is called, else let additional_info empty \
+            If the next few actions only use elements already in the accessibility tree (e.g. type a query, then click the search button), \
+            put the first one in action and the others, in order and in the same format, in plan (at most 3). \
+            They run one after another without a new accessibility tree and stop early if the page changes. Leave plan empty otherwise{finish_plan}. \
             """
-        ),
-        (
-            "human", "Accessibility Tree:\n{accessibility_tree_str}\nAction History:\n{action_history}\nBased on the above accessibility tree and action history, decide on the next action to take to complete the task: {task}. The action should be in the format: [idx, action, additional_info]"
-        ),
-    ]
-)
+
+REACT_FINISH_FRAGMENTS = {
+    "finish_action": "\n            - finish: Stop interacting because the extracted information is sufficient to answer the task",
+    "finish_idx": " (0 for finish)",
+    "finish_plan": ", and always when choosing finish",
+}
+
+def _reAct_prompt(fused: bool) -> ChatPromptTemplate:
+    if fused:
+        system = REACT_SYSTEM_PROMPT.format(inputs="accessibility tree, action history and the information extracted so far", **REACT_FINISH_FRAGMENTS)
+        human = (
+            "Accessibility Tree:\n{accessibility_tree_str}\nAction History:\n{action_history}\nExtracted Information:\n{extracted_info}\n"
+            "Based on the above accessibility tree, action history and extracted information, decide on the next action to take to complete the task: {task}. "
+            "If the extracted information is sufficient to answer the task, choose finish."
+        )
+    else:
+        system = REACT_SYSTEM_PROMPT.format(inputs="accessibility tree and action history", **{key: "" for key in REACT_FINISH_FRAGMENTS})
+        human = (
+            "Accessibility Tree:\n{accessibility_tree_str}\nAction History:\n{action_history}\n"
+            "Based on the above accessibility tree and action history, decide on the next action to take to complete the task: {task}."
+        )
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", system),
+            ("human", human + " The action should be in the format: [idx, action, additional_info]"),
+        ]
+    )
+
+reAct_prompt = _reAct_prompt(fused=False)
+reAct_fused_prompt = _reAct_prompt(fused=True)
 
 answer_prompt = ChatPromptTemplate.from_messages(
     [
@@ -3,26 +3,68 @@ from typing import TypedDict, Annotated, Any, List, Union
 from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
 from selenium.webdriver.remote.webelement import WebElement
-from agent import start_driver_and_access_url_node, extract_accessibility_tree_node, reAct_node, State, click_node, type_node, wait_node, go_home_node, go_back_node, route_workflow_node, should_continue_node, extract_data_node, answer_node
-
-def create_graph() -> StateGraph:
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from agent import start_driver_and_access_url_node, extract_accessibility_tree_node, reAct_node, fused_reAct_node, check_tool_budget_node, State, click_node, type_node, wait_node, go_home_node, go_back_node, route_workflow_node, should_continue_node, continue_route_node, extract_data_node, execute_plan_node, answer_node, release_driver_node
+from checkpointing import resumable, releasing
+from agent_async import astart_driver_and_access_url_node, aextract_accessibility_tree_node, areAct_node, afused_reAct_node, aclick_node, atype_node, await_node, ago_home_node, ago_back_node, aextract_data_node, aexecute_plan_node, ashould_continue_node, aanswer_node, arelease_driver_node
+
+# Each node pairs its sync and async implementation: `invoke`/`stream` run the former,
+# `ainvoke`/`astream` the latter.
+def dual(sync_node, async_node, name: str) -> RunnableLambda:
+    return RunnableLambda(sync_node, afunc=async_node, name=name)
+
+ACTION_NODES = {
+    "click": (click_node, aclick_node),
+    "type": (type_node, atype_node),
+    "wait": (wait_node, await_node),
+    "go_home": (go_home_node, ago_home_node),
+    "go_back": (go_back_node, ago_back_node),
+    "extract_data": (extract_data_node, aextract_data_node),
+    # Runs a ReAct step that planned several actions; see execute_plan_node.
+    "execute_plan": (execute_plan_node, aexecute_plan_node),
+}
+
+def create_graph(fused: bool = False, checkpointer: BaseCheckpointSaver | None = None) -> StateGraph:
+    """
+    Build and compile the agent graph.
+    Args:
+        fused (bool): Use the fused topology, where the ReAct agent can emit `finish` and action nodes
+            loop back without the check-continue LLM call. The classic topology asks the
+            check-continue agent after every action.
+        checkpointer (BaseCheckpointSaver | None): Save a checkpoint after every node, e.g.
+            `checkpointing.sqlite_checkpointer(path)`, so an interrupted run can be resumed with
+            `checkpointing.invoke_resumable`. Browser nodes then also record the current URL and
+            cookies, and restore the browser when they resume from a checkpoint.
+
+    The compiled graph supports `invoke`/`stream` and `ainvoke`/`astream`; on the async path LLM calls
+    are awaited and WebDriver calls run on a bounded executor, so one event loop can drive many tasks.
+    """
     graph = StateGraph(State)
 
+    def browser_node(sync_node, async_node, name: str, record_session: bool = True) -> RunnableLambda:
+        if checkpointer is None:
+            return dual(sync_node, async_node, name)
+        return dual(resumable(sync_node, record_session), resumable(async_node, record_session), name)
+
     # Nodes
-    graph.add_node("start_driver_and_access_url", start_driver_and_access_url_node)
-    graph.add_node("extract_accessibility_tree", extract_accessibility_tree_node)
-    graph.add_node("reAct", reAct_node)
+    graph.add_node("start_driver_and_access_url", browser_node(start_driver_and_access_url_node, astart_driver_and_access_url_node, "start_driver_and_access_url"))
+    graph.add_node("extract_accessibility_tree", browser_node(extract_accessibility_tree_node, aextract_accessibility_tree_node, "extract_accessibility_tree", record_session=False))
+    if fused:
+        graph.add_node("reAct", dual(fused_reAct_node, afused_reAct_node, "reAct"))
+    else:
+        graph.add_node("reAct", dual(reAct_node, areAct_node, "reAct"))
 
     # Action Nodes
-    graph.add_node("click", click_node)
-    graph.add_node("type", type_node)
-    graph.add_node("wait", wait_node)
-    graph.add_node("go_home", go_home_node)
-    graph.add_node("go_back", go_back_node)
-    graph.add_node("extract_data", extract_data_node)
+    for name, (node, async_node) in ACTION_NODES.items():
+        graph.add_node(name, browser_node(node, async_node, name))
 
     # Answer Node
-    graph.add_node("answer", answer_node)
+    graph.add_node("answer", dual(answer_node, aanswer_node, "answer"))
+    if checkpointer is None:
+        graph.add_node("release_driver", dual(release_driver_node, arelease_driver_node, "release_driver"))
+    else:
+        graph.add_node("release_driver", dual(releasing(release_driver_node), releasing(arelease_driver_node), "release_driver"))
 
     graph.add_edge(START, "start_driver_and_access_url")
     graph.add_edge("start_driver_and_access_url", "extract_accessibility_tree")
@@ -38,69 +80,31 @@ def create_graph() -> StateGraph:
             "go_home": "go_home",
             "go_back": "go_back",
             "extract_data": "extract_data",
+            "execute_plan": "execute_plan",
             "extract_accessibility_tree": "extract_accessibility_tree",
             "answer": "answer",
             "__default__": "answer",
         }
     )
 
-    graph.add_conditional_edges(
-        "click",
-        should_continue_node,
-        {
-            "extract_accessibility_tree": "extract_accessibility_tree",
-            "answer": "answer",
-        }
-    )
-
-    graph.add_conditional_edges(
-        "type",
-        should_continue_node,
-        {
-            "extract_accessibility_tree": "extract_accessibility_tree",
-            "answer": "answer",
-        }
-    )
-
-    graph.add_conditional_edges(
-        "wait",
-        should_continue_node,
-        {
-            "extract_accessibility_tree": "extract_accessibility_tree",
-            "answer": "answer",
-        }
-    )
-
-    graph.add_conditional_edges(
-        "go_home",
-        should_continue_node,
-        {
-            "extract_accessibility_tree": "extract_accessibility_tree",
-            "answer": "answer",
-        }
-    )
-
-    graph.add_conditional_edges(
-        "go_back",
-        should_continue_node,
-        {
-            "extract_accessibility_tree": "extract_accessibility_tree",
-            "answer": "answer",
-        }
-    )
-
-    graph.add_conditional_edges(
-        "extract_data",
-        should_continue_node,
-        {
-            "extract_accessibility_tree": "extract_accessibility_tree",
-            "answer": "answer",
-        }
-    )
+    continue_routes = {
+        "extract_accessibility_tree": "extract_accessibility_tree",
+        "answer": "answer",
+    }
+    if fused:
+        for name in ACTION_NODES:
+            graph.add_conditional_edges(name, check_tool_budget_node, continue_routes)
+    else:
+        # The check-continue call is a node, so the usage of its LLM call is recorded in the state.
+        graph.add_node("should_continue", dual(should_continue_node, ashould_continue_node, "should_continue"))
+        for name in ACTION_NODES:
+            graph.add_edge(name, "should_continue")
+        graph.add_conditional_edges("should_continue", continue_route_node, continue_routes)
 
-    graph.add_edge("answer", END)
+    graph.add_edge("answer", "release_driver")
+    graph.add_edge("release_driver", END)
 
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
 
 if __name__ == "__main__":
     class State(TypedDict):
@@ -115,6 +119,7 @@ if __name__ == "__main__":
         action_history: List[List[Union[str, str, str]]] # [role, name, action]
         warn_obs: List[str]
         action: List[Union[int, str]]
+        plan: List[List[Union[int, str]]]
         tool_count: int = 0
         max_tool_usage: int = 3
         final_anwser: str
@@ -135,11 +140,16 @@ if __name__ == "__main__":
         "action_history": [],
         "warn_obs": [],
         "action": [], 
+        "plan": [],
         "tool_count": 0,
         "max_tool_usage": 3,
         "final_anwser": "",       
+        "tree_token_budget": 1500,
     }
 
+    from browser_pool import session_scope
+
     graph = create_graph()
-    final_state = graph.invoke(initial_state)
+    with session_scope():
+        final_state = graph.invoke(initial_state)
     print("Final Answer:", final_state["final_anwser"])
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+Bounded action history for the ReAct prompt.
+
+The last `history_window` actions are shown in full; older ones are folded into a rolling summary
+(action counts and the last elements acted on) that is updated with only the actions leaving the
+window, so the prompt and the work per step stay the same size however long the task runs.
+"""
+from typing import TypedDict
+import json
+import os
+
+DEFAULT_HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "8"))
+# Most earlier elements named in the summary.
+MAX_SUMMARY_ELEMENTS = 10
+
+class HistorySummary(TypedDict):
+    actions: int # number of actions folded into the summary
+    counts: dict[str, int] # per action kind ("click", "type", ...)
+    elements: list[str] # last distinct elements acted on, oldest first
+
+
+def empty_summary() -> HistorySummary:
+    return {"actions": 0, "counts": {}, "elements": []}
+
+def action_kind(action: str) -> str:
+    # "Type hello" -> "type"
+    return action.split(" ", 1)[0].lower() if action else "unknown"
+
+def fold_history(summary: HistorySummary, actions: list[list[str]]) -> HistorySummary:
+    """
+    Add `actions` ([role, name, action] entries) to a copy of `summary`.
+    """
+    counts = dict(summary["counts"])
+    elements = list(summary["elements"])
+    for role, name, action in actions:
+        kind = action_kind(action)
+        counts[kind] = counts.get(kind, 0) + 1
+        if role != "N/A":
+            element = f"{role} '{name}'"
+            if element in elements:
+                elements.remove(element)
+            elements.append(element)
+
+    return {
+        "actions": summary["actions"] + len(actions),
+        "counts": counts,
+        "elements": elements[-MAX_SUMMARY_ELEMENTS:],
+    }
+
+def window_history(
+    history: list[list[str]],
+    summary: HistorySummary | None,
+    window: int = DEFAULT_HISTORY_WINDOW
+) -> tuple[HistorySummary, list[list[str]]]:
+    """
+    Split the action history into a summary of the older actions and the recent ones.
+    Args:
+        history (list[list[str]]): The full action history.
+        summary (HistorySummary | None): The summary from the previous step, extended rather than rebuilt.
+        window (int): Number of recent actions kept in full; 0 keeps the whole history.
+    Returns:
+        tuple[HistorySummary, list[list[str]]]: The updated summary and the recent actions.
+    """
+    summary = summary or empty_summary()
+    if window <= 0:
+        return summary, history
+
+    cut = max(len(history) - window, summary["actions"])
+    if cut > summary["actions"]:
+        summary = fold_history(summary, history[summary["actions"]:cut])
+    return summary, history[cut:]
+
+def render_summary(summary: HistorySummary) -> str:
+    counts = ", ".join(f"{kind} x{count}" for kind, count in summary["counts"].items())
+    text = f"{summary['actions']} earlier actions ({counts})"
+    if summary["elements"]:
+        text += f", last on: {', '.join(summary['elements'])}"
+    return text
+
+def format_history(summary: HistorySummary, recent: list[list[str]]) -> str:
+    """
+    The history as shown to the ReAct agent: the JSON list of recent actions, preceded by the summary
+    once actions have left the window.
+    """
+    if not summary["actions"]:
+        return json.dumps(recent)
+    return f"{render_summary(summary)}\nRecent actions: {json.dumps(recent)}"
+
+def history_size(text: str) -> int:
+    """
+    Number of actions in a history formatted by `format_history`.
+    """
+    summary, separator, recent = text.partition("\nRecent actions: ")
+    if not separator:
+        return len(json.loads(text))
+    return int(summary.split(" ", 1)[0]) + len(json.loads(recent))
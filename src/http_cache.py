@@ -0,0 +1,491 @@
+"""
+Shared on-disk HTTP cache for the pooled browsers, served through the CDP Fetch domain.
+
+Each browser gets a `FetchInterceptor`: a DevTools WebSocket client on a background thread that
+pauses script, stylesheet and allow-listed XHR/fetch requests. Fresh responses found in the
+`HttpResponseStore` are fulfilled without touching the network; other responses are paused again once
+they arrive and stored when their headers allow it. Navigations, clicks and every other tool go through
+the same browser, so they all benefit.
+
+The store keeps bodies content-addressed under `<directory>/blobs` (identical files from different URLs
+are stored once) and an index in `<directory>/index.sqlite`, so several processes can share it.
+"""
+from selenium import webdriver
+import websocket
+
+from utils import setup_logger
+
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import TypedDict
+import base64
+import hashlib
+import itertools
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.request
+import weakref
+
+logger = setup_logger("http_cache")
+
+DEFAULT_HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Responses without max-age or Expires stay fresh for this fraction of the time since their
+# Last-Modified date (the heuristic of RFC 9111, section 4.2.2).
+HEURISTIC_FRESHNESS_FRACTION = 0.1
+STATIC_RESOURCE_TYPES = ("Script", "Stylesheet")
+API_RESOURCE_TYPES = ("XHR", "Fetch")
+# Stored bodies are decoded, so the original framing headers no longer apply.
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+# Responses varying on these are not cached: Fetch does not show the cookies and credentials a request
+# is sent with, so the variants could not be told apart. Accept-Encoding needs no matching, since the
+# stored bodies are decoded.
+UNCACHEABLE_VARY = {"*", "cookie", "authorization"}
+IGNORED_VARY = {"accept-encoding"}
+COMMAND_TIMEOUT = 10.0
+HANDLER_THREADS = 4
+
+class HttpCacheStats(TypedDict):
+    hits: int
+    misses: int
+    writes: int
+    evictions: int
+    bytes_served: int
+    entries: int
+    bytes: int
+
+class CachedResponse(TypedDict):
+    status: int
+    headers: list[dict[str, str]] # [{"name": ..., "value": ...}], as CDP expects them
+    body: bytes
+
+
+def vary_key(response_headers: list[dict[str, str]], request_headers: dict[str, str]) -> dict[str, str] | None:
+    """
+    The request header values a response was selected on, following its Vary header.
+    Args:
+        response_headers (list[dict[str, str]]): The response headers, as CDP reports them.
+        request_headers (dict[str, str]): The headers of the request.
+    Returns:
+        dict[str, str] | None: Lower-cased header names to values ({} when the response does not vary),
+            or None if the response must not be cached.
+    """
+    vary = [
+        name.strip().lower()
+        for header in response_headers if header["name"].lower() == "vary"
+        for name in header["value"].split(",") if name.strip()
+    ]
+    if UNCACHEABLE_VARY.intersection(vary):
+        return None
+
+    request_values = {name.lower(): value for name, value in request_headers.items()}
+    return {name: request_values.get(name, "") for name in sorted(set(vary) - IGNORED_VARY)}
+
+
+def freshness_ttl(headers: list[dict[str, str]]) -> float | None:
+    """
+    Seconds a response may be served from the cache, following its Cache-Control and Expires headers,
+    or else a tenth of its age since Last-Modified.
+    Returns:
+        float | None: The TTL, or None if the response must not be cached.
+    """
+    values = {header["name"].lower(): header["value"] for header in headers}
+    cache_control = values.get("cache-control", "").lower()
+
+    if any(directive in cache_control for directive in ("no-store", "no-cache", "private")):
+        return None
+    if "set-cookie" in values:
+        return None
+
+    match = re.search(r"s-maxage=(\d+)", cache_control) or re.search(r"max-age=(\d+)", cache_control)
+    if match:
+        ttl = float(match.group(1))
+        return ttl or None
+
+    if "expires" in values:
+        try:
+            expires = parsedate_to_datetime(values["expires"]).timestamp()
+        except (TypeError, ValueError):
+            return None
+        ttl = expires - time.time()
+        return ttl if ttl > 0 else None
+
+    if "last-modified" in values:
+        try:
+            last_modified = parsedate_to_datetime(values["last-modified"]).timestamp()
+            date = parsedate_to_datetime(values["date"]).timestamp() if "date" in values else time.time()
+        except (TypeError, ValueError):
+            return None
+        ttl = (date - last_modified) * HEURISTIC_FRESHNESS_FRACTION
+        return ttl if ttl > 0 else None
+
+    # No validator or explicit freshness: the response may change at any time.
+    return None
+
+
+class HttpResponseStore:
+    """
+    Content-addressed store of HTTP responses with TTLs, evicted least recently used first once the
+    bodies exceed `max_bytes`. The hit and miss counters are per process.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_HTTP_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.blob_directory = os.path.join(directory, "blobs")
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "bytes_served": 0}
+
+        os.makedirs(self.blob_directory, exist_ok=True)
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, url TEXT NOT NULL, blob TEXT NOT NULL, status INTEGER NOT NULL, "
+                "headers TEXT NOT NULL, size INTEGER NOT NULL, expires REAL NOT NULL, last_access REAL NOT NULL, "
+                "vary TEXT NOT NULL DEFAULT '{}')"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            if "vary" not in [column[1] for column in db.execute("PRAGMA table_info(responses)")]:
+                # Stores written before Vary was honoured may hold the wrong variants.
+                self._delete_all(db)
+                try:
+                    db.execute("ALTER TABLE responses ADD COLUMN vary TEXT NOT NULL DEFAULT '{}'")
+                except sqlite3.OperationalError:
+                    # Another process added it first.
+                    pass
+
+    def _connection(self) -> sqlite3.Connection:
+        # The interceptors handle requests on several threads; sqlite3 connections are per thread.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_directory, digest[:2], digest)
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(f"GET {url}".encode("utf-8")).hexdigest()
+
+    def get(self, url: str, request_headers: dict[str, str] | None = None) -> CachedResponse | None:
+        """
+        The fresh response stored for `url`, if it was selected on the same values of the headers
+        named in its Vary header as `request_headers`.
+        """
+        key = self.key(url)
+        db = self._connection()
+        row = db.execute("SELECT blob, status, headers, expires, vary FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[3] < time.time():
+            self._count("misses")
+            return None
+        vary = json.loads(row[4])
+        if vary:
+            request_values = {name.lower(): value for name, value in (request_headers or {}).items()}
+            if any(request_values.get(name, "") != value for name, value in vary.items()):
+                self._count("misses")
+                return None
+
+        try:
+            with open(self._blob_path(row[0]), "rb") as f:
+                body = f.read()
+        except OSError:
+            # Evicted by another process in the meantime.
+            self._count("misses")
+            return None
+
+        with db:
+            db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._count("hits")
+        self._count("bytes_served", len(body))
+        return {"status": row[1], "headers": json.loads(row[2]), "body": body}
+
+    def put(self, url: str, status: int, headers: list[dict[str, str]], body: bytes, ttl: float, vary: dict[str, str] | None = None) -> None:
+        """
+        Store a response. One variant is kept per URL: `vary` (see `vary_key`) holds the request header
+        values it was selected on, and a later variant replaces it.
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename, so readers in other processes never see a partial body.
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+
+        headers = [header for header in headers if header["name"].lower() not in DROPPED_HEADERS]
+        now = time.time()
+        db = self._connection()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, url, blob, status, headers, size, expires, last_access, vary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.key(url), url, digest, status, json.dumps(headers), len(body), now + ttl, now, json.dumps(vary or {}))
+            )
+            self._count("writes")
+            self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        # Identical bodies share a blob, so sizes are counted per blob.
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT blob, size FROM responses)").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        # Expired entries go first, then the least recently used.
+        rows = db.execute("SELECT key, blob, size FROM responses ORDER BY expires > ?, last_access", (time.time(),)).fetchall()
+        for key, blob, size in rows:
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            evicted += 1
+            if db.execute("SELECT 1 FROM responses WHERE blob = ? LIMIT 1", (blob,)).fetchone() is None:
+                total -= size
+                try:
+                    os.remove(self._blob_path(blob))
+                except OSError:
+                    pass
+        self._count("evictions", evicted)
+
+    def stats(self) -> HttpCacheStats:
+        entries, size = self._connection().execute(
+            "SELECT (SELECT COUNT(*) FROM responses), COALESCE(SUM(size), 0) FROM (SELECT DISTINCT blob, size FROM responses)"
+        ).fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+        stats["entries"] = entries
+        stats["bytes"] = size
+        return stats
+
+    def _delete_all(self, db: sqlite3.Connection) -> None:
+        for (blob,) in db.execute("SELECT DISTINCT blob FROM responses").fetchall():
+            try:
+                os.remove(self._blob_path(blob))
+            except OSError:
+                pass
+        db.execute("DELETE FROM responses")
+
+    def clear(self) -> None:
+        with self._connection() as db:
+            self._delete_all(db)
+
+
+class FetchInterceptor:
+    """
+    Serve the requests of one browser from an HttpResponseStore over a separate DevTools connection.
+
+    ChromeDriver's CDP bridge can only send commands, while Fetch needs every paused request to be
+    answered, so this keeps its own WebSocket to the browser: a reader thread routes command results and
+    hands `Fetch.requestPaused` events to a few handler threads. Every page target, including tabs opened
+    later, is attached to and gets `Fetch.enable` with the cached resource types.
+    """
+
+    def __init__(self, debugger_address: str, store: HttpResponseStore, allow_patterns: list[str] | None = None):
+        self.store = store
+        self.allow_patterns = allow_patterns or []
+        self._ids = itertools.count(1)
+        self._pending: dict[int, tuple[threading.Event, dict]] = {}
+        self._send_lock = threading.Lock()
+        self._targets: set[str] = set()
+        self._handlers = ThreadPoolExecutor(max_workers=HANDLER_THREADS, thread_name_prefix="http-cache")
+
+        with urllib.request.urlopen(f"http://{debugger_address}/json/version", timeout=COMMAND_TIMEOUT) as response:
+            ws_url = json.load(response)["webSocketDebuggerUrl"]
+        self.ws = websocket.create_connection(ws_url, timeout=None, suppress_origin=True)
+        self._reader = threading.Thread(target=self._read_loop, name="http-cache-reader", daemon=True)
+        self._reader.start()
+
+        self._send("Target.setAutoAttach", {"autoAttach": True, "waitForDebuggerOnStart": False, "flatten": True})
+        for target in self._send("Target.getTargets").get("targetInfos", []):
+            if target["type"] == "page":
+                self._send("Target.attachToTarget", {"targetId": target["targetId"], "flatten": True})
+
+    def _patterns(self) -> list[dict[str, str]]:
+        patterns = [
+            {"urlPattern": "*", "resourceType": resource_type, "requestStage": stage}
+            for resource_type in STATIC_RESOURCE_TYPES
+            for stage in ("Request", "Response")
+        ]
+        patterns += [
+            {"urlPattern": url_pattern, "resourceType": resource_type, "requestStage": stage}
+            for url_pattern in self.allow_patterns
+            for resource_type in API_RESOURCE_TYPES
+            for stage in ("Request", "Response")
+        ]
+        return patterns
+
+    def _post(self, method: str, params: dict | None = None, session_id: str | None = None) -> tuple[int, threading.Event]:
+        message_id = next(self._ids)
+        done = threading.Event()
+        self._pending[message_id] = (done, {})
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        with self._send_lock:
+            self.ws.send(json.dumps(message))
+        return message_id, done
+
+    def _send(self, method: str, params: dict | None = None, session_id: str | None = None) -> dict:
+        message_id, done = self._post(method, params, session_id)
+        if not done.wait(COMMAND_TIMEOUT):
+            self._pending.pop(message_id, None)
+            raise TimeoutError(f"No response to {method} within {COMMAND_TIMEOUT}s.")
+        response = self._pending.pop(message_id)[1]
+        if "error" in response:
+            raise RuntimeError(f"{method} failed: {response['error'].get('message')}")
+        return response.get("result", {})
+
+    def _notify(self, method: str, params: dict, session_id: str) -> None:
+        # Answers to paused requests; the result is not needed, so nothing waits for it.
+        message_id, _ = self._post(method, params, session_id)
+        self._pending.pop(message_id, None)
+
+    def _read_loop(self) -> None:
+        while True:
+            try:
+                message = json.loads(self.ws.recv())
+            except Exception:
+                # The browser quit or the interceptor was closed.
+                break
+
+            if "id" in message:
+                pending = self._pending.get(message["id"])
+                if pending:
+                    pending[1].update(message)
+                    pending[0].set()
+            elif message.get("method") == "Fetch.requestPaused":
+                self._handlers.submit(self._on_request_paused, message["params"], message.get("sessionId"))
+            elif message.get("method") == "Target.attachedToTarget":
+                self._handlers.submit(self._on_attached, message["params"])
+
+        for done, _ in list(self._pending.values()):
+            done.set()
+
+    def _on_attached(self, params: dict) -> None:
+        target = params["targetInfo"]
+        with self._send_lock:
+            # Auto-attach and the explicit attach of existing pages may both report a target.
+            if target["type"] not in ("page", "iframe") or target["targetId"] in self._targets:
+                return
+            self._targets.add(target["targetId"])
+        try:
+            self._send("Fetch.enable", {"patterns": self._patterns()}, params["sessionId"])
+        except Exception as e:
+            logger.warning(f"Unable to intercept requests of target {target.get('url')}: {e}")
+
+    def _on_request_paused(self, params: dict, session_id: str) -> None:
+        request_id = params["requestId"]
+        url = params["request"]["url"]
+        response_stage = "responseStatusCode" in params or "responseErrorReason" in params
+        try:
+            if params["request"]["method"] == "GET" and not response_stage:
+                cached = self.store.get(url, params["request"].get("headers", {}))
+                if cached is not None:
+                    self._notify("Fetch.fulfillRequest", {
+                        "requestId": request_id,
+                        "responseCode": cached["status"],
+                        "responseHeaders": cached["headers"],
+                        "body": base64.b64encode(cached["body"]).decode("ascii"),
+                    }, session_id)
+                    return
+            elif params["request"]["method"] == "GET" and params.get("responseStatusCode") == 200:
+                response_headers = params.get("responseHeaders", [])
+                ttl = freshness_ttl(response_headers)
+                vary = vary_key(response_headers, params["request"].get("headers", {}))
+                if ttl and vary is not None:
+                    result = self._send("Fetch.getResponseBody", {"requestId": request_id}, session_id)
+                    body = base64.b64decode(result["body"]) if result.get("base64Encoded") else result["body"].encode("utf-8")
+                    self.store.put(url, 200, response_headers, body, ttl, vary)
+        except Exception as e:
+            logger.warning(f"HTTP cache passed {url} through after an error: {e}")
+
+        # A paused request must always be answered, or the page hangs. At the response stage this
+        # lets the original response through.
+        try:
+            self._notify("Fetch.continueRequest", {"requestId": request_id}, session_id)
+        except Exception as e:
+            logger.error(f"Unable to continue paused request {url}: {e}")
+
+    def close(self) -> None:
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+        self._handlers.shutdown(wait=False)
+
+
+_store: HttpResponseStore | None = None
+_allow_patterns: list[str] = []
+_interceptors: "weakref.WeakKeyDictionary[webdriver.Chrome, FetchInterceptor]" = weakref.WeakKeyDictionary()
+_store_lock = threading.Lock()
+
+def enable_http_cache(directory: str, max_bytes: int = DEFAULT_HTTP_CACHE_MAX_BYTES, allow_patterns: list[str] | None = None) -> HttpResponseStore:
+    """
+    Serve cacheable responses of every browser launched from now on from a store in `directory`.
+    Args:
+        directory (str): Cache directory, shareable between processes.
+        max_bytes (int): Size limit of the stored bodies.
+        allow_patterns (list[str] | None): URL patterns ("*" wildcards) of XHR/fetch API responses that may be
+            cached too; scripts and stylesheets always are.
+    Returns:
+        HttpResponseStore: The store, e.g. to read its stats.
+    """
+    global _store, _allow_patterns
+    with _store_lock:
+        _store = HttpResponseStore(directory, max_bytes)
+        _allow_patterns = list(allow_patterns or [])
+        return _store
+
+def disable_http_cache() -> None:
+    global _store
+    with _store_lock:
+        _store = None
+
+def get_http_cache() -> HttpResponseStore | None:
+    """
+    Return the active store. HTTP_CACHE_DIR (and HTTP_CACHE_ALLOW, comma-separated URL patterns)
+    enable it without code changes, e.g. in batch workers.
+    """
+    with _store_lock:
+        store = _store
+    if store is None and os.getenv("HTTP_CACHE_DIR"):
+        allow = [pattern.strip() for pattern in os.getenv("HTTP_CACHE_ALLOW", "").split(",") if pattern.strip()]
+        store = enable_http_cache(os.environ["HTTP_CACHE_DIR"], allow_patterns=allow)
+    return store
+
+def http_cache_stats() -> HttpCacheStats | None:
+    store = get_http_cache()
+    return store.stats() if store is not None else None
+
+def install_http_cache(driver: webdriver.Chrome) -> FetchInterceptor | None:
+    """
+    Intercept the requests of `driver` with the active HTTP cache, if one is enabled.
+    """
+    store = get_http_cache()
+    if store is None:
+        return None
+
+    try:
+        debugger_address = driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        interceptor = FetchInterceptor(debugger_address, store, _allow_patterns)
+    except Exception as e:
+        logger.warning(f"Unable to install the HTTP cache: {e}")
+        return None
+
+    _interceptors[driver] = interceptor
+    weakref.finalize(driver, interceptor.close)
+    logger.info(f"HTTP cache installed ({store.directory}).")
+    return interceptor
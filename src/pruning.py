@@ -0,0 +1,130 @@
+from tools import AccessibilityTree, IndentStyle, as_tree_store, walk_accessibility_tree, render_accessibility_tree
+from ax_store import AXTreeStore, AXNodeMap
+
+from collections import Counter
+import math
+import re
+
+DEFAULT_TREE_TOKEN_BUDGET = 1500
+# Upper bound on the elements considered for ranking, to bound the cost on huge pages.
+MAX_CANDIDATES = 5000
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset([
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "for", "with", "by", "from", "is", "are",
+    "be", "it", "this", "that", "what", "when", "where", "which", "who", "how", "out", "find", "get", "into",
+    "me", "my", "i", "you", "your", "please", "then",
+])
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough LLM token count (about four characters per token), good enough for budgeting prompts.
+    """
+    return len(text) // 4 + 1
+
+def score_elements(
+    store: AXTreeStore,
+    positions: list[int],
+    task: str
+) -> list[float]:
+    """
+    Score each element's role and name against the task with BM25.
+    Args:
+        store (AXTreeStore): The accessibility tree.
+        positions (list[int]): Store positions of the candidate elements.
+        task (str): The user's task.
+    Returns:
+        list[float]: One score per candidate, 0 for elements sharing no term with the task.
+    """
+    query = set(tokenize(task))
+    if not query or not positions:
+        return [0.0] * len(positions)
+
+    documents = [Counter(tokenize(f"{store.role(i)} {store.name(i)}")) for i in positions]
+    average_length = sum(sum(doc.values()) for doc in documents) / len(documents) or 1.0
+
+    document_frequency = Counter()
+    for doc in documents:
+        document_frequency.update(query.intersection(doc))
+
+    idf = {
+        term: math.log((len(documents) - df + 0.5) / (df + 0.5) + 1.0)
+        for term, df in document_frequency.items()
+    }
+
+    scores = []
+    for doc in documents:
+        length = sum(doc.values())
+        score = 0.0
+        for term in query.intersection(doc):
+            tf = doc[term]
+            score += idf[term] * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+        scores.append(score)
+    return scores
+
+def prune_accessibility_tree(
+    accessibility_tree: AccessibilityTree | AXTreeStore,
+    task: str,
+    token_budget: int = DEFAULT_TREE_TOKEN_BUDGET,
+    indent_style: IndentStyle = "Tab"
+) -> tuple[str, AXNodeMap]:
+    """
+    Build the accessibility tree text from the elements most relevant to the task, within a token budget.
+
+    Elements are ranked with BM25 over their role and name; each selected element brings its displayed
+    ancestors along so it keeps its context. Whatever budget is left is filled with the remaining
+    elements in page order, like the unpruned parser.
+    Args:
+        accessibility_tree (AccessibilityTree | AXTreeStore): The accessibility tree to parse.
+        task (str): The user's task.
+        token_budget (int): Approximate number of tokens the tree text may use.
+        indent_style (IndentStyle): Indentation used for nested elements.
+    Returns:
+        tuple[str, AXNodeMap]: The indented tree text and a map from display index to element.
+    """
+    store = as_tree_store(accessibility_tree)
+    positions, depths, parents = walk_accessibility_tree(store, MAX_CANDIDATES)
+
+    # Cost of each element's line, measured on a representative index width.
+    costs = [
+        estimate_tokens(f"{' ' * depths[k]} [{k + 1}] {store.role(i)} '{store.name(i)}'")
+        for k, i in enumerate(positions)
+    ]
+    scores = score_elements(store, positions, task)
+
+    selected = set()
+    remaining = token_budget
+
+    def select_with_ancestors(k: int) -> None:
+        nonlocal remaining
+        chain = []
+        while k != -1 and k not in selected:
+            chain.append(k)
+            k = parents[k]
+        cost = sum(costs[c] for c in chain)
+        if cost <= remaining:
+            selected.update(chain)
+            remaining -= cost
+
+    ranked = sorted((k for k in range(len(positions)) if scores[k] > 0), key=lambda k: -scores[k])
+    for k in ranked:
+        select_with_ancestors(k)
+
+    for k in range(len(positions)):
+        if remaining <= 0:
+            break
+        select_with_ancestors(k)
+
+    kept = sorted(selected)
+    kept_positions = [positions[k] for k in kept]
+
+    tree_str = render_accessibility_tree(store, kept_positions, [depths[k] for k in kept], indent_style)
+    return tree_str, AXNodeMap.from_store(store, kept_positions)
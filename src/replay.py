@@ -0,0 +1,488 @@
+"""
+Record a graph run against a live browser and Ollama, and replay it with neither.
+
+Recording wraps the pooled driver (CDP commands, scripts and navigation), the page settle waits,
+the execute_* tools and the three LLM chains, and appends every response to a JSONL trace. Replaying
+serves those responses back to `create_graph()` in place of Chrome and Ollama, so the graph's own
+code (tree extraction, pruning, element resolution, routing) runs exactly as recorded, in milliseconds
+and deterministically. Both sides time every graph step, so runs can be compared step for step.
+
+Usage, from src/:
+    python -m replay record --task "Find the terms link" --url https://example.com --output trace.jsonl [--fused]
+    python -m replay replay trace.jsonl [--repeat 5] [--async]
+"""
+from selenium.webdriver.remote.webelement import WebElement
+
+from utils import setup_logger
+from browser_pool import get_session_pool, set_session_pool, session_scope, DEFAULT_LEASE_TIMEOUT
+from components import registry
+
+import tools
+import agent
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Iterator, TypedDict
+from langchain_core.runnables import Runnable
+import argparse
+import asyncio
+import hashlib
+import importlib
+import json
+import threading
+import time
+
+logger = setup_logger("replay")
+
+# Driver calls whose responses are recorded. Everything else is forwarded untouched.
+RECORDED_METHODS = ("execute_cdp_cmd", "execute_script", "get", "back", "close", "get_log")
+RECORDED_TOOLS = ("execute_click_action", "execute_type_action", "execute_wait_action", "execute_go_home_action", "execute_go_back_action", "extract_data_from_elements")
+# State keys that cannot be written to a trace.
+UNSERIALIZABLE_STATE = ("driver", "web_element", "accessibility_node_map")
+
+class StepTiming(TypedDict):
+    node: str
+    seconds: float
+
+class ReplayResult(TypedDict):
+    answer: str
+    seconds: float
+    steps: list[StepTiming]
+    misses: int
+
+
+class ReplayMismatch(LookupError):
+    """The replayed run made a call that has no (more) recorded response."""
+
+class ReplayedError(RuntimeError):
+    """A call that failed while recording fails the same way on replay."""
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, WebElement):
+        return "<element>"
+    return str(value)
+
+def call_key(*parts: Any) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=_json_default).encode("utf-8")).hexdigest()
+
+
+class TraceWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def muted(self) -> bool:
+        return getattr(self._local, "muted", False)
+
+    @contextmanager
+    def mute(self) -> Iterator[None]:
+        """
+        Skip driver calls made inside a block that is recorded as a whole (the settle polling loop).
+        """
+        self._local.muted = True
+        try:
+            yield
+        finally:
+            self._local.muted = False
+
+    def write(self, event: dict[str, Any]) -> None:
+        line = json.dumps(event, default=_json_default)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class RecordingDriver:
+    """
+    Proxy of a WebDriver that writes the response of every call in RECORDED_METHODS to the trace.
+    """
+
+    def __init__(self, driver: Any, writer: TraceWriter):
+        self._driver = driver
+        self._writer = writer
+
+    def _call(self, method: str, *args: Any) -> Any:
+        if self._writer.muted:
+            return getattr(self._driver, method)(*args)
+
+        start = time.perf_counter()
+        event = {"kind": "driver", "method": method, "key": call_key(method, args), "result": None, "error": None}
+        if method == "execute_cdp_cmd":
+            event["command"] = args[0]
+        try:
+            event["result"] = getattr(self._driver, method)(*args)
+            return event["result"]
+        except Exception as e:
+            event["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            event["seconds"] = time.perf_counter() - start
+            self._writer.write(event)
+
+    @property
+    def window_handles(self) -> list[str]:
+        return self._call("__getattribute__", "window_handles")
+
+    @property
+    def current_url(self) -> str:
+        return self._call("__getattribute__", "current_url")
+
+    def __getattr__(self, name: str) -> Any:
+        if name in RECORDED_METHODS:
+            return partial(self._call, name)
+        return getattr(self._driver, name)
+
+
+class RecordingPool:
+    def __init__(self, pool: Any, writer: TraceWriter):
+        self.pool = pool
+        self.writer = writer
+
+    def lease(self, timeout: float | None = DEFAULT_LEASE_TIMEOUT) -> tuple[RecordingDriver, float]:
+        driver, wait = self.pool.lease(timeout)
+        return RecordingDriver(driver, self.writer), wait
+
+    def release(self, driver: RecordingDriver) -> None:
+        self.pool.release(driver._driver)
+
+    def stats(self) -> dict:
+        return self.pool.stats()
+
+
+class RecordingChain(Runnable):
+    def __init__(self, name: str, chain: Runnable, writer: TraceWriter):
+        self.name = name
+        self.chain = chain
+        self.writer = writer
+
+    def _record(self, input: dict, response: Any, start: float) -> None:
+        schema = type(response)
+        self.writer.write({
+            "kind": "llm",
+            "name": self.name,
+            "key": call_key(self.name, input),
+            "schema": f"{schema.__module__}:{schema.__qualname__}",
+            "result": response.model_dump(),
+            "seconds": time.perf_counter() - start,
+        })
+
+    def invoke(self, input: dict, config: Any = None, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        response = self.chain.invoke(input, config, **kwargs)
+        self._record(input, response, start)
+        return response
+
+    async def ainvoke(self, input: dict, config: Any = None, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        response = await self.chain.ainvoke(input, config, **kwargs)
+        self._record(input, response, start)
+        return response
+
+
+def _recorded_settle(writer: TraceWriter, settle: Any, driver: Any, *args: Any, **kwargs: Any) -> float:
+    with writer.mute():
+        waited = settle(driver, *args, **kwargs)
+    writer.write({"kind": "settle", "result": waited})
+    return waited
+
+def _recorded_tool(writer: TraceWriter, name: str, tool: Any, *args: Any, **kwargs: Any) -> Any:
+    start = time.perf_counter()
+    try:
+        return tool(*args, **kwargs)
+    finally:
+        writer.write({"kind": "tool", "name": name, "seconds": time.perf_counter() - start})
+
+@contextmanager
+def recording(path: str) -> Iterator[TraceWriter]:
+    """
+    Record every browser and LLM response of the graph runs inside the block to `path`.
+    """
+    writer = TraceWriter(path)
+    previous_pool = set_session_pool(RecordingPool(get_session_pool(), writer))
+    def record_chain(name: str, chain: Runnable) -> RecordingChain:
+        return RecordingChain(name, chain, writer)
+    registry.add_chain_wrapper(record_chain)
+
+    original_settle = tools.wait_for_page_settle
+    original_tools = {name: getattr(agent, name) for name in RECORDED_TOOLS}
+    tools.wait_for_page_settle = partial(_recorded_settle, writer, original_settle)
+    for name, tool in original_tools.items():
+        setattr(agent, name, partial(_recorded_tool, writer, name, tool))
+
+    try:
+        yield writer
+    finally:
+        tools.wait_for_page_settle = original_settle
+        for name, tool in original_tools.items():
+            setattr(agent, name, tool)
+        registry.remove_chain_wrapper(record_chain)
+        set_session_pool(previous_pool)
+        writer.close()
+
+
+class Trace:
+    """
+    Recorded responses, queued per call key in recording order.
+    """
+
+    def __init__(self, events: list[dict[str, Any]]):
+        self.meta: dict[str, Any] = {}
+        self.driver: dict[str, deque] = defaultdict(deque)
+        self.llm: dict[str, deque] = defaultdict(deque)
+        self.settle: deque = deque()
+        self.steps: list[StepTiming] = []
+
+        for event in events:
+            kind = event["kind"]
+            if kind == "meta":
+                self.meta = event
+            elif kind == "driver":
+                self.driver[event["key"]].append(event)
+            elif kind == "llm":
+                self.llm[event["key"]].append(event)
+            elif kind == "settle":
+                self.settle.append(event["result"])
+            elif kind == "step":
+                self.steps.append({"node": event["node"], "seconds": event["seconds"]})
+
+    @classmethod
+    def load(cls, path: str) -> "Trace":
+        with open(path, encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+
+class _ReplaySwitchTo:
+    def window(self, handle: str) -> None:
+        pass
+
+
+class ReplayDriver:
+    """
+    Stand-in for a WebDriver that answers every recorded call from a Trace.
+    """
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self.misses = 0
+        self.switch_to = _ReplaySwitchTo()
+
+    def _next(self, method: str, *args: Any) -> Any:
+        queue = self.trace.driver.get(call_key(method, args))
+        if not queue:
+            self.misses += 1
+            raise ReplayMismatch(f"No recorded response for {method}{args!r:.120}")
+
+        event = queue.popleft()
+        if event["error"]:
+            raise ReplayedError(event["error"])
+        return event["result"]
+
+    @property
+    def window_handles(self) -> list[str]:
+        return self._next("__getattribute__", "window_handles")
+
+    @property
+    def current_url(self) -> str:
+        return self._next("__getattribute__", "current_url")
+
+    def __getattr__(self, name: str) -> Any:
+        if name in RECORDED_METHODS:
+            return partial(self._next, name)
+        raise ReplayMismatch(f"WebDriver.{name} is not recorded and cannot be replayed.")
+
+    def quit(self) -> None:
+        pass
+
+
+class ReplayPool:
+    def __init__(self, driver: ReplayDriver):
+        self.driver = driver
+
+    def lease(self, timeout: float | None = None) -> tuple[ReplayDriver, float]:
+        return self.driver, 0.0
+
+    def release(self, driver: ReplayDriver) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"leases": 1, "reused": 0, "total_lease_wait": 0.0}
+
+
+class ReplayChain(Runnable):
+    def __init__(self, name: str, trace: Trace, driver: ReplayDriver):
+        self.name = name
+        self.trace = trace
+        self.driver = driver
+
+    def invoke(self, input: dict, config: Any = None, **kwargs: Any) -> Any:
+        queue = self.trace.llm.get(call_key(self.name, input))
+        if not queue:
+            self.driver.misses += 1
+            raise ReplayMismatch(f"No recorded {self.name} response for this input.")
+
+        event = queue.popleft()
+        module, qualname = event["schema"].split(":")
+        schema = getattr(importlib.import_module(module), qualname)
+        return schema.model_validate(event["result"])
+
+    async def ainvoke(self, input: dict, config: Any = None, **kwargs: Any) -> Any:
+        return self.invoke(input, config, **kwargs)
+
+
+def _replayed_settle(trace: Trace, driver: Any, *args: Any, **kwargs: Any) -> float:
+    return trace.settle.popleft() if trace.settle else 0.0
+
+@contextmanager
+def replaying(trace: Trace) -> Iterator[ReplayDriver]:
+    """
+    Serve the browser, settle waits and LLM chains of the graph runs inside the block from `trace`.
+    """
+    driver = ReplayDriver(trace)
+    previous_pool = set_session_pool(ReplayPool(driver))
+    registry.install_agents({name: ReplayChain(name, trace, driver) for name in registry.AGENT_BUILDERS})
+
+    original_settle = tools.wait_for_page_settle
+    tools.wait_for_page_settle = partial(_replayed_settle, trace)
+    try:
+        yield driver
+    finally:
+        tools.wait_for_page_settle = original_settle
+        registry.reset_registry()
+        set_session_pool(previous_pool)
+
+
+def serializable_state(state: dict[str, Any]) -> dict[str, Any]:
+    return {key: value for key, value in state.items() if key not in UNSERIALIZABLE_STATE and key != "messages"}
+
+def run_timed(graph: Any, initial_state: dict[str, Any], use_async: bool = False) -> tuple[dict[str, Any], list[StepTiming]]:
+    """
+    Run the graph and time each step (a node and the routing decision that follows it).
+    Returns:
+        tuple[dict[str, Any], list[StepTiming]]: The final state and the step timings.
+    """
+    steps: list[StepTiming] = []
+    # The "values" chunks carry the full state after each step, with the reducers (e.g. the appended
+    # action history) applied; the last one is the final state.
+    final_state = dict(initial_state)
+
+    def on_chunk(mode: str, chunk: dict[str, Any], last: float) -> float:
+        nonlocal final_state
+        if mode == "values":
+            final_state = chunk
+            return last
+        now = time.perf_counter()
+        for node in chunk:
+            steps.append({"node": node, "seconds": now - last})
+        return now
+
+    if use_async:
+        async def consume() -> None:
+            with session_scope():
+                last = time.perf_counter()
+                async for mode, chunk in graph.astream(initial_state, stream_mode=["updates", "values"]):
+                    last = on_chunk(mode, chunk, last)
+        asyncio.run(consume())
+    else:
+        with session_scope():
+            last = time.perf_counter()
+            for mode, chunk in graph.stream(initial_state, stream_mode=["updates", "values"]):
+                last = on_chunk(mode, chunk, last)
+
+    return final_state, steps
+
+def record_run(path: str, initial_state: dict[str, Any], fused: bool = False) -> dict[str, Any]:
+    """
+    Run the graph against the live browser and model and write a trace to `path`.
+    Returns:
+        dict[str, Any]: The final state.
+    """
+    from graph import create_graph
+
+    with recording(path) as writer:
+        writer.write({"kind": "meta", "fused": fused, "initial_state": serializable_state(initial_state)})
+        final_state, steps = run_timed(create_graph(fused=fused), initial_state)
+        for step in steps:
+            writer.write({"kind": "step", **step})
+
+    logger.info(f"Recorded {len(steps)} steps to {path}.")
+    return final_state
+
+def replay_run(path: str, use_async: bool = False) -> ReplayResult:
+    """
+    Replay a trace through `create_graph()` without browser or model.
+    """
+    from graph import create_graph
+
+    trace = Trace.load(path)
+    initial_state = {"messages": [], "driver": None, "web_element": None, **trace.meta["initial_state"]}
+    graph = create_graph(fused=trace.meta.get("fused", False))
+
+    with replaying(trace) as driver:
+        start = time.perf_counter()
+        final_state, steps = run_timed(graph, initial_state, use_async)
+        seconds = time.perf_counter() - start
+
+    if driver.misses:
+        logger.warning(f"Replay of {path} diverged from the recording: {driver.misses} calls had no recorded response.")
+
+    return {
+        "answer": final_state.get("final_anwser", ""),
+        "seconds": seconds,
+        "steps": steps,
+        "misses": driver.misses,
+    }
+
+def compare_steps(recorded: list[StepTiming], replayed: list[StepTiming]) -> str:
+    lines = [f"{'step':>4}  {'node':<28} {'recorded':>10} {'replayed':>10}"]
+    for i in range(max(len(recorded), len(replayed))):
+        before = recorded[i] if i < len(recorded) else None
+        after = replayed[i] if i < len(replayed) else None
+        node = (after or before)["node"]
+        if before and after and before["node"] != after["node"]:
+            node = f"{before['node']} -> {after['node']}"
+        lines.append(
+            f"{i:>4}  {node:<28} "
+            f"{before['seconds'] * 1000 if before else float('nan'):>8.2f}ms "
+            f"{after['seconds'] * 1000 if after else float('nan'):>8.2f}ms"
+        )
+    return "\n".join(lines)
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Run a task live and write its trace.")
+    record.add_argument("--task", required=True)
+    record.add_argument("--url", required=True)
+    record.add_argument("--max-tool-usage", type=int, default=10)
+    record.add_argument("--fused", action="store_true")
+    record.add_argument("--output", required=True)
+
+    replay = commands.add_parser("replay", help="Replay a trace without browser or model.")
+    replay.add_argument("trace")
+    replay.add_argument("--repeat", type=int, default=1)
+    replay.add_argument("--async", dest="use_async", action="store_true", help="Replay through graph.astream.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        from batch import build_initial_state
+        state = build_initial_state({"id": "record", "task": args.task, "url": args.url, "max_tool_usage": args.max_tool_usage})
+        final_state = record_run(args.output, state, args.fused)
+        print("Final Answer:", final_state.get("final_anwser", ""))
+        return
+
+    recorded = Trace.load(args.trace).steps
+    for i in range(args.repeat):
+        result = replay_run(args.trace, args.use_async)
+        print(f"Replay {i + 1}/{args.repeat}: {result['seconds'] * 1000:.2f}ms, {result['misses']} misses, answer: {result['answer']!r}")
+    print(compare_steps(recorded, result["steps"]))
+
+if __name__ == "__main__":
+    main()
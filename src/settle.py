@@ -0,0 +1,227 @@
+from selenium import webdriver
+
+from utils import setup_logger
+
+from typing import TypedDict
+import json
+import os
+import time
+import weakref
+
+logger = setup_logger("settle")
+
+DEFAULT_SETTLE_TIMEOUT = float(os.getenv("SETTLE_TIMEOUT", "10"))
+DEFAULT_QUIET_PERIOD = 0.3
+DEFAULT_GRACE_PERIOD = 0.1
+POLL_INTERVAL = 0.05
+# Requests that stay open longer than this (long polling, analytics beacons) no longer block settling.
+STALE_REQUEST_AGE = 3.0
+IGNORED_RESOURCE_TYPES = {"WebSocket", "EventSource", "Ping"}
+
+# Besides timing, the tracker remembers which nodes changed so the accessibility tree cache can refetch
+# only those subtrees. `doc` identifies the document, `overflow` is set once too many nodes changed.
+# Form values, checked state and focus change the accessibility tree without mutating the DOM, so
+# their events count as changes too.
+MUTATION_TRACKER_SCRIPT = """
+(() => {
+    if (window.__wiaMutations) return;
+    const state = window.__wiaMutations = {
+        count: 0, last: performance.now(), doc: Math.random().toString(36).slice(2), dirty: new Set(), overflow: false
+    };
+    const markDirty = (target) => {
+        if (state.overflow || !target) return;
+        state.dirty.add(target);
+        if (state.dirty.size > 64) { state.overflow = true; state.dirty.clear(); }
+    };
+    new MutationObserver((records) => {
+        state.count += records.length;
+        state.last = performance.now();
+        for (const record of records) {
+            markDirty(record.type === "characterData" ? record.target.parentNode : record.target);
+        }
+    }).observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+    for (const type of ["input", "change", "focusin", "focusout"]) {
+        document.addEventListener(type, (event) => {
+            state.count += 1;
+            state.last = performance.now();
+            markDirty(event.target);
+        }, true);
+    }
+})();
+"""
+
+PROBE_SCRIPT = """
+const state = window.__wiaMutations;
+return [document.readyState, state ? (performance.now() - state.last) / 1000 : null, state ? state.count : 0];
+"""
+
+DOCUMENT_ID_SCRIPT = "return window.__wiaMutations ? window.__wiaMutations.doc : null;"
+MUTATION_COUNT_EXPRESSION = "(() => { const state = window.__wiaMutations; return state ? [state.doc, state.count] : null; })()"
+
+class NetworkTracker(TypedDict):
+    inflight: dict[str, float]
+    load_fired: bool
+    perf_log: bool
+    main_frame_id: str | None # Page.loadEventFired only reports the main frame
+
+_trackers: "weakref.WeakKeyDictionary[webdriver.Chrome, NetworkTracker]" = weakref.WeakKeyDictionary()
+
+
+def install_page_instrumentation(driver: webdriver.Chrome) -> None:
+    """
+    Install the DOM mutation tracker in the current document and in every future document.
+    Args:
+        driver (webdriver.Chrome): The driver to instrument.
+    """
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": MUTATION_TRACKER_SCRIPT})
+        driver.execute_script(MUTATION_TRACKER_SCRIPT)
+    except Exception as e:
+        logger.warning(f"Unable to install page instrumentation: {e}")
+
+def current_document_id(driver: webdriver.Chrome) -> str | None:
+    """
+    Id of the current document, assigned by the mutation tracker. It changes whenever the page navigates.
+    Returns:
+        str | None: The id, or None if the tracker is not installed or the document is being replaced.
+    """
+    try:
+        return driver.execute_script(DOCUMENT_ID_SCRIPT)
+    except Exception:
+        return None
+
+def page_fingerprint(driver: webdriver.Chrome) -> str | None:
+    """
+    Cheap fingerprint of the page state: main frame id, loader id and URL, plus the document id and
+    DOM mutation count of the mutation tracker. Two CDP calls, independent of the page size.
+    Returns:
+        str | None: The fingerprint, or None if it cannot be taken (the page must then be treated as changed).
+    """
+    try:
+        frame = driver.execute_cdp_cmd("Page.getFrameTree", {})["frameTree"]["frame"]
+        result = driver.execute_cdp_cmd(
+            "Runtime.evaluate",
+            {
+                "expression": MUTATION_COUNT_EXPRESSION,
+                "returnByValue": True,
+            }
+        )
+    except Exception as e:
+        logger.warning(f"Unable to fingerprint the page: {e}")
+        return None
+
+    mutations = result.get("result", {}).get("value")
+    if not mutations:
+        return None
+    doc_id, mutation_count = mutations
+    return f"{frame.get('id')}|{frame.get('loaderId')}|{frame.get('url')}|{doc_id}|{mutation_count}"
+
+def _get_tracker(driver: webdriver.Chrome) -> NetworkTracker:
+    tracker = _trackers.get(driver)
+    if tracker is None:
+        tracker = {"inflight": {}, "load_fired": True, "perf_log": True, "main_frame_id": None}
+        _trackers[driver] = tracker
+    return tracker
+
+def reset_tracker(driver: webdriver.Chrome) -> None:
+    """
+    Drop buffered CDP events and in-flight request bookkeeping, e.g. when a pooled session is reset.
+    """
+    tracker = _get_tracker(driver)
+    _drain_events(driver, tracker)
+    tracker["inflight"].clear()
+    tracker["load_fired"] = True
+    tracker["main_frame_id"] = None
+
+def _main_frame_id(driver: webdriver.Chrome, tracker: NetworkTracker) -> str | None:
+    if tracker["main_frame_id"] is None:
+        try:
+            tracker["main_frame_id"] = driver.execute_cdp_cmd("Page.getFrameTree", {})["frameTree"]["frame"]["id"]
+        except Exception as e:
+            logger.debug(f"Unable to read the main frame id: {e}")
+    return tracker["main_frame_id"]
+
+def _drain_events(driver: webdriver.Chrome, tracker: NetworkTracker) -> None:
+    """
+    Consume buffered Page/Network CDP events from ChromeDriver's performance log.
+    """
+    if not tracker["perf_log"]:
+        return
+
+    try:
+        entries = driver.get_log("performance")
+    except Exception as e:
+        logger.warning(f"Performance log unavailable, settling on DOM signals only: {e}")
+        tracker["perf_log"] = False
+        return
+
+    now = time.perf_counter()
+    inflight = tracker["inflight"]
+    for entry in entries:
+        message = json.loads(entry["message"])["message"]
+        method = message.get("method", "")
+        params = message.get("params", {})
+
+        if method == "Network.requestWillBeSent":
+            if params.get("type") not in IGNORED_RESOURCE_TYPES and not params.get("request", {}).get("url", "").startswith("data:"):
+                inflight[params["requestId"]] = now
+        elif method in ("Network.loadingFinished", "Network.loadingFailed"):
+            inflight.pop(params.get("requestId"), None)
+        elif method == "Page.frameNavigated" and not params.get("frame", {}).get("parentId"):
+            tracker["main_frame_id"] = params["frame"].get("id")
+            tracker["load_fired"] = False
+        elif method == "Page.frameStartedLoading":
+            # Iframes loading after the main load event must not hold the page back: no
+            # loadEventFired follows for them.
+            if params.get("frameId") == _main_frame_id(driver, tracker):
+                tracker["load_fired"] = False
+        elif method == "Page.loadEventFired":
+            tracker["load_fired"] = True
+
+    for request_id in [rid for rid, sent in inflight.items() if now - sent > 20 * STALE_REQUEST_AGE]:
+        del inflight[request_id]
+
+def wait_for_page_settle(
+    driver: webdriver.Chrome,
+    timeout: float = DEFAULT_SETTLE_TIMEOUT,
+    quiet_period: float = DEFAULT_QUIET_PERIOD,
+    grace_period: float = DEFAULT_GRACE_PERIOD
+) -> float:
+    """
+    Block until the page has settled: the load event fired, in-flight requests drained
+    and the DOM has not mutated for `quiet_period` seconds.
+    Args:
+        driver (webdriver.Chrome): The driver to wait on.
+        timeout (float): Upper bound on the wait in seconds.
+        quiet_period (float): Seconds without DOM mutations required to consider the page settled.
+        grace_period (float): Minimum wait, so navigations triggered by the last action get a chance to start.
+    Returns:
+        float: Seconds actually waited.
+    """
+    tracker = _get_tracker(driver)
+    start = time.perf_counter()
+
+    while True:
+        now = time.perf_counter()
+        elapsed = now - start
+
+        if elapsed >= timeout:
+            logger.warning(f"Page did not settle within {timeout:.1f}s, continuing. In-flight requests: {len(tracker['inflight'])}")
+            return elapsed
+
+        _drain_events(driver, tracker)
+        network_idle = all(now - sent > STALE_REQUEST_AGE for sent in tracker["inflight"].values())
+
+        try:
+            ready_state, dom_quiet_for, _ = driver.execute_script(PROBE_SCRIPT)
+        except Exception:
+            # The document is being replaced; try again on the next poll.
+            ready_state, dom_quiet_for = "loading", None
+
+        loaded = ready_state == "complete" and (tracker["load_fired"] or not tracker["perf_log"])
+        dom_quiet = dom_quiet_for is None or dom_quiet_for >= quiet_period
+
+        if elapsed >= grace_period and loaded and network_idle and dom_quiet:
+            return time.perf_counter() - start
+
+        time.sleep(POLL_INTERVAL)
@@ -0,0 +1,195 @@
+"""
+Stream the text of structured LLM responses while they are generated.
+
+The chat model streams raw JSON (`{"thought": "...", "action": [...]}`). A callback handler feeds
+each token to `JSONFieldStream`, which decodes the value of one string field incrementally, and the
+decoded text is published twice:
+    - through LangGraph's stream writer, for `graph.stream(..., stream_mode="custom")`
+    - as a "token" custom event, for `graph.astream_events(..., version="v2")`
+Each item is {"node": ..., "field": ..., "delta": ...}. The structured response itself is still
+parsed once, at the end, so the final state is unchanged.
+"""
+from langchain_core.callbacks import BaseCallbackHandler, AsyncCallbackHandler, dispatch_custom_event, adispatch_custom_event
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ensure_config, patch_config
+from langgraph.config import get_stream_writer
+
+from typing import Any
+import json
+
+TOKEN_EVENT = "token"
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JSONFieldStream:
+    """
+    Incrementally decode the value of the string field `field` from JSON text that arrives in chunks.
+    """
+
+    def __init__(self, field: str):
+        self.key = json.dumps(field)
+        self.buffer = ""
+        self.position = -1 # index of the next undecoded value character, -1 until the value starts
+        self.done = False
+        self.text = ""
+
+    def _find_value_start(self) -> None:
+        buffer = self.buffer
+        key_at = buffer.find(self.key)
+        while key_at != -1:
+            i = self._skip_whitespace(key_at + len(self.key))
+            if i == len(buffer):
+                return
+            if buffer[i] == ":":
+                # The key itself, not a string value that happens to equal it.
+                i = self._skip_whitespace(i + 1)
+                if i == len(buffer):
+                    return
+                if buffer[i] == '"':
+                    self.position = i + 1
+                else:
+                    # Not a string value; nothing to stream.
+                    self.done = True
+                return
+            key_at = buffer.find(self.key, key_at + 1)
+
+    def _skip_whitespace(self, i: int) -> int:
+        while i < len(self.buffer) and self.buffer[i] in " \t\r\n":
+            i += 1
+        return i
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add a chunk of JSON text.
+        Returns:
+            str: The newly decoded part of the field value (may be empty).
+        """
+        if self.done:
+            return ""
+        self.buffer += chunk
+        if self.position == -1:
+            self._find_value_start()
+            if self.position == -1:
+                return ""
+
+        decoded = []
+        buffer = self.buffer
+        i = self.position
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                decoded.append(char)
+                i += 1
+                continue
+            # Escape sequence: wait for the rest of it if it is cut off.
+            if i + 1 >= len(buffer):
+                break
+            code = buffer[i + 1]
+            if code == "u":
+                if i + 6 > len(buffer):
+                    break
+                code_point = int(buffer[i + 2:i + 6], 16)
+                if 0xD800 <= code_point < 0xDC00:
+                    # A character outside the BMP arrives as a surrogate pair of two \u escapes.
+                    low = buffer[i + 6:i + 12]
+                    if len(low) < 6 and "\\u".startswith(low[:2]):
+                        break
+                    if low[:2] == "\\u" and 0xDC00 <= int(low[2:], 16) < 0xE000:
+                        decoded.append(chr(0x10000 + ((code_point - 0xD800) << 10) + (int(low[2:], 16) - 0xDC00)))
+                        i += 12
+                        continue
+                decoded.append(chr(code_point))
+                i += 6
+            else:
+                decoded.append(_ESCAPES.get(code, code))
+                i += 2
+
+        self.position = i
+        delta = "".join(decoded)
+        self.text += delta
+        return delta
+
+
+def _publish(payload: dict[str, Any]) -> None:
+    try:
+        get_stream_writer()(payload)
+    except Exception:
+        # Not running inside a graph.
+        pass
+
+def with_callback_handler(handler: BaseCallbackHandler, config: RunnableConfig | None = None) -> RunnableConfig:
+    """
+    `config` (default: the current runnable config) plus `handler`, so the graph's own callbacks
+    (astream_events, tracing) keep receiving the LLM run.
+    """
+    config = ensure_config(config)
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, list):
+        callbacks = callbacks + [handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    return patch_config(config, callbacks=callbacks)
+
+
+class TokenStreamHandler(BaseCallbackHandler):
+    """
+    Publish the text of one field of a structured response as the LLM generates it.
+    """
+
+    run_inline = True
+
+    def __init__(self, node: str, field: str):
+        self.node = node
+        self.field = field
+        self.parser = JSONFieldStream(field)
+
+    def config(self, config: RunnableConfig | None = None) -> RunnableConfig:
+        return with_callback_handler(self, config)
+
+    def _payload(self, delta: str) -> dict[str, Any]:
+        return {"node": self.node, "field": self.field, "delta": delta}
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        delta = self.parser.feed(token)
+        if delta:
+            _publish(self._payload(delta))
+            dispatch_custom_event(TOKEN_EVENT, self._payload(delta))
+
+    def finish(self, text: str) -> None:
+        """
+        Publish whatever part of the final field text was not streamed, e.g. for cached responses.
+        """
+        if text and text.startswith(self.parser.text) and len(text) > len(self.parser.text):
+            delta = text[len(self.parser.text):]
+            self.parser.text = text
+            _publish(self._payload(delta))
+            dispatch_custom_event(TOKEN_EVENT, self._payload(delta))
+
+
+class AsyncTokenStreamHandler(AsyncCallbackHandler, TokenStreamHandler):
+    """
+    TokenStreamHandler for `ainvoke`, dispatching the custom events on the event loop.
+    """
+
+    run_inline = True
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        delta = self.parser.feed(token)
+        if delta:
+            _publish(self._payload(delta))
+            await adispatch_custom_event(TOKEN_EVENT, self._payload(delta))
+
+    async def afinish(self, text: str) -> None:
+        if text and text.startswith(self.parser.text) and len(text) > len(self.parser.text):
+            delta = text[len(self.parser.text):]
+            self.parser.text = text
+            _publish(self._payload(delta))
+            await adispatch_custom_event(TOKEN_EVENT, self._payload(delta))
@@ -5,14 +5,21 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.remote.webelement import WebElement
 
 from utils import setup_logger
+from settle import install_page_instrumentation, wait_for_page_settle
+from browser_profile import BrowserProfile, get_browser_profile, apply_browser_profile, install_request_blocking
+from http_cache import install_http_cache
+from tracing import instrument_driver
+from ax_cache import get_ax_tree_cache
+from ax_store import UNDECODED, AXTreeStore, AXNodeMap
 import time
-import random
+import uuid
+from functools import lru_cache
 
 from typing import Any, TypedDict, Literal
 
@@ -34,16 +41,41 @@ class AccessibilityTreeNode(TypedDict):
 AccessibilityTree = list[AccessibilityTreeNode]
 
 
-def create_webdriver() -> webdriver.Chrome:
+@lru_cache(maxsize=None)
+def get_chromedriver_path() -> str:
+    """
+    Resolve the ChromeDriver binary once per process.
+    Returns:
+        str: Path to the installed ChromeDriver binary.
+    """
+    driver_path = ChromeDriverManager().install()
+    logger.info(f"ChromeDriver binary resolved: {driver_path}")
+    return driver_path
+
+def create_webdriver(profile: BrowserProfile | None = None) -> webdriver.Chrome:
+    """
+    Launch Chrome with a launch profile (see browser_profile.py).
+    Args:
+        profile (BrowserProfile | None): Defaults to the profile named by BROWSER_PROFILE.
+    Returns:
+        webdriver.Chrome: The instrumented driver.
+    """
+    profile = profile or get_browser_profile()
     options = Options()
 
-    options.add_argument("--start-maximized")
+    apply_browser_profile(options, profile)
     options.add_argument("--disable-blink-features=AutomationControlled")
+    # Page/Network CDP events are read back from the performance log by the settle engine.
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
 
-    service = Service(ChromeDriverManager().install())
+    service = Service(get_chromedriver_path())
     driver = webdriver.Chrome(service=service, options=options)
+    instrument_driver(driver)
+    install_page_instrumentation(driver)
+    install_request_blocking(driver, profile)
+    install_http_cache(driver)
 
-    logger.info("WebDriver instance created.")
+    logger.info(f"WebDriver instance created ({profile['name']} profile).")
     return driver
 
 def access_url(driver: webdriver.Chrome, url: str) -> None:
@@ -52,9 +84,23 @@ def access_url(driver: webdriver.Chrome, url: str) -> None:
 
 
 def extract_accessibility_tree(
-    driver
-) -> AccessibilityTree:
+    driver,
+    incremental: bool = False
+) -> AccessibilityTree | AXTreeStore:
+    """
+    Fetch the accessibility tree of the current page.
+    Args:
+        driver: The WebDriver instance.
+        incremental (bool): Patch a per-driver cached tree with only the subtrees that changed
+            since the last call instead of pulling the full tree.
+    Returns:
+        AccessibilityTree | AXTreeStore: The tree nodes, root first, or the cached columnar
+            tree in incremental mode.
+    """
     try:
+        if incremental:
+            return get_ax_tree_cache(driver).refresh()
+
         result = driver.execute_cdp_cmd("Accessibility.getFullAXTree", {})
         nodes = result.get("nodes", [])
 
@@ -70,17 +116,84 @@ def extract_accessibility_tree(
         logger.info(f"Error extracting accessibility tree: {e}")
         return []
     
-def parse_accessibility_tree(
-    accessibility_tree: AccessibilityTree,
-    max_node: int = 300,
-    indent_style: IndentStyle = "Tab"
-) -> tuple[str, dict[str, Any]]:
+SKIPPED_ROLES = frozenset(["gridcell"])
+# Nodes with these roles are dropped when their name only repeats the enclosing node's name.
+REDUNDANT_ROLES = frozenset(["StaticText", "heading", "image", "generic"])
+
+def as_tree_store(accessibility_tree: AccessibilityTree | AXTreeStore) -> AXTreeStore:
+    return accessibility_tree if isinstance(accessibility_tree, AXTreeStore) else AXTreeStore.from_nodes(accessibility_tree)
+
+def walk_accessibility_tree(
+    store: AXTreeStore,
+    max_node: int = 300
+) -> tuple[list[int], list[int], list[int]]:
     """
-    Parse the accessibility tree to extract text content and a summary of elements.
+    Collect the elements shown to the agent in depth-first order.
+
+    The tree is walked with an explicit stack, so deeply nested pages cannot hit the recursion
+    limit, and the walk stops as soon as `max_node` + 1 elements were collected; only the nodes it
+    visits are decoded from the store.
     Args:
-        accessibility_tree (AccessibilityTree): The accessibility tree to parse.
+        store (AXTreeStore): The accessibility tree.
+        max_node (int): Number of elements after which the walk stops.
     Returns:
-        tuple[str, list[dict[str, Any]]]: Extracted text content and a summary of elements.
+        tuple[list[int], list[int], list[int]]: For each displayed element its store position, its
+            depth, and the position in these lists of its closest displayed ancestor (-1 for none).
+    """
+    positions = []
+    depths = []
+    parents = []
+    if not len(store):
+        return positions, depths, parents
+
+    # Rows are decoded as the walk reaches them, so the role and name tables grow during the walk.
+    nodes = store.nodes
+    position = store.position
+    roles = store.roles
+    names = store.names
+    role_ids = store.role_ids
+    name_ids = store.name_ids
+    decode = store.decode
+
+    stripped_names = {}
+
+    # (store position, depth, name of the closest displayed ancestor, its index in `positions`)
+    stack = [(store.root, 0, 'root', -1)]
+    while stack and len(positions) <= max_node:
+        i, depth, parent_name, parent = stack.pop()
+        role_id = role_ids[i]
+        if role_id == UNDECODED:
+            role_id = decode(i)
+        name_id = name_ids[i]
+        role = roles[role_id]
+
+        stripped = stripped_names.get(name_id)
+        if stripped is None:
+            stripped = stripped_names[name_id] = names[name_id].strip()
+
+        if stripped and role not in SKIPPED_ROLES and not (role in REDUNDANT_ROLES and stripped in parent_name):
+            parents.append(parent)
+            parent = len(positions)
+            positions.append(i)
+            depths.append(depth)
+
+            depth += 1
+            parent_name = names[name_id]
+
+        child_ids = nodes[i].get("childIds")
+        if child_ids:
+            stack.extend([(position[child_id], depth, parent_name, parent) for child_id in reversed(child_ids) if child_id in position])
+
+    return positions, depths, parents
+
+def render_accessibility_tree(
+    store: AXTreeStore,
+    positions: list[int],
+    depths: list[int],
+    indent_style: IndentStyle = "Tab"
+) -> str:
+    """
+    Format elements as indented `[idx] role 'name'` lines, numbering them from 1 in the given order.
     """
     indent_map = {
         "ASCII": "│   ",
@@ -88,113 +201,226 @@ def parse_accessibility_tree(
     }
 
     indent_str = indent_map[indent_style]
+    indents = [indent_str * depth for depth in range(max(depths, default=0) + 1)]
+
+    roles = store.roles
+    names = store.names
+    role_ids = store.role_ids
+    name_ids = store.name_ids
+
+    return "\n".join([
+        f"{indents[depth]} [{idx}] {roles[role_ids[i]]} '{names[name_ids[i]]}'"
+        for idx, (i, depth) in enumerate(zip(positions, depths), start=1)
+    ])
 
-    node_id_to_idx = {}
-
-    tree_list = []
-
-    for idx, node in enumerate(accessibility_tree):
-        node_id_to_idx[node['nodeId']] = idx
-
-    node_map = {}
-    def dfs(node_id, depth=0, parent_node='root'):
-        valid_node = True
-
-        indent = indent_str * depth
-
-        if len(node_map) > max_node:
-            return
-        
-        node = accessibility_tree[node_id_to_idx[node_id]]
-        
-        try:
-            role = node.get('role', {}).get('value', '')
-            name = node.get('name', {}).get('value', '')
-
-            if not name.strip() or role in ['gridcell'] or (name.strip() in parent_node and role in ['StaticText', 'heading', 'image', 'generic']):
-                valid_node = False
-        
-            if valid_node:
-                idx = len(node_map) + 1
-                node_map[idx] = node
-                if IndentStyle == "ASCII":
-                    tree_list.append(f"{indent}├── [{idx}] {role} '{name}'")
-                else:
-                    tree_list.append(f"{indent} [{idx}] {role} '{name}'")
-        except Exception as e:
-            valid_node = False
-
-        for child_id in node.get('childIds', []):
-            if child_id not in node_id_to_idx:
-                continue
-            child_depth = depth + 1 if valid_node else depth
-            curr_name = name if valid_node else parent_node
-            dfs(child_id, child_depth, parent_node=curr_name)
-
-    dfs(accessibility_tree[0]['nodeId'])
-    tree_str = "\n".join(tree_list)
-    return tree_str, node_map
-
-def extract_element_from_accessibility_tree(
+def parse_accessibility_tree(
+    accessibility_tree: AccessibilityTree | AXTreeStore,
+    max_node: int = 300,
+    indent_style: IndentStyle = "Tab"
+) -> tuple[str, AXNodeMap]:
+    """
+    Parse the accessibility tree to extract text content and a summary of elements.
+    Args:
+        accessibility_tree (AccessibilityTree | AXTreeStore): The accessibility tree to parse.
+        max_node (int): Number of elements after which the walk stops.
+        indent_style (IndentStyle): Indentation used for nested elements.
+    Returns:
+        tuple[str, AXNodeMap]: The indented tree text and a map from display index to element.
+    """
+    store = as_tree_store(accessibility_tree)
+    positions, depths, _ = walk_accessibility_tree(store, max_node)
+
+    tree_str = render_accessibility_tree(store, positions, depths, indent_style)
+    return tree_str, AXNodeMap.from_store(store, positions)
+
+class ResolvedElement(TypedDict):
+    object_id: str
+    backend_node_id: int
+    role: str
+    name: str
+
+# Functions run on a resolved node through Runtime.callFunctionOn. Text nodes act through their parent element.
+CLICK_POINT_FUNCTION = """
+function() {
+    const el = this.nodeType === Node.ELEMENT_NODE ? this : this.parentElement;
+    const link = el.closest('a[target]');
+    if (link) link.setAttribute('target', '_self');
+    el.scrollIntoView({ block: 'center', inline: 'center' });
+    const rect = el.getBoundingClientRect();
+    const x = rect.left + rect.width / 2;
+    const y = rect.top + rect.height / 2;
+    const hit = document.elementFromPoint(x, y);
+    const clickable = rect.width > 0 && rect.height > 0 && !!hit && (hit === el || el.contains(hit) || hit.contains(el));
+    return [x, y, clickable];
+}
+"""
+
+FOCUS_FOR_TYPING_FUNCTION = """
+function() {
+    const el = this.nodeType === Node.ELEMENT_NODE ? this : this.parentElement;
+    el.scrollIntoView({ block: 'center' });
+    el.focus();
+    try {
+        if (typeof el.select === 'function') el.select();
+        else if (el.isContentEditable) document.getSelection().selectAllChildren(el);
+    } catch (e) {}
+    const focused = document.activeElement === el || el.contains(document.activeElement);
+    return [el.tagName.toLowerCase(), el.getAttribute('type') || '', focused];
+}
+"""
+
+# Called on the first element with every element as an argument, so all texts are read (and the
+# layout computed) once. Texts are capped in the page, before they are sent over the wire.
+READ_TEXTS_FUNCTION = """
+function(maxChars, ...nodes) {
+    return nodes.map((node) => {
+        const text = (node.nodeType === Node.ELEMENT_NODE ? node.innerText : node.textContent) || '';
+        return text.length > maxChars ? text.slice(0, maxChars) + '...' : text;
+    });
+}
+"""
+MAX_EXTRACT_CHARS = 2000
+
+def resolve_element(
     node_idx: int,
-    node_map: dict[str, Any],
+    node_map: AXNodeMap,
     driver: webdriver.Chrome
-) -> tuple[Any, str, str] | None:
-    backend_DOM_node_id = node_map[node_idx]['backendDOMNodeId']
+) -> ResolvedElement | None:
+    """
+    Resolve an element of the parsed accessibility tree to a JavaScript object handle in one CDP round trip.
+    Args:
+        node_idx (int): Display index of the element in the parsed tree.
+        node_map (AXNodeMap): The node map returned by `parse_accessibility_tree`.
+        driver (webdriver.Chrome): The WebDriver instance.
+    Returns:
+        ResolvedElement | None: The object handle, role and name, or None if the element cannot be resolved.
+    """
+    try:
+        backend_DOM_node_id = node_map.backend_node_id(node_idx)
+        obj = driver.execute_cdp_cmd(
+            "DOM.resolveNode",
+            {
+                "backendNodeId": backend_DOM_node_id
+            }
+        )
+    except Exception as e:
+        logger.error(f"Unable to resolve element index {node_idx}: {e}")
+        return None
 
-    role = node_map[node_idx].get('role', {}).get('value', '')
-    name = node_map[node_idx].get('name', {}).get('value', '')
+    return {
+        "object_id": obj['object']['objectId'],
+        "backend_node_id": backend_DOM_node_id,
+        "role": node_map.role(node_idx),
+        "name": node_map.name(node_idx),
+    }
 
-    obj = driver.execute_cdp_cmd(
-        "DOM.resolveNode",
+def call_function_on_element(
+    driver: webdriver.Chrome,
+    element: ResolvedElement,
+    function_declaration: str
+) -> Any:
+    result = driver.execute_cdp_cmd(
+        "Runtime.callFunctionOn",
         {
-            "backendNodeId": backend_DOM_node_id
+            "functionDeclaration": function_declaration,
+            "objectId": element["object_id"],
+            "returnByValue": True,
         }
     )
+    if "exceptionDetails" in result:
+        raise RuntimeError(result["exceptionDetails"].get("exception", {}).get("description", "JavaScript exception"))
+    return result.get("result", {}).get("value")
 
-    object_id = obj['object']['objectId']
-
-    tag_id = random.randint(100000, 999999)
-    tag_atribute = f"web_interacting_agent_tag_{tag_id}"
+def to_web_element(
+    driver: webdriver.Chrome,
+    element: ResolvedElement
+) -> WebElement | None:
+    """
+    Bridge a resolved element to a Selenium WebElement by tagging it with a unique attribute.
+    Only used when an action cannot be performed over CDP.
+    """
+    tag_attribute = f"web_interacting_agent_tag_{uuid.uuid4().hex}"
 
-    driver.execute_cdp_cmd(
-        "Runtime.callFunctionOn",
-        {
-            "functionDeclaration": f"function() {{ this.setAttribute('{tag_atribute}', 'true'); }}",
-            "objectId": object_id,
-        }
+    call_function_on_element(
+        driver,
+        element,
+        f"function() {{ (this.nodeType === Node.ELEMENT_NODE ? this : this.parentElement).setAttribute('{tag_attribute}', 'true'); }}"
     )
 
-    selector = f"[{tag_atribute}='true']"
-
     try:
-        WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-        )
-    except TimeoutException:
-        logger.error("Timed out waiting for the web element to be located.")
+        return driver.find_element(By.CSS_SELECTOR, f"[{tag_attribute}='true']")
+    except NoSuchElementException:
+        logger.error("Unable to locate the tagged web element.")
         return None
-    
-    element = driver.find_element(By.CSS_SELECTOR, selector)
-    
-    driver.execute_cdp_cmd(
-        "Runtime.callFunctionOn",
-        {
-            "functionDeclaration": f"function() {{ this.removeAttribute('{tag_atribute}'); }}",
-            "objectId": object_id,
-        }
-    )
+    finally:
+        call_function_on_element(
+            driver,
+            element,
+            f"function() {{ (this.nodeType === Node.ELEMENT_NODE ? this : this.parentElement).removeAttribute('{tag_attribute}'); }}"
+        )
+
+def dispatch_click(
+    driver: webdriver.Chrome,
+    x: float,
+    y: float
+) -> None:
+    for event_type in ("mousePressed", "mouseReleased"):
+        driver.execute_cdp_cmd(
+            "Input.dispatchMouseEvent",
+            {
+                "type": event_type,
+                "x": x,
+                "y": y,
+                "button": "left",
+                "clickCount": 1,
+            }
+        )
 
-    return element, role, name
+def dispatch_enter(
+    driver: webdriver.Chrome
+) -> None:
+    for event_type in ("keyDown", "keyUp"):
+        driver.execute_cdp_cmd(
+            "Input.dispatchKeyEvent",
+            {
+                "type": event_type,
+                "key": "Enter",
+                "code": "Enter",
+                "windowsVirtualKeyCode": 13,
+                "nativeVirtualKeyCode": 13,
+                "text": "\r" if event_type == "keyDown" else "",
+            }
+        )
 
 def execute_click_action(
     driver: webdriver.Chrome,
-    web_element: Any
-) -> None:
+    element: ResolvedElement | WebElement
+) -> float:
+    """
+    Click an element and wait for the page to settle. Links opening a new tab are followed in the current tab.
+
+    Resolved elements are clicked with CDP mouse events at their center; a WebElement click is
+    only used when the element is hidden or covered at that point.
+    Returns:
+        float: Seconds spent waiting for the page to settle.
+    """
     original_tabs = driver.window_handles
-    driver.execute_script("arguments[0].setAttribute('target', '_self');", web_element)
-    web_element.click()
-    time.sleep(3)
+
+    if isinstance(element, WebElement):
+        web_element = element
+    else:
+        x, y, clickable = call_function_on_element(driver, element, CLICK_POINT_FUNCTION)
+        web_element = None if clickable else to_web_element(driver, element)
+        if not clickable and web_element is None:
+            raise RuntimeError("Element is not clickable and could not be located as a WebElement.")
+
+    if web_element is not None:
+        driver.execute_script("arguments[0].setAttribute('target', '_self');", web_element)
+        web_element.click()
+    else:
+        dispatch_click(driver, x, y)
+
+    waited = wait_for_page_settle(driver)
     new_tabs = driver.window_handles
     if len(new_tabs) > len(original_tabs):
         new_tab = [tab for tab in new_tabs if tab not in original_tabs][0]
@@ -203,22 +429,14 @@ def execute_click_action(
         driver.close()
         driver.switch_to.window(original_tabs[0])
         driver.get(new_tab_url)
-        time.sleep(2)
+        waited += wait_for_page_settle(driver)
+    return waited
 
-def execute_type_action(
+def _type_with_web_element(
     driver: webdriver.Chrome,
-    web_element: Any,
+    web_element: WebElement,
     text: str
-) -> str:
-    warn_obs = ""
-
-    element_tag_name = web_element.tag_name.lower()
-    element_type = web_element.get_attribute("type") or ""
-
-    if element_tag_name != "input" and element_type != "textarea":
-        warn_obs = f"Warning: The web element you are trying to type into may not be a textbox. It is a <{element_tag_name}> element, type '{element_type}'."
-        logger.warning(warn_obs)
-
+) -> float:
     # Clear existing text
     try:
         web_element.clear()
@@ -230,40 +448,95 @@ def execute_type_action(
     action = ActionChains(driver)
 
     action.click(web_element).perform()
-    time.sleep(1)
+    waited = wait_for_page_settle(driver, timeout=1.0, grace_period=0.0)
 
     action.send_keys(text).perform()
-    time.sleep(2)
 
     action.send_keys(Keys.ENTER).perform()
-    time.sleep(5)
+    return waited + wait_for_page_settle(driver)
+
+def execute_type_action(
+    driver: webdriver.Chrome,
+    element: ResolvedElement | WebElement,
+    text: str
+) -> tuple[str, float]:
+    """
+    Replace the text of an element and submit it with Enter.
+
+    Resolved elements are focused over CDP and filled with `Input.insertText`; a WebElement is
+    only used when the element cannot take focus.
+    Returns:
+        tuple[str, float]: A warning observation (empty if none) and the seconds spent waiting for the page to settle.
+    """
+    warn_obs = ""
+
+    if isinstance(element, WebElement):
+        web_element = element
+        element_tag_name = web_element.tag_name.lower()
+        element_type = web_element.get_attribute("type") or ""
+    else:
+        element_tag_name, element_type, focused = call_function_on_element(driver, element, FOCUS_FOR_TYPING_FUNCTION)
+        web_element = None if focused else to_web_element(driver, element)
+        if not focused and web_element is None:
+            raise RuntimeError("Element cannot take focus and could not be located as a WebElement.")
+
+    if element_tag_name not in ("input", "textarea"):
+        warn_obs = f"Warning: The web element you are trying to type into may not be a textbox. It is a <{element_tag_name}> element, type '{element_type}'."
+        logger.warning(warn_obs)
+
+    if web_element is not None:
+        return warn_obs, _type_with_web_element(driver, web_element, text)
+
+    # The focus function selected the existing text, so inserting replaces it.
+    driver.execute_cdp_cmd("Input.insertText", {"text": text})
+    dispatch_enter(driver)
 
-    return warn_obs
+    return warn_obs, wait_for_page_settle(driver)
 
 def execute_wait_action(
     driver: webdriver.Chrome,
-) -> None:
-    time.sleep(5)
+) -> float:
+    return wait_for_page_settle(driver)
 
 def execute_go_back_action(
     driver: webdriver.Chrome,
-) -> None:
+) -> float:
     driver.back()
-    time.sleep(5)
+    return wait_for_page_settle(driver)
 
 def execute_go_home_action(
     driver: webdriver.Chrome,
-) -> None:
+) -> float:
     driver.get('https://www.google.com')
-    time.sleep(5)
+    return wait_for_page_settle(driver)
 
-def extract_data_from_element(
-    web_element: WebElement
-) -> str:
-    try:
-        text_content = web_element.text
-        return text_content
-    except Exception as e:
-        logger.error(f"Error extracting text from web element: {e}")
-        return ""
-    
\ No newline at end of file
+def extract_data_from_elements(
+    driver: webdriver.Chrome,
+    elements: list[ResolvedElement],
+    max_chars: int = MAX_EXTRACT_CHARS
+) -> list[str]:
+    """
+    Read the text of several resolved elements with one `Runtime.callFunctionOn`. Each element is
+    still resolved with its own `DOM.resolveNode` first; CDP has no batched form of it.
+    Args:
+        driver (webdriver.Chrome): The WebDriver instance.
+        elements (list[ResolvedElement]): The elements, e.g. the cells of a table row.
+        max_chars (int): Longer texts are cut to this many characters.
+    Returns:
+        list[str]: The `innerText` (elements) or `textContent` (text nodes) of each element, in order.
+    """
+    if not elements:
+        return []
+
+    result = driver.execute_cdp_cmd(
+        "Runtime.callFunctionOn",
+        {
+            "functionDeclaration": READ_TEXTS_FUNCTION,
+            "objectId": elements[0]["object_id"],
+            "arguments": [{"value": max_chars}] + [{"objectId": element["object_id"]} for element in elements],
+            "returnByValue": True,
+        }
+    )
+    if "exceptionDetails" in result:
+        raise RuntimeError(result["exceptionDetails"].get("exception", {}).get("description", "JavaScript exception"))
+    return result.get("result", {}).get("value") or []
@@ -0,0 +1,300 @@
+"""
+Opt-in tracing of graph nodes, WebDriver/CDP commands and LLM calls.
+
+While tracing is disabled every hook is a single global check (nodes still set the task id and node
+name that log records carry). `enable_tracing()` starts collecting
+spans (start/end time, payload sizes, task id, parent span) in memory; they can be exported as
+Chrome trace-event JSON (chrome://tracing, Perfetto) or as OpenTelemetry-style JSON lines.
+"""
+from langchain_core.runnables import Runnable
+
+from utils import current_task_id, current_node
+
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Any, Callable, ContextManager, Iterator, TypedDict
+import contextvars
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_MAX_SPANS = 1_000_000
+SERVICE_NAME = "web_interacting_agent"
+
+class Span(TypedDict):
+    name: str
+    category: str # "node", "cdp", "webdriver" or "llm"
+    task_id: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int
+    thread: int
+    attributes: dict[str, Any]
+
+
+_parent_span: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_parent_span", default=None)
+
+
+class Tracer:
+    """
+    In-memory span collector. Spans beyond `max_spans` are dropped and counted.
+    """
+
+    def __init__(self, max_spans: int = DEFAULT_MAX_SPANS):
+        self.max_spans = max_spans
+        self.spans: list[Span] = []
+        self.dropped = 0
+        self._trace_ids: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def trace_id(self, task_id: str) -> str:
+        with self._lock:
+            if task_id not in self._trace_ids:
+                self._trace_ids[task_id] = uuid.uuid4().hex
+            return self._trace_ids[task_id]
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            if len(self.spans) < self.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    @contextmanager
+    def span(self, name: str, category: str, attributes: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        span_id = uuid.uuid4().hex[:16]
+        parent_id = _parent_span.get()
+        token = _parent_span.set(span_id)
+        start_ns = time.time_ns()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            end_ns = time.time_ns()
+            _parent_span.reset(token)
+            task_id = current_task_id.get()
+            self.record({
+                "name": name,
+                "category": category,
+                "task_id": task_id,
+                "trace_id": self.trace_id(task_id),
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "start_ns": start_ns,
+                "end_ns": end_ns,
+                "thread": threading.get_native_id(),
+                "attributes": attributes,
+            })
+
+    def export_chrome_trace(self, path: str) -> None:
+        """
+        Write the spans as Chrome trace-event JSON ("X" complete events, microseconds).
+        """
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+
+        events = [
+            {
+                "name": span["name"],
+                "cat": span["category"],
+                "ph": "X",
+                "ts": span["start_ns"] / 1000,
+                "dur": (span["end_ns"] - span["start_ns"]) / 1000,
+                "pid": pid,
+                "tid": span["thread"],
+                "args": {"task_id": span["task_id"], **span["attributes"]},
+            }
+            for span in spans
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def export_otel_jsonl(self, path: str) -> None:
+        """
+        Write one OpenTelemetry (OTLP JSON field names) span per line.
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        with open(path, "w", encoding="utf-8") as f:
+            for span in spans:
+                attributes = {"task.id": span["task_id"], "span.category": span["category"], **span["attributes"]}
+                f.write(json.dumps({
+                    "resource": {"attributes": [_otel_attribute("service.name", SERVICE_NAME)]},
+                    "traceId": span["trace_id"],
+                    "spanId": span["span_id"],
+                    "parentSpanId": span["parent_id"] or "",
+                    "name": span["name"],
+                    "kind": 1 if span["category"] == "node" else 3, # INTERNAL / CLIENT
+                    "startTimeUnixNano": str(span["start_ns"]),
+                    "endTimeUnixNano": str(span["end_ns"]),
+                    "attributes": [_otel_attribute(key, value) for key, value in attributes.items()],
+                    "status": {"code": 2 if "error" in span["attributes"] else 1},
+                }) + "\n")
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self.dropped = 0
+
+
+def _otel_attribute(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def payload_size(payload: Any) -> int:
+    if payload is None:
+        return 0
+    if isinstance(payload, str):
+        return len(payload)
+    try:
+        return len(json.dumps(payload, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+_tracer: Tracer | None = None
+
+def enable_tracing(max_spans: int = DEFAULT_MAX_SPANS) -> Tracer:
+    """
+    Start collecting spans for the rest of the run. LLM chains are rebuilt so their calls are traced.
+    Returns:
+        Tracer: The tracer, to export or clear its spans.
+    """
+    global _tracer
+    from components.registry import add_chain_wrapper
+
+    if _tracer is None:
+        _tracer = Tracer(max_spans)
+        add_chain_wrapper(TracedChain)
+    return _tracer
+
+def disable_tracing() -> Tracer | None:
+    global _tracer
+    from components.registry import remove_chain_wrapper
+
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        remove_chain_wrapper(TracedChain)
+    return tracer
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+def span(name: str, category: str, **attributes: Any) -> ContextManager[dict[str, Any]]:
+    """
+    Time a block as a span. Yields a dict the block can add attributes to (e.g. response sizes).
+    """
+    tracer = _tracer
+    if tracer is None:
+        return nullcontext({})
+    return tracer.span(name, category, attributes)
+
+def _enter_node(name: str, state: Any) -> tuple:
+    task_id = state.get("task_id") if isinstance(state, dict) else None
+    return (
+        current_task_id.set(task_id or current_task_id.get()),
+        current_node.set(name),
+    )
+
+def _exit_node(tokens: tuple) -> None:
+    current_node.reset(tokens[1])
+    current_task_id.reset(tokens[0])
+
+def _node_attributes(state: Any) -> dict[str, Any]:
+    return {"tool_count": state.get("tool_count", 0) if isinstance(state, dict) else 0}
+
+def traced_node(node: Callable) -> Callable:
+    """
+    Decorate a graph node (sync or async) so its logs carry the state's task id and the node name,
+    and each call becomes a span when tracing is on.
+    """
+    name = node.__name__
+
+    if inspect.iscoroutinefunction(node):
+        @wraps(node)
+        async def run_async(state, *args, **kwargs):
+            tokens = _enter_node(name, state)
+            try:
+                tracer = _tracer
+                if tracer is None:
+                    return await node(state, *args, **kwargs)
+                with tracer.span(name, "node", _node_attributes(state)):
+                    return await node(state, *args, **kwargs)
+            finally:
+                _exit_node(tokens)
+        return run_async
+
+    @wraps(node)
+    def run(state, *args, **kwargs):
+        tokens = _enter_node(name, state)
+        try:
+            tracer = _tracer
+            if tracer is None:
+                return node(state, *args, **kwargs)
+            with tracer.span(name, "node", _node_attributes(state)):
+                return node(state, *args, **kwargs)
+        finally:
+            _exit_node(tokens)
+    return run
+
+def instrument_driver(driver: Any) -> None:
+    """
+    Route every WebDriver command of `driver` (CDP commands included) through a span when tracing is on.
+    """
+    execute = driver.execute
+
+    def traced_execute(driver_command: str, params: dict | None = None):
+        tracer = _tracer
+        if tracer is None:
+            return execute(driver_command, params)
+
+        if driver_command == "executeCdpCommand":
+            name, category = f"cdp {params.get('cmd')}", "cdp"
+        else:
+            name, category = f"webdriver {driver_command}", "webdriver"
+
+        with tracer.span(name, category, {"request_bytes": payload_size(params)}) as attributes:
+            response = execute(driver_command, params)
+            attributes["response_bytes"] = payload_size(response.get("value") if isinstance(response, dict) else response)
+            return response
+
+    driver.execute = traced_execute
+
+
+class TracedChain(Runnable):
+    """
+    Registry chain wrapper that records every LLM call as a span.
+    """
+
+    def __init__(self, name: str, chain: Any):
+        self.name = name
+        self.chain = chain
+
+    def _attributes(self, input: Any) -> dict[str, Any]:
+        return {"agent": self.name, "input_bytes": payload_size(input)}
+
+    def invoke(self, input: Any, config: Any = None, **kwargs: Any) -> Any:
+        with span(f"llm {self.name}", "llm", **self._attributes(input)) as attributes:
+            response = self.chain.invoke(input, config, **kwargs)
+            attributes["output_bytes"] = payload_size(getattr(response, "model_dump", lambda: response)())
+            return response
+
+    async def ainvoke(self, input: Any, config: Any = None, **kwargs: Any) -> Any:
+        with span(f"llm {self.name}", "llm", **self._attributes(input)) as attributes:
+            response = await self.chain.ainvoke(input, config, **kwargs)
+            attributes["output_bytes"] = payload_size(getattr(response, "model_dump", lambda: response)())
+            return response
@@ -0,0 +1,112 @@
+"""
+Token, latency and cost accounting of LLM calls.
+
+`UsageRecorder` is a callback handler attached to one chain call. It takes the token counts the
+model reports (Ollama's prompt_eval_count/eval_count, as `usage_metadata`), the time to the first
+streamed token and the total latency, and turns them into an `LLMCall` record for the state. When
+the model reports no usage the counts are estimated from the prompt and response text; calls that
+never reach a model (response cache hits, replays) count no tokens.
+"""
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+
+from pruning import estimate_tokens
+from streaming import with_callback_handler
+
+from typing import Any, Literal, TypedDict
+import json
+import os
+import time
+
+# Price per 1000 tokens, for hosted models; a local Ollama model costs nothing.
+PROMPT_COST_PER_1K = float(os.getenv("LLM_PROMPT_COST_PER_1K", "0"))
+COMPLETION_COST_PER_1K = float(os.getenv("LLM_COMPLETION_COST_PER_1K", "0"))
+
+class LLMCall(TypedDict):
+    agent: str
+    prompt_tokens: int
+    completion_tokens: int
+    ttft: float # seconds to the first streamed token (the latency when nothing was streamed)
+    latency: float
+    cost: float
+    source: Literal["model", "estimated", "cached"] # where the token counts come from
+
+
+def call_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return prompt_tokens / 1000 * PROMPT_COST_PER_1K + completion_tokens / 1000 * COMPLETION_COST_PER_1K
+
+
+class UsageRecorder(BaseCallbackHandler):
+    """
+    Measure one LLM chain call.
+    """
+
+    run_inline = True
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self.start = time.perf_counter()
+        self.first_token: float | None = None
+        self.model_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.reported = False
+
+    def config(self, config: RunnableConfig | None = None) -> RunnableConfig:
+        return with_callback_handler(self, config)
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list, **kwargs: Any) -> None:
+        self.model_calls += 1
+
+    def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], **kwargs: Any) -> None:
+        self.model_calls += 1
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.prompt_tokens += usage.get("input_tokens", 0)
+                    self.completion_tokens += usage.get("output_tokens", 0)
+                    self.reported = True
+
+    def record(self, input: dict, response: Any = None) -> LLMCall:
+        """
+        The record of the call, once the chain returned (`response` None if it failed).
+        """
+        latency = time.perf_counter() - self.start
+        prompt_tokens, completion_tokens = self.prompt_tokens, self.completion_tokens
+        if self.reported:
+            source = "model"
+        elif self.model_calls:
+            source = "estimated"
+            prompt_tokens = estimate_tokens(json.dumps(input, default=str))
+            completion_tokens = estimate_tokens(response.model_dump_json()) if response is not None else 0
+        else:
+            source = "cached"
+
+        return {
+            "agent": self.agent,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "ttft": (self.first_token - self.start) if self.first_token is not None else latency,
+            "latency": latency,
+            "cost": call_cost(prompt_tokens, completion_tokens),
+            "source": source,
+        }
+
+    def update(self, input: dict, response: Any = None) -> dict:
+        """
+        State update adding the call to `llm_calls` and to the running totals.
+        """
+        call = self.record(input, response)
+        return {
+            "llm_calls": [call],
+            "tokens_used": call["prompt_tokens"] + call["completion_tokens"],
+            "llm_cost": call["cost"],
+        }
@@ -1,35 +1,144 @@
 import logging
+import logging.handlers
 import os 
 from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator
+import atexit
+import contextvars
 import json
+import queue
+import threading
+
+LOG_DIR = Path(__file__).parent.parent / "logs"
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+
+# Task and graph node of the code that is logging; copied onto every record.
+current_task_id: contextvars.ContextVar[str] = contextvars.ContextVar("log_task_id", default="")
+current_node: contextvars.ContextVar[str] = contextvars.ContextVar("log_node", default="")
+
+
+class JSONLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({
+            "time": f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "task_id": getattr(record, "task_id", ""),
+            "node": getattr(record, "node", ""),
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }, ensure_ascii=False)
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.task_id = current_task_id.get()
+        record.node = current_node.get()
+        return True
+
+
+class _AgentQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler installed by `setup_logger`; the record is only formatted and enqueued on the
+    caller's thread, file I/O happens on the listener thread.
+    """
+
+
+class _PerLoggerFileHandler(logging.Handler):
+    """
+    Route each record to a size-rotated JSON-lines file named after its logger.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.files: dict[str, logging.Handler] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        handler = self.files.get(record.name)
+        if handler is None:
+            LOG_DIR.mkdir(exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                LOG_DIR / f"{record.name}.log",
+                maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUP_COUNT,
+                encoding="utf-8",
+            )
+            handler.setFormatter(JSONLinesFormatter())
+            self.files[record.name] = handler
+        handler.handle(record)
+
+    def close(self) -> None:
+        for handler in self.files.values():
+            handler.close()
+        super().close()
+
+
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_listener: logging.handlers.QueueListener | None = None
+_listener_lock = threading.Lock()
+
+def _start_listener() -> None:
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = logging.handlers.QueueListener(_log_queue, _PerLoggerFileHandler())
+            _listener.start()
+            atexit.register(stop_logging)
+
+def stop_logging() -> None:
+    """
+    Flush the queued records and stop the listener thread. Logging restarts on the next `setup_logger`.
+    """
+    global _listener
+    with _listener_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
 
 def setup_logger(name: str, level = logging.INFO):
     """
-    Set up a logger that writes to a file in the logs directory.
+    Set up a logger that writes JSON lines to logs/<name>.log through a background thread.
+    Calling it again for the same name returns the same logger without adding handlers.
     Args:
         name (str): The name of the logger.
         level: The logging level (default: logging.INFO).
     Returns:
         logging.Logger: Configured logger instance.
     """
-    log_dir = Path(__file__).parent.parent / "logs"
-    log_dir.mkdir(exist_ok=True)
+    _start_listener()
 
     # Create a custom logger
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
-    formatter = logging.Formatter(
-        fmt = "%(asctime)s | %(name)s | %(levelname)s | %(message)s",
-        datefmt = "%Y-%m-%d %H:%M:%S"
-    )
-
-    file_handler = logging.FileHandler(log_dir / f"{name}.log")
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    if not any(isinstance(handler, _AgentQueueHandler) for handler in logger.handlers):
+        handler = _AgentQueueHandler(_log_queue)
+        handler.addFilter(_ContextFilter())
+        logger.addHandler(handler)
 
     return logger
 
+@contextmanager
+def log_context(task_id: str | None = None, node: str | None = None) -> Iterator[None]:
+    """
+    Tag the records logged inside the block with a task id and/or node name.
+    """
+    tokens = []
+    if task_id is not None:
+        tokens.append((current_task_id, current_task_id.set(task_id)))
+    if node is not None:
+        tokens.append((current_node, current_node.set(node)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
 def dump_json_to_file(data: dict, filename: str):
     """
     Dump a dictionary to a JSON file.
@@ -37,9 +146,8 @@ def dump_json_to_file(data: dict, filename: str):
         data (dict): The data to dump.
         filename (str): The name of the file to write to.
     """
-    log_dir = Path(__file__).parent.parent / "logs"
-    log_dir.mkdir(exist_ok=True)
-    file_path = log_dir / filename
+    LOG_DIR.mkdir(exist_ok=True)
+    file_path = LOG_DIR / filename
     with open(file_path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=4)
 
@@ -50,8 +158,7 @@ def write_text_to_file(text: str, filename: str):
         text (str): The text to write.
         filename (str): The name of the file to write to.
     """
-    log_dir = Path(__file__).parent.parent / "logs"
-    log_dir.mkdir(exist_ok=True)
-    file_path = log_dir / filename
+    LOG_DIR.mkdir(exist_ok=True)
+    file_path = LOG_DIR / filename
     with open(file_path, "w", encoding="utf-8") as f:
         f.write(text)
\ No newline at end of file
@@ -0,0 +1,122 @@
+import copy
+
+import pytest
+
+from ax_store import UNDECODED, AXNodeMap, AXTreeStore
+from benchmarks.parse_tree import legacy_parse_accessibility_tree, make_tree, recursion_limit
+from tools import parse_accessibility_tree
+
+
+def node(node_id: str, role, name, children: list[str] = (), backend_id: int = 0) -> dict:
+    return {
+        "nodeId": node_id,
+        "role": {"type": "role", "value": role},
+        "name": {"type": "computedString", "value": name},
+        "childIds": list(children),
+        "backendDOMNodeId": backend_id,
+    }
+
+
+def test_rows_are_decoded_on_first_read():
+    store = AXTreeStore.from_nodes([node("1", "RootWebArea", "Page", ["2"], 10), node("2", "link", "Home", [], 20)])
+
+    assert len(store) == 2
+    assert list(store.role_ids) == [UNDECODED, UNDECODED]
+
+    assert store.name(1) == "Home"
+    assert store.role_ids[0] == UNDECODED
+    assert store.role(1) == "link"
+    assert store.backend_node_id(1) == 20
+    assert store.roles == ["link"]
+
+def test_roles_and_names_are_interned():
+    store = AXTreeStore.from_nodes([node(str(i), "link", "Home", [], i) for i in range(5)])
+
+    for i in range(5):
+        store.decode(i)
+
+    assert store.roles == ["link"]
+    assert store.names == ["Home"]
+    assert list(store.backend_ids) == [0, 1, 2, 3, 4]
+
+def test_malformed_rows_decode_to_empty_strings():
+    store = AXTreeStore.from_nodes([
+        {"nodeId": "1"},
+        {"nodeId": "2", "role": None, "name": {"value": ["not", "a", "name"]}},
+        node("3", 7, 42),
+    ])
+
+    assert (store.role(0), store.name(0), store.backend_node_id(0)) == ("", "", 0)
+    assert (store.role(1), store.name(1)) == ("", "")
+    assert (store.role(2), store.name(2)) == ("7", "")
+
+def test_children_skip_unknown_ids_and_last_duplicate_wins():
+    store = AXTreeStore.from_nodes([
+        node("1", "RootWebArea", "Page", ["2", "missing", "3"], 1),
+        node("2", "link", "Old", [], 2),
+        node("3", "button", "OK", [], 3),
+        node("2", "link", "New", [], 4),
+    ])
+
+    assert store.children(0) == [3, 2]
+    assert store.name(store.children(0)[0]) == "New"
+
+def test_empty_store():
+    store = AXTreeStore.from_nodes([])
+
+    assert len(store) == 0
+    assert len(AXNodeMap.from_store(store, [])) == 0
+
+
+def test_node_map_keeps_positions_in_order():
+    store = AXTreeStore.from_nodes([
+        node("1", "RootWebArea", "Page", [], 1),
+        node("2", "link", "Home", [], 2),
+        node("3", "button", "Home", [], 3),
+    ])
+
+    node_map = AXNodeMap.from_store(store, [2, 0])
+
+    assert len(node_map) == 2
+    assert list(node_map) == [1, 2]
+    assert [(node_map.role(idx), node_map.name(idx), node_map.backend_node_id(idx)) for idx in node_map] == [
+        ("button", "Home", 3),
+        ("RootWebArea", "Page", 1),
+    ]
+
+def test_node_map_rejects_indices_outside_the_display_range():
+    node_map = AXNodeMap.from_store(AXTreeStore.from_nodes([node("1", "link", "Home", [], 1)]), [0])
+
+    assert 1 in node_map
+    for idx in [0, 2, -1, "1", 1.0]:
+        assert idx not in node_map
+    with pytest.raises(KeyError):
+        node_map.role(0)
+    with pytest.raises(KeyError):
+        node_map.backend_node_id(2)
+
+def test_node_map_copies_are_shared():
+    node_map = AXNodeMap.from_store(AXTreeStore.from_nodes([node("1", "link", "Home", [], 1)]), [0])
+
+    assert copy.copy(node_map) is node_map
+    assert copy.deepcopy({"map": node_map})["map"] is node_map
+
+@pytest.mark.parametrize("shape", ["bushy", "deep"])
+@pytest.mark.parametrize("max_node", [300, 20_000])
+def test_node_map_matches_legacy_dict(shape, max_node):
+    tree = make_tree(6_000, shape, seed=3)
+
+    with recursion_limit(len(tree) + 1_000):
+        _, legacy_map = legacy_parse_accessibility_tree(tree, max_node=max_node)
+    _, node_map = parse_accessibility_tree(tree, max_node=max_node)
+
+    assert list(node_map) == list(legacy_map)
+    for idx, legacy_node in legacy_map.items():
+        assert node_map.role(idx) == legacy_node["role"]["value"]
+        assert node_map.name(idx) == legacy_node["name"]["value"]
+        assert node_map.backend_node_id(idx) == legacy_node["backendDOMNodeId"]
+
+def test_parser_accepts_a_store():
+    tree = make_tree(2_000, seed=5)
+
+    assert parse_accessibility_tree(AXTreeStore.from_nodes(tree))[0] == parse_accessibility_tree(tree)[0]
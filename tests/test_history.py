@@ -0,0 +1,69 @@
+import json
+
+from history import MAX_SUMMARY_ELEMENTS, empty_summary, fold_history, format_history, history_size, render_summary, window_history
+
+
+def actions(n: int) -> list[list[str]]:
+    kinds = ["Click", "Type hello", "Wait"]
+    return [["N/A", "N/A", "Wait"] if i % 3 == 2 else ["link", f"item {i % 4}", kinds[i % 3]] for i in range(n)]
+
+
+def test_fold_history_counts_actions_and_elements():
+    summary = fold_history(empty_summary(), [
+        ["link", "Terms", "Click"],
+        ["textbox", "Search", "Type hello"],
+        ["N/A", "N/A", "Go back"],
+        ["link", "Terms", "Click"],
+        ["button", "OK", ""],
+    ])
+
+    assert summary == {
+        "actions": 5,
+        "counts": {"click": 2, "type": 1, "go": 1, "unknown": 1},
+        "elements": ["textbox 'Search'", "link 'Terms'", "button 'OK'"],
+    }
+
+def test_fold_history_does_not_modify_the_summary():
+    summary = fold_history(empty_summary(), [["link", "Terms", "Click"]])
+
+    fold_history(summary, [["button", "OK", "Click"]])
+
+    assert summary == {"actions": 1, "counts": {"click": 1}, "elements": ["link 'Terms'"]}
+
+def test_fold_history_keeps_the_last_elements():
+    summary = fold_history(empty_summary(), [["link", f"item {i}", "Click"] for i in range(MAX_SUMMARY_ELEMENTS + 5)])
+
+    assert summary["elements"] == [f"link 'item {i}'" for i in range(5, MAX_SUMMARY_ELEMENTS + 5)]
+
+def test_window_history_extends_the_previous_summary():
+    history = actions(30)
+
+    summary = None
+    for step in range(1, len(history) + 1):
+        summary, recent = window_history(history[:step], summary, window=4)
+        assert recent == history[max(step - 4, 0):step]
+        assert summary == fold_history(empty_summary(), history[:max(step - 4, 0)])
+
+def test_window_zero_keeps_the_whole_history():
+    history = actions(12)
+
+    summary, recent = window_history(history, None, window=0)
+
+    assert summary == empty_summary()
+    assert recent == history
+
+def test_format_history():
+    history = actions(10)
+
+    assert format_history(*window_history(history[:3], None, window=4)) == json.dumps(history[:3])
+
+    summary, recent = window_history(history, None, window=4)
+    text = format_history(summary, recent)
+    assert text == f"{render_summary(summary)}\nRecent actions: {json.dumps(history[6:])}"
+    assert text.startswith("6 earlier actions (click x2, type x2, wait x2), last on: ")
+
+def test_history_size():
+    history = actions(10)
+
+    for step in range(len(history) + 1):
+        assert history_size(format_history(*window_history(history[:step], None, window=4))) == step
@@ -0,0 +1,134 @@
+from email.utils import formatdate
+import os
+import sqlite3
+import time
+
+import pytest
+
+from http_cache import HttpResponseStore, freshness_ttl, vary_key
+
+
+def headers(**values: str) -> list[dict[str, str]]:
+    return [{"name": name.replace("_", "-"), "value": value} for name, value in values.items()]
+
+
+@pytest.mark.parametrize("response_headers, expected", [
+    (headers(Content_Type="text/css"), {}),
+    (headers(Vary="Accept-Encoding"), {}),
+    (headers(Vary="Accept-Language, Accept-Encoding"), {"accept-language": "fr"}),
+    (headers(Vary="Origin"), {"origin": ""}),
+    (headers(Vary="*"), None),
+    (headers(Vary="Cookie"), None),
+    (headers(vary="accept-language, Authorization"), None),
+])
+def test_vary_key(response_headers, expected):
+    assert vary_key(response_headers, {"Accept-Language": "fr", "Accept-Encoding": "gzip"}) == expected
+
+@pytest.mark.parametrize("response_headers, expected", [
+    (headers(Cache_Control="public, max-age=600"), 600),
+    (headers(Cache_Control="max-age=600, s-maxage=60"), 60),
+    (headers(Cache_Control="max-age=0"), None),
+    (headers(Cache_Control="no-store"), None),
+    (headers(Cache_Control="max-age=600, private"), None),
+    (headers(Cache_Control="no-cache, max-age=600"), None),
+    (headers(Cache_Control="max-age=600", Set_Cookie="id=1"), None),
+    (headers(Expires="Thu, 01 Jan 1970 00:00:00 GMT"), None),
+    (headers(Expires="not a date"), None),
+    (headers(Date="Tue, 10 Jan 2023 00:00:00 GMT", Last_Modified="Sat, 31 Dec 2022 00:00:00 GMT"), 86_400),
+    (headers(Date="Tue, 10 Jan 2023 00:00:00 GMT", Last_Modified="Wed, 11 Jan 2023 00:00:00 GMT"), None),
+    (headers(Content_Type="text/css"), None),
+])
+def test_freshness_ttl(response_headers, expected):
+    assert freshness_ttl(response_headers) == expected
+
+def test_freshness_ttl_from_expires():
+    ttl = freshness_ttl(headers(Expires=formatdate(time.time() + 3_600, usegmt=True)))
+
+    assert ttl == pytest.approx(3_600, abs=10)
+
+def test_freshness_ttl_from_last_modified_without_date():
+    ttl = freshness_ttl(headers(Last_Modified=formatdate(time.time() - 10 * 86_400, usegmt=True)))
+
+    assert ttl == pytest.approx(86_400, abs=10)
+
+
+def test_get_and_put(tmp_path):
+    store = HttpResponseStore(str(tmp_path))
+    store.put("https://example.com/app.js", 200, headers(Content_Type="text/javascript", Content_Length="7", Set_Cookie="id=1"), b"alert()", ttl=60)
+
+    response = store.get("https://example.com/app.js")
+
+    assert response == {"status": 200, "headers": headers(Content_Type="text/javascript"), "body": b"alert()"}
+    assert store.get("https://example.com/other.js") is None
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["writes"], stats["bytes_served"]) == (1, 1, 1, 7)
+
+def test_expired_responses_are_misses(tmp_path):
+    store = HttpResponseStore(str(tmp_path))
+    store.put("https://example.com/app.js", 200, [], b"alert()", ttl=-1)
+
+    assert store.get("https://example.com/app.js") is None
+
+def test_variants_are_matched_on_the_vary_headers(tmp_path):
+    store = HttpResponseStore(str(tmp_path))
+    store.put("https://example.com/api", 200, headers(Vary="Accept-Language"), b"bonjour", ttl=60, vary={"accept-language": "fr"})
+
+    assert store.get("https://example.com/api", {"Accept-Language": "fr"})["body"] == b"bonjour"
+    assert store.get("https://example.com/api", {"Accept-Language": "en"}) is None
+    assert store.get("https://example.com/api") is None
+
+    store.put("https://example.com/api", 200, headers(Vary="Accept-Language"), b"hello", ttl=60, vary={"accept-language": "en"})
+    assert store.get("https://example.com/api", {"accept-language": "en"})["body"] == b"hello"
+    assert store.get("https://example.com/api", {"Accept-Language": "fr"}) is None
+
+def test_identical_bodies_share_a_blob(tmp_path):
+    store = HttpResponseStore(str(tmp_path))
+    store.put("https://a.example.com/lib.js", 200, [], b"x" * 100, ttl=60)
+    store.put("https://b.example.com/lib.js", 200, [], b"x" * 100, ttl=60)
+
+    assert (store.stats()["entries"], store.stats()["bytes"]) == (2, 100)
+    assert sum(len(files) for _, _, files in os.walk(store.blob_directory)) == 1
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    store = HttpResponseStore(str(tmp_path), max_bytes=250)
+    store.put("https://example.com/a.js", 200, [], b"a" * 100, ttl=60)
+    store.put("https://example.com/b.js", 200, [], b"b" * 100, ttl=60)
+    store.get("https://example.com/a.js")
+
+    store.put("https://example.com/c.js", 200, [], b"c" * 100, ttl=60)
+
+    assert store.get("https://example.com/b.js") is None
+    assert store.get("https://example.com/a.js") is not None
+    assert store.stats()["evictions"] == 1
+    assert sum(len(files) for _, _, files in os.walk(store.blob_directory)) == 2
+
+def test_store_is_shared_and_cleared(tmp_path):
+    HttpResponseStore(str(tmp_path)).put("https://example.com/app.css", 200, [], b"body {}", ttl=60)
+
+    store = HttpResponseStore(str(tmp_path))
+    assert store.get("https://example.com/app.css")["body"] == b"body {}"
+
+    store.clear()
+    assert store.get("https://example.com/app.css") is None
+    assert sum(len(files) for _, _, files in os.walk(store.blob_directory)) == 0
+
+def test_stores_without_vary_are_emptied(tmp_path):
+    db = sqlite3.connect(str(tmp_path / "index.sqlite"))
+    with db:
+        db.execute(
+            "CREATE TABLE responses ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, blob TEXT NOT NULL, status INTEGER NOT NULL, "
+            "headers TEXT NOT NULL, size INTEGER NOT NULL, expires REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        db.execute(
+            "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (HttpResponseStore.key("https://example.com/api"), "https://example.com/api", "0" * 64, 200, "[]", 5, time.time() + 60, time.time())
+        )
+    db.close()
+
+    store = HttpResponseStore(str(tmp_path))
+
+    assert store.get("https://example.com/api") is None
+    assert store.stats()["entries"] == 0
+    store.put("https://example.com/api", 200, [], b"fresh", ttl=60, vary={"origin": ""})
+    assert store.get("https://example.com/api", {"Origin": ""})["body"] == b"fresh"
@@ -0,0 +1,85 @@
+import pytest
+
+from benchmarks.parse_tree import assert_same_output, make_tree
+from tools import parse_accessibility_tree
+
+
+def node(node_id: str, role: str, name: str, children: list[str] = (), backend_id: int = 0) -> dict:
+    return {
+        "nodeId": node_id,
+        "role": {"type": "role", "value": role},
+        "name": {"type": "computedString", "value": name},
+        "childIds": list(children),
+        "backendDOMNodeId": backend_id,
+    }
+
+
+@pytest.mark.parametrize("shape", ["bushy", "deep"])
+@pytest.mark.parametrize("size", [1, 50, 2_000, 8_000])
+@pytest.mark.parametrize("max_node", [0, 10, 300, 10_000])
+def test_matches_legacy_parser(shape, size, max_node):
+    assert_same_output(make_tree(size, shape, seed=size), max_node)
+
+def test_deep_tree_does_not_recurse():
+    # Far deeper than the default recursion limit.
+    nodes = [node(str(i), "link", f"item {i}", [str(i + 1)], i + 1) for i in range(20_000)]
+    nodes[-1]["childIds"] = []
+
+    tree_str, node_map = parse_accessibility_tree(nodes, max_node=20_000)
+
+    assert len(node_map) == 20_000
+    assert tree_str.splitlines()[-1] == "\t" * 19_999 + " [20000] link 'item 19999'"
+
+def test_skips_unnamed_gridcell_and_redundant_nodes():
+    nodes = [
+        node("1", "RootWebArea", "Page", ["2", "3", "4", "5"], 1),
+        node("2", "button", "   ", [], 2),
+        node("3", "gridcell", "Cell", [], 3),
+        node("4", "link", "Terms of use", ["6"], 4),
+        node("5", "button", "Search", ["7"], 5),
+        node("6", "StaticText", "Terms", [], 6),
+        node("7", "textbox", "Search", [], 7),
+    ]
+
+    tree_str, node_map = parse_accessibility_tree(nodes)
+
+    assert tree_str.splitlines() == [
+        " [1] RootWebArea 'Page'",
+        "\t [2] link 'Terms of use'",
+        "\t [3] button 'Search'",
+        "\t\t [4] textbox 'Search'",
+    ]
+    assert [node_map.backend_node_id(idx) for idx in node_map] == [1, 4, 5, 7]
+
+def test_ignores_missing_children_and_malformed_nodes():
+    nodes = [
+        node("1", "RootWebArea", "Page", ["2", "missing", "3"], 1),
+        {"nodeId": "2", "childIds": ["4"]},
+        {"nodeId": "3", "role": {"value": "link"}, "name": {"value": 42}, "backendDOMNodeId": 3},
+        node("4", "link", "Nested", [], 4),
+    ]
+
+    tree_str, node_map = parse_accessibility_tree(nodes)
+
+    assert tree_str == " [1] RootWebArea 'Page'\n\t [2] link 'Nested'"
+    assert node_map.backend_node_id(2) == 4
+
+def test_stops_after_max_node():
+    tree_str, node_map = parse_accessibility_tree(make_tree(5_000), max_node=20)
+
+    # Like the original parser, the walk stops once more than `max_node` elements were collected.
+    assert len(node_map) == 21
+    assert len(tree_str.splitlines()) == 21
+
+def test_ascii_indent_style():
+    nodes = [node("1", "RootWebArea", "Page", ["2"], 1), node("2", "link", "Home", [], 2)]
+
+    tree_str, _ = parse_accessibility_tree(nodes, indent_style="ASCII")
+
+    assert tree_str == " [1] RootWebArea 'Page'\n│    [2] link 'Home'"
+
+def test_empty_tree():
+    tree_str, node_map = parse_accessibility_tree([])
+
+    assert tree_str == ""
+    assert len(node_map) == 0
@@ -0,0 +1,73 @@
+from benchmarks.parse_tree import make_tree
+from pruning import estimate_tokens, prune_accessibility_tree, score_elements, tokenize
+from tools import as_tree_store, parse_accessibility_tree, walk_accessibility_tree
+
+
+def node(node_id: str, role: str, name: str, children: list[str] = (), backend_id: int = 0) -> dict:
+    return {
+        "nodeId": node_id,
+        "role": {"type": "role", "value": role},
+        "name": {"type": "computedString", "value": name},
+        "childIds": list(children),
+        "backendDOMNodeId": backend_id,
+    }
+
+def page() -> list[dict]:
+    # A navigation list with many links and, deep in the footer, the one the task is about.
+    links = [node(f"l{i}", "link", f"News story {i}", [], 100 + i) for i in range(60)]
+    return [
+        node("root", "RootWebArea", "Example", ["nav", "footer"], 1),
+        node("nav", "navigation", "Main", [link["nodeId"] for link in links], 2),
+        *links,
+        node("footer", "contentinfo", "Footer", ["legal"], 3),
+        node("legal", "list", "Legal", ["terms"], 4),
+        node("terms", "link", "Terms of use", [], 5),
+    ]
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("Find the Terms-of-use link, please!") == ["terms", "use", "link"]
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 40) == 11
+
+def test_scores_only_elements_sharing_a_term():
+    store = as_tree_store(page())
+    positions, _, _ = walk_accessibility_tree(store, 1_000)
+
+    scores = score_elements(store, positions, "open the terms of use")
+
+    by_name = {store.name(i): score for i, score in zip(positions, scores)}
+    assert by_name["Terms of use"] > 0
+    assert by_name["News story 3"] == 0
+    assert score_elements(store, positions, "the of") == [0.0] * len(positions)
+
+def test_relevant_element_is_kept_with_its_ancestors():
+    tree_str, node_map = prune_accessibility_tree(page(), "Click the terms of use link", token_budget=60)
+
+    assert tree_str.splitlines()[-3:] == [
+        "\t [6] contentinfo 'Footer'",
+        "\t\t [7] list 'Legal'",
+        "\t\t\t [8] link 'Terms of use'",
+    ]
+    # The rest of the budget goes to the first elements in page order.
+    assert [node_map.name(idx) for idx in range(1, 6)] == ["Example", "Main", "News story 0", "News story 1", "News story 2"]
+
+def test_output_stays_within_the_budget():
+    for budget in [20, 100, 400]:
+        tree_str, _ = prune_accessibility_tree(make_tree(3_000, seed=1), "search settings", token_budget=budget)
+        assert sum(estimate_tokens(line) for line in tree_str.splitlines()) <= budget
+
+def test_large_budget_keeps_the_unpruned_tree():
+    nodes = page()
+
+    assert prune_accessibility_tree(nodes, "terms", token_budget=100_000)[0] == parse_accessibility_tree(nodes)[0]
+
+def test_display_indices_follow_page_order():
+    tree_str, node_map = prune_accessibility_tree(page(), "news story 42", token_budget=40)
+
+    backend_ids = [node_map.backend_node_id(idx) for idx in node_map]
+    assert backend_ids == sorted(backend_ids)
+    assert 142 in backend_ids
+    assert [line.split("]")[0].strip() for line in tree_str.splitlines()] == [f"[{idx}" for idx in node_map]
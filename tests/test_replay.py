@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from replay import RecordingChain, RecordingDriver, ReplayChain, ReplayDriver, ReplayedError, ReplayMismatch, Trace, TraceWriter
+
+
+class Decision(BaseModel):
+    thought: str
+    action: list[str]
+
+
+class FakeDriver:
+    """Answers a few WebDriver calls; counts the CDP commands it receives."""
+
+    def __init__(self):
+        self.commands = 0
+        self.current_url = "https://example.com/"
+        self.window_handles = ["tab-1"]
+        self.session_id = "session"
+
+    def execute_cdp_cmd(self, command: str, params: dict) -> dict:
+        self.commands += 1
+        if command == "DOM.resolveNode":
+            raise RuntimeError("No node with given id found")
+        return {"command": command, "call": self.commands}
+
+    def execute_script(self, script: str, *args) -> str:
+        return "complete"
+
+
+def record(path: str, calls) -> None:
+    writer = TraceWriter(path)
+    try:
+        calls(RecordingDriver(FakeDriver(), writer), writer)
+    finally:
+        writer.close()
+
+
+def test_driver_responses_are_replayed_in_order(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    def calls(driver, writer):
+        driver.execute_cdp_cmd("Accessibility.getFullAXTree", {})
+        driver.execute_cdp_cmd("Accessibility.getFullAXTree", {})
+        driver.execute_script("return document.readyState")
+        assert driver.current_url == "https://example.com/"
+        assert driver.session_id == "session" # not recorded
+    record(path, calls)
+
+    driver = ReplayDriver(Trace.load(path))
+
+    assert driver.execute_cdp_cmd("Accessibility.getFullAXTree", {})["call"] == 1
+    assert driver.execute_cdp_cmd("Accessibility.getFullAXTree", {})["call"] == 2
+    assert driver.execute_script("return document.readyState") == "complete"
+    assert driver.current_url == "https://example.com/"
+    assert driver.misses == 0
+
+def test_recorded_errors_are_raised_again(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    def calls(driver, writer):
+        with pytest.raises(RuntimeError):
+            driver.execute_cdp_cmd("DOM.resolveNode", {"backendNodeId": 4})
+    record(path, calls)
+
+    with pytest.raises(ReplayedError, match="No node with given id found"):
+        ReplayDriver(Trace.load(path)).execute_cdp_cmd("DOM.resolveNode", {"backendNodeId": 4})
+
+def test_unrecorded_calls_are_mismatches(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    record(path, lambda driver, writer: driver.execute_cdp_cmd("Page.reload", {}))
+    driver = ReplayDriver(Trace.load(path))
+
+    with pytest.raises(ReplayMismatch):
+        driver.execute_cdp_cmd("Page.reload", {"ignoreCache": True})
+    driver.execute_cdp_cmd("Page.reload", {})
+    with pytest.raises(ReplayMismatch):
+        driver.execute_cdp_cmd("Page.reload", {})
+    with pytest.raises(ReplayMismatch):
+        driver.find_element("id", "search")
+    assert driver.misses == 2
+
+def test_muted_calls_are_not_recorded(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    def calls(driver, writer):
+        with writer.mute():
+            driver.execute_script("return document.readyState")
+        writer.write({"kind": "settle", "result": 0.25})
+    record(path, calls)
+
+    trace = Trace.load(path)
+    assert not trace.driver
+    assert list(trace.settle) == [0.25]
+
+def test_llm_responses_are_replayed(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    writer = TraceWriter(path)
+    chain = RecordingChain("reAct", RunnableLambda(lambda input: Decision(thought=input["task"], action=["1", "Click"])), writer)
+    recorded = chain.invoke({"task": "click"})
+    asyncio.run(chain.ainvoke({"task": "type"}))
+    writer.close()
+
+    trace = Trace.load(path)
+    replayed = ReplayChain("reAct", trace, ReplayDriver(trace))
+
+    assert replayed.invoke({"task": "click"}) == recorded
+    assert asyncio.run(replayed.ainvoke({"task": "type"})).thought == "type"
+    with pytest.raises(ReplayMismatch):
+        replayed.invoke({"task": "click"})
@@ -0,0 +1,90 @@
+import asyncio
+
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from components.response_cache import CachedChain, ResponseCache
+
+
+class Answer(BaseModel):
+    answer: str
+
+
+class FakeLLM:
+    model = "fake"
+    temperature = 0.0
+    num_predict = 64
+
+
+def make_chain(calls: list, template: str = "Answer: {question}"):
+    def llm(prompt):
+        calls.append(prompt)
+        return Answer(answer=f"answer {len(calls)}").model_dump_json()
+
+    return ChatPromptTemplate.from_messages([("human", template)]) | RunnableLambda(llm) | PydanticOutputParser(pydantic_object=Answer)
+
+
+def test_get_and_put(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache" / "llm.sqlite"))
+
+    assert cache.get("key") is None
+    cache.put("key", "value")
+    assert cache.get("key") == "value"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["writes"], stats["entries"], stats["bytes"]) == (1, 1, 1, 1, 5)
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm.sqlite"), max_bytes=25)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    cache.get("a")
+
+    cache.put("c", "x" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 20
+
+def test_entries_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "llm.sqlite")
+    ResponseCache(path).put("key", "value")
+
+    cache = ResponseCache(path)
+    assert cache.get("key") == "value"
+    cache.clear()
+    assert cache.get("key") is None
+
+def test_cached_chain_calls_the_model_once_per_input(tmp_path):
+    calls = []
+    chain = CachedChain(make_chain(calls), FakeLLM(), ResponseCache(str(tmp_path / "llm.sqlite")))
+
+    first = chain.invoke({"question": "why"})
+    second = chain.invoke({"question": "why"})
+    other = chain.invoke({"question": "how"})
+
+    assert first == second == Answer(answer="answer 1")
+    assert other == Answer(answer="answer 2")
+    assert len(calls) == 2
+
+def test_cached_chain_ainvoke_shares_the_cache(tmp_path):
+    calls = []
+    chain = CachedChain(make_chain(calls), FakeLLM(), ResponseCache(str(tmp_path / "llm.sqlite")))
+
+    chain.invoke({"question": "why"})
+    assert asyncio.run(chain.ainvoke({"question": "why"})) == Answer(answer="answer 1")
+    assert len(calls) == 1
+
+def test_cache_key_covers_the_prompt_and_model(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm.sqlite"))
+    key = CachedChain(make_chain([]), FakeLLM(), cache).cache_key({"question": "why"})
+
+    other_model = FakeLLM()
+    other_model.model = "other"
+
+    assert CachedChain(make_chain([]), FakeLLM(), cache).cache_key({"question": "why"}) == key
+    assert CachedChain(make_chain([], "Q: {question}"), FakeLLM(), cache).cache_key({"question": "why"}) != key
+    assert CachedChain(make_chain([]), other_model, cache).cache_key({"question": "why"}) != key
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from streaming import JSONFieldStream
+
+
+def stream(chunks: list[str], field: str = "thought") -> tuple[list[str], JSONFieldStream]:
+    field_stream = JSONFieldStream(field)
+    return [field_stream.feed(chunk) for chunk in chunks], field_stream
+
+def splits(text: str) -> list[list[str]]:
+    # The text in two chunks at every position, and one character at a time.
+    return [[text[:i], text[i:]] for i in range(len(text) + 1)] + [list(text)]
+
+
+VALUES = [
+    "Click the 'Terms' link",
+    'He said "hi"',
+    "back\\slash and a/slash",
+    "line\nbreak\ttab\rreturn\b\f",
+    "café 日本",
+    "emoji \U0001F600 after",
+    "",
+]
+
+@pytest.mark.parametrize("value", VALUES)
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_decodes_like_json_loads_at_any_chunk_boundary(value, ensure_ascii):
+    text = json.dumps({"thought": value, "action": ["3", "Click"]}, ensure_ascii=ensure_ascii)
+
+    for chunks in splits(text):
+        deltas, field_stream = stream(chunks)
+        assert "".join(deltas) == value, chunks
+        assert field_stream.text == value
+        assert field_stream.done
+
+def test_escaped_solidus_and_unicode_escapes():
+    deltas, field_stream = stream(['{"thought": "a\\/b \\u00', 'e9 \\ud83d', '\\ude00"}'])
+
+    assert deltas == ["a/b ", "é ", "\U0001F600"]
+    assert field_stream.done
+
+def test_waits_for_a_cut_escape_sequence():
+    deltas, _ = stream(['{"thought": "quote \\', '"', ' done"}'])
+
+    assert deltas == ["quote ", '"', " done"]
+
+def test_streams_the_requested_field_only():
+    text = json.dumps({"thought": "think", "answer": "The terms were published in 2023."})
+
+    deltas, field_stream = stream(list(text), field="answer")
+
+    assert "".join(deltas) == "The terms were published in 2023."
+    assert field_stream.text == "The terms were published in 2023."
+
+def test_field_name_as_an_earlier_value_is_not_the_field():
+    text = json.dumps({"action": ["1", "thought"], "note": "\"thought\": no", "thought": "yes"})
+
+    for chunks in splits(text):
+        deltas, _ = stream(chunks)
+        assert "".join(deltas) == "yes", chunks
+
+def test_non_string_value_streams_nothing():
+    deltas, field_stream = stream(['{"thought": ', '["not", "text"], "answer": "x"}'])
+
+    assert deltas == ["", ""]
+    assert field_stream.done
+    assert field_stream.feed('"more"') == ""
+
+def test_nothing_after_the_closing_quote():
+    _, field_stream = stream(['{"thought": "done"', ', "thought": "again"}'])
+
+    assert field_stream.text == "done"
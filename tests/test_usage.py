@@ -0,0 +1,84 @@
+import json
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from pydantic import BaseModel
+
+from pruning import estimate_tokens
+import usage
+from usage import UsageRecorder
+
+
+class Answer(BaseModel):
+    answer: str
+
+
+def test_tokens_reported_by_the_model():
+    recorder = UsageRecorder("answer")
+    llm = GenericFakeChatModel(messages=iter([
+        AIMessage(content="It was published in 2023.", usage_metadata={"input_tokens": 120, "output_tokens": 9, "total_tokens": 129}),
+    ]))
+
+    llm.invoke("When were the terms published?", config=recorder.config())
+    call = recorder.record({"task": "When were the terms published?"}, Answer(answer="2023"))
+
+    assert (call["agent"], call["prompt_tokens"], call["completion_tokens"], call["source"]) == ("answer", 120, 9, "model")
+    assert 0 <= call["ttft"] <= call["latency"]
+
+def test_tokens_are_estimated_when_the_model_reports_none():
+    recorder = UsageRecorder("reAct")
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content='{"answer": "2023"}')]))
+    input = {"task": "When were the terms published?", "accessibility_tree": "[1] link 'Terms'"}
+    response = Answer(answer="2023")
+
+    llm.invoke("prompt", config=recorder.config())
+    call = recorder.record(input, response)
+
+    assert call["source"] == "estimated"
+    assert call["prompt_tokens"] == estimate_tokens(json.dumps(input))
+    assert call["completion_tokens"] == estimate_tokens(response.model_dump_json())
+
+def test_failed_call_counts_no_completion():
+    recorder = UsageRecorder("reAct")
+    recorder.on_llm_start({}, ["prompt"])
+
+    call = recorder.record({"task": "x"})
+
+    assert call["source"] == "estimated"
+    assert call["completion_tokens"] == 0
+
+def test_calls_without_a_model_are_free():
+    recorder = UsageRecorder("check_continue")
+
+    call = recorder.record({"task": "x"}, Answer(answer="cached"))
+
+    assert (call["prompt_tokens"], call["completion_tokens"], call["cost"], call["source"]) == (0, 0, 0, "cached")
+    assert call["ttft"] == call["latency"]
+
+def test_time_to_first_token():
+    recorder = UsageRecorder("answer")
+    recorder.on_chat_model_start({}, [])
+    recorder.on_llm_new_token("It")
+    first_token = recorder.first_token
+    recorder.on_llm_new_token(" was")
+
+    call = recorder.record({})
+
+    assert recorder.first_token == first_token
+    assert call["ttft"] == first_token - recorder.start
+    assert call["ttft"] <= call["latency"]
+
+def test_update_adds_to_the_totals(monkeypatch):
+    monkeypatch.setattr(usage, "PROMPT_COST_PER_1K", 0.5)
+    monkeypatch.setattr(usage, "COMPLETION_COST_PER_1K", 2.0)
+    recorder = UsageRecorder("answer")
+    llm = GenericFakeChatModel(messages=iter([
+        AIMessage(content="ok", usage_metadata={"input_tokens": 2000, "output_tokens": 500, "total_tokens": 2500}),
+    ]))
+    llm.invoke("prompt", config=recorder.config())
+
+    update = recorder.update({}, Answer(answer="ok"))
+
+    assert update["tokens_used"] == 2500
+    assert update["llm_cost"] == 2.0
+    assert update["llm_calls"][0]["cost"] == 2.0